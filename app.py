@@ -1,4 +1,5 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify
+from flask import Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -8,36 +9,66 @@ from PIL import Image
 import os
 import json
 import uuid
+import click
 from datetime import datetime, date
+from io import BytesIO
 from threading import Thread
 from models import CertificateTemplate
-from certificate_generator import generate_enhanced_certificate
 from datetime import datetime
 
 # Import models and other modules
-from models import db, User, Student, Event, Certificate, EventParticipant, CertificateTemplate, EventType
+from models import db, User, Student, Event, Certificate, EventParticipant, CertificateTemplate, EventType, BulkJob
+from models import add_missing_columns
 from certificate_generator import generate_certificate_pdf, generate_bulk_certificates
+from certificate_cache import fingerprint_certificate, get_or_render_certificate
+from certificate_refresh import plan_regeneration
+from certificate_store import collect_garbage, release_file, store_bytes, store_file
+from certificate_archive import stream_certificate_zip
+from certificate_preview import PREVIEW_WIDTH, get_or_render_preview, preview_available, preview_path
+from bulk_jobs import BULK_JOBS, interactive_render, job_status, pending_items, reset_items, wait_for_interactive
+from render_assets import create_render_variants, delete_render_variants
+from render_trace import RECENT_RUNS
 from template_config import create_default_templates
 from email_sender import send_email  # Import your working email sender
-from email_sender import send_certificate_email_flask
+from email_sender import send_certificate_email_flask, CertificateEmailComposer
+from email_outbox import OUTBOX, outbox_status
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # App Configuration
 app.config['SECRET_KEY'] = 'your-super-secret-key-change-in-production-2025'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///certificates.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///certificates.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Upload configurations
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['CERTIFICATE_FOLDER'] = 'certificates'
+app.config['CERTIFICATE_CACHE_FOLDER'] = 'certificates/cache'
+app.config['CERTIFICATE_STORE_FOLDER'] = 'certificates/store'
+app.config['CERTIFICATE_PREVIEW_FOLDER'] = 'certificates/previews'
 app.config['LOGO_UPLOAD_FOLDER'] = 'static/uploads/logos'
 app.config['SIGNATURE_UPLOAD_FOLDER'] = 'static/uploads/signatures'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# PDF output - image quality profile ('screen', 'print' or 'archive') and the byte budget each
+# certificate is shrunk to fit (None for no limit); keeps email attachments under mailbox limits
+app.config['CERTIFICATE_OUTPUT_PROFILE'] = 'screen'
+app.config['CERTIFICATE_MAX_BYTES'] = None
+
+# Render engine used unless a template's config names its own: 'reportlab' or 'html' (WeasyPrint)
+app.config['CERTIFICATE_RENDER_ENGINE'] = 'reportlab'
+
+# Sends the mail provider allows per second, minute and day, shared by every worker and process
+app.config['EMAIL_SEND_QUOTAS'] = {'second': 2, 'minute': 60, 'day': 2000}
+
+# Bulk rendering - number of worker processes used by generate_bulk_certificates (1 = in-process)
+app.config['RENDER_WORKERS'] = os.cpu_count() or 1
+
 # Initialize extensions
 db.init_app(app)
+BULK_JOBS.init_app(app)
+OUTBOX.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -54,6 +85,9 @@ def load_user(user_id):
 # Create directories
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['CERTIFICATE_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CERTIFICATE_CACHE_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CERTIFICATE_STORE_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CERTIFICATE_PREVIEW_FOLDER'], exist_ok=True)
 os.makedirs(app.config['LOGO_UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['SIGNATURE_UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('static/templates', exist_ok=True)
@@ -108,6 +142,7 @@ def delete_image_file(filename, folder):
         file_path = os.path.join(folder, filename)
         if os.path.exists(file_path):
             os.remove(file_path)
+            delete_render_variants(file_path)
             return True
     except Exception as e:
         print(f"Error deleting file: {e}")
@@ -123,6 +158,7 @@ def initialize_database():
     if not _initialization_done:
         try:
             db.create_all()
+            add_missing_columns()
             
             # Create admin user if not exists
             admin = User.query.filter_by(username='admin').first()
@@ -140,6 +176,11 @@ def initialize_database():
             
             # Create default templates
             create_default_templates()
+            
+            # Pick up bulk jobs left unfinished by a previous run
+            BULK_JOBS.resume()
+            # Retry emails still waiting in the outbox
+            OUTBOX.wake()
             _initialization_done = True
             
         except Exception as e:
@@ -317,6 +358,7 @@ def events():
                 filename = str(uuid.uuid4()) + os.path.splitext(bg_file.filename)[1]
                 bg_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 bg_file.save(bg_path)
+                create_render_variants(bg_path, 'background')
                 background_path = filename
 
                 logo_path = None
@@ -327,6 +369,7 @@ def events():
                 filename = f"logo_{uuid.uuid4()}{os.path.splitext(logo_file.filename)[1]}"
                 save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 logo_file.save(save_path)
+                create_render_variants(save_path, 'logo')
                 logo_path = filename
                 print(f"Logo saved as: {logo_path}")
         
@@ -339,6 +382,7 @@ def events():
                 filename = f"sig_{uuid.uuid4()}{os.path.splitext(sig_file.filename)[1]}"
                 save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 sig_file.save(save_path)
+                create_render_variants(save_path, 'signature')
                 signature_path = filename
                 print(f"Signature saved as: {signature_path}")
 
@@ -368,12 +412,61 @@ def events():
     events = Event.query.order_by(Event.start_date.desc()).all()
     return render_template('events.html', events=events, current_year=datetime.now().year)
 
+def _participant_or_404(event_id, student_id):
+    """The event and student of a registration; 404 unless the student takes part in the event"""
+    participation = EventParticipant.query.filter_by(event_id=event_id, student_id=student_id).first_or_404()
+    return participation.event, participation.student
+
 @app.route('/preview_certificate/<int:event_id>/<int:student_id>')
+@login_required
 def preview_certificate_html(event_id, student_id):
-    # Logic to preview certificate
+    """Page showing the certificate preview of one of an event's participants"""
+    event, student = _participant_or_404(event_id, student_id)
     return render_template('certificate_preview.html', 
                          event_id=event_id, 
-                         student_id=student_id)
+                         student_id=student_id,
+                         event=event,
+                         student=student,
+                         template_id=request.args.get('template_id', type=int),
+                         preview_available=preview_available())
+
+@app.route('/preview_certificate/<int:event_id>/<int:student_id>.png')
+@login_required
+def preview_certificate_png(event_id, student_id):
+    """Redirect to the cached PNG preview of a certificate, rendering it first on a miss"""
+    if not preview_available():
+        return jsonify({'error': 'Certificate previews need PyMuPDF installed'}), 501
+    
+    event, student = _participant_or_404(event_id, student_id)
+    template_id = request.args.get('template_id', type=int)
+    certificate_type = request.args.get('certificate_type', 'default')
+    width = request.args.get('width', PREVIEW_WIDTH, type=int)
+    
+    with interactive_render():
+        key, png_path = get_or_render_preview(event, student, app.config['CERTIFICATE_CACHE_FOLDER'],
+                                              template_id, certificate_type, width)
+    if png_path is None:
+        return jsonify({'error': 'Certificate could not be rendered'}), 500
+    
+    # The redirect is checked every time; the PNG behind it never changes, since its key would
+    response = redirect(url_for('certificate_preview_file', key=key))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/certificate_previews/<key>.png')
+@login_required
+def certificate_preview_file(key):
+    """A cached preview by key; keys change whenever the certificate would, so browsers keep them for a year"""
+    png_path = preview_path(key)
+    if png_path is None or not os.path.exists(png_path):
+        return jsonify({'error': 'Unknown preview'}), 404
+    
+    response = send_file(png_path, mimetype='image/png', max_age=365 * 24 * 3600)
+    response.cache_control.immutable = True
+    # Previews carry student names, so only the browser may keep them
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
 @app.route('/upload_students', methods=['GET', 'POST'])
 @app.route('/upload_students/<int:event_id>', methods=['GET', 'POST'])
@@ -546,7 +639,11 @@ def bulk_certificates():
     """Bulk certificate generation for events"""
     if request.method == 'POST':
         event_id = request.form.get('event_id')
-        template_id = request.form.get('template_id')
+        # The style list holds generator names as well as template ids
+        style = request.form.get('template_id') or ''
+        template_id = int(style) if style.isdigit() else None
+        certificate_type = style if style and not style.isdigit() else 'default'
+        single_pdf = request.form.get('single_pdf') == 'on'
         
         if not event_id:
             flash('Please select an event', 'error')
@@ -554,50 +651,18 @@ def bulk_certificates():
         
         event = Event.query.get_or_404(event_id)
         participants = EventParticipant.query.filter_by(event_id=event_id).all()
-        students = [p.student for p in participants]
+        student_ids = [p.student_id for p in participants]
         
-        if not students:
+        if not student_ids:
             flash('No students registered for this event', 'warning')
             return redirect(request.url)
         
-        try:
-            # Generate certificates for all students
-            pdf_paths = generate_bulk_certificates(event, students, app.config['CERTIFICATE_FOLDER'], template_id)
-            
-            successful_certs = 0
-            failed_certs = 0
-            
-            for student, pdf_path in zip(students, pdf_paths):
-                if pdf_path:
-                    # Record certificate in database
-                    existing_cert = Certificate.query.filter_by(
-                        student_id=student.id, 
-                        event_id=event_id
-                    ).first()
-                    
-                    if not existing_cert:
-                        certificate = Certificate(
-                            student_id=student.id, 
-                            event_id=event_id, 
-                            template_id=template_id,
-                            certificate_path=pdf_path
-                        )
-                        db.session.add(certificate)
-                    successful_certs += 1
-                else:
-                    failed_certs += 1
-            
-            db.session.commit()
-            
-            # Success message
-            if successful_certs > 0:
-                flash(f'Successfully generated {successful_certs} certificates for {event.title} ({event.event_type.value})!', 'success')
-            if failed_certs > 0:
-                flash(f'{failed_certs} certificates failed to generate', 'warning')
-                
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error generating bulk certificates: {str(e)}', 'error')
+        # Large events outlast the proxy timeout, so the work runs as a background job the page polls
+        job = BULK_JOBS.submit('booklet' if single_pdf else 'certificates', event.id, student_ids,
+                               label=f'{event.title} ({len(student_ids)} students)', template_id=template_id,
+                               options={'certificate_type': certificate_type})
+        flash(f'Generating {len(student_ids)} certificates for {event.title} in the background', 'info')
+        return redirect(url_for('bulk_certificates', job=job.id))
     
     # Get data for template
     events = Event.query.order_by(Event.created_at.desc()).all()
@@ -607,7 +672,264 @@ def bulk_certificates():
     for event in events:
         event.participant_count = len(event.participants)
     
-    return render_template('bulk_certificates.html', events=events, templates=templates)
+    return render_template('bulk_certificates.html', events=events, templates=templates,
+                           job_id=request.args.get('job'))
+
+def _store_certificate(certificate, event, student, pdf_path, certificate_type='default'):
+    """Move a generated PDF into the content-addressed store and point the Certificate row at it"""
+    old_path = certificate.certificate_path
+    certificate.certificate_path = store_file(pdf_path)
+    fingerprint_certificate(certificate, event, student, certificate.template_id, certificate_type)
+    # The superseded PDF is deleted once nothing else refers to it
+    if old_path and old_path != certificate.certificate_path:
+        release_file(old_path)
+    return certificate.certificate_path
+
+def _record_certificate(student, event, template_id, pdf_path, certificate_type='default'):
+    """Store a newly generated PDF as the student's certificate for an event; returns the stored path"""
+    certificate = Certificate.query.filter_by(student_id=student.id, event_id=event.id).first()
+    if not certificate:
+        certificate = Certificate(
+            student_id=student.id, 
+            event_id=event.id, 
+            template_id=template_id
+        )
+        db.session.add(certificate)
+    return _store_certificate(certificate, event, student, pdf_path, certificate_type)
+
+def _job_design(job):
+    """The template id and certificate type a bulk job was submitted with"""
+    template_id = int(job.template_id) if job.template_id else None
+    return template_id, job.options.get('certificate_type', 'default')
+
+@BULK_JOBS.runner('certificates')
+def _run_certificates_job(job, checkpoint):
+    """Generate the pending certificates of a job; Certificate rows are committed with each checkpoint"""
+    items = {item.student_id: item for item in pending_items(job)}
+    students = [item.student for item in items.values()]
+    template_id, certificate_type = _job_design(job)
+    
+    def progress(student, pdf_path):
+        if pdf_path:
+            pdf_path = _record_certificate(student, job.event, template_id, pdf_path, certificate_type)
+        checkpoint.mark(items[student.id], pdf_path is not None, pdf_path)
+        # Give way to anyone waiting on a single certificate
+        wait_for_interactive()
+    
+    generate_bulk_certificates(job.event, students, app.config['CERTIFICATE_FOLDER'], template_id, certificate_type,
+                               workers=app.config['RENDER_WORKERS'], progress=progress)
+    return {'successful': job.done, 'failed': job.failed}
+
+@BULK_JOBS.runner('booklet')
+def _run_booklet_job(job, checkpoint):
+    """Write the event booklet; a half-written booklet cannot be resumed, so it always starts over"""
+    reset_items(job)
+    items = {item.student_id: item for item in pending_items(job)}
+    students = [item.student for item in items.values()]
+    template_id, certificate_type = _job_design(job)
+    
+    def progress(student, booklet_path):
+        checkpoint.mark(items[student.id], booklet_path is not None)
+        wait_for_interactive()
+    
+    pdf_paths = generate_bulk_certificates(job.event, students, app.config['CERTIFICATE_FOLDER'], template_id,
+                                           certificate_type, single_pdf=True, progress=progress)
+    booklet_path = next((path for path in pdf_paths if path), None)
+    if not booklet_path:
+        raise RuntimeError('Error generating certificate booklet')
+    return {'successful': job.done, 'failed': job.failed, 'booklet_path': booklet_path,
+            'download_name': f'certificates_{job.event.title.replace(" ", "_")}.pdf'}
+
+@OUTBOX.sent('certificate')
+def _certificate_email_sent(message):
+    """Record the PDF a certificate email announced as the student's certificate"""
+    if message.certificate_path and os.path.exists(message.certificate_path):
+        message.certificate_path = _record_certificate(message.student, message.event, None,
+                                                       message.certificate_path)
+
+@BULK_JOBS.runner('email')
+def _run_email_job(job, checkpoint):
+    """Email the pending certificates of a job through the outbox, checkpointing after every email.
+    
+    Students this event already emailed are skipped without rendering
+    anything, and a PDF left from an earlier failed send is reused. Emails
+    that fail with a transient error stay queued and are retried in the
+    background, so rerunning the job only touches students whose email
+    finally failed.
+    """
+    event = job.event
+    items = {}
+    skipped = 0
+    
+    def messages():
+        nonlocal skipped
+        # The event's email is rendered once; each student's only has their name and link filled in
+        composer = CertificateEmailComposer(event)
+        for item in pending_items(job):
+            student = item.student
+            
+            queued = OUTBOX.find(event.id, student.id, 'certificate')
+            if queued is not None and queued.status == 'sent':
+                skipped += 1
+                checkpoint.mark(item, True, queued.certificate_path)
+                continue
+            
+            try:
+                if queued is not None and queued.certificate_path and os.path.exists(queued.certificate_path):
+                    pdf_path = queued.certificate_path
+                else:
+                    # Generate certificate
+                    pdf_path = generate_certificate_pdf(event, student, app.config['CERTIFICATE_FOLDER'])
+                
+                if pdf_path:
+                    download_url = url_for('generate_pdf', event_id=event.id, student_id=student.id, _external=True)
+                    email = composer.compose(student, download_url)
+                    message = OUTBOX.enqueue(event.id, student.id, 'certificate', student.email, email['subject'],
+                                             email['body'], email['html_body'], certificate_path=pdf_path)
+                    claimed = OUTBOX.claim([message.id])
+                    if claimed:
+                        items[message.id] = item
+                        yield claimed[0]
+                        continue
+                    error = 'Email is already being sent'
+                else:
+                    error = 'Certificate could not be generated'
+                    
+            except Exception as e:
+                print(f"Error sending email to {student.email}: {e}")
+                error = str(e)
+            
+            checkpoint.mark(item, False, error=error)
+            checkpoint.commit()
+    
+    def sent(message, result):
+        item = items.pop(message.id)
+        if result['skipped']:
+            checkpoint.mark(item, False, error='Email is already being sent')
+        elif result['ok']:
+            checkpoint.mark(item, True, message.certificate_path)
+        elif result['deferred_until'] is not None:
+            checkpoint.mark(item, False, error=f"Email queued for later: {result['error']}")
+        elif message.status == 'queued':
+            checkpoint.mark(item, False, error=f"Email will be retried: {result['error']}")
+        else:
+            checkpoint.mark(item, False, error='Email could not be sent')
+        checkpoint.commit()
+        wait_for_interactive()
+    
+    # Links in the emails point at the host the job was submitted from
+    with app.test_request_context(base_url=job.options.get('base_url')):
+        report = OUTBOX.deliver(messages(), sent)
+    if report['retrying'] or report['deferred']:
+        OUTBOX.wake()
+    
+    return {'successful': job.done, 'failed': job.failed, 'already_sent': skipped, 'retrying': report['retrying'],
+            'deferred': report['deferred']}
+
+@BULK_JOBS.runner('refresh')
+def _run_refresh_job(job, checkpoint):
+    """Re-render the certificates a regeneration plan found stale, keeping each one's template"""
+    items = {item.student_id: item for item in pending_items(job)}
+    certificates = {cert.student_id: cert for cert in
+                    Certificate.query.filter(Certificate.event_id == job.event_id,
+                                             Certificate.student_id.in_(list(items)))}
+    
+    def progress(student, pdf_path):
+        if pdf_path:
+            pdf_path = _store_certificate(certificates[student.id], job.event, student, pdf_path)
+        checkpoint.mark(items[student.id], pdf_path is not None, pdf_path)
+        wait_for_interactive()
+    
+    groups = {}
+    for item in items.values():
+        if item.student_id in certificates:
+            groups.setdefault(certificates[item.student_id].template_id, []).append(item.student)
+        else:
+            checkpoint.mark(item, False, error='Certificate was deleted')
+    for template_id, students in groups.items():
+        generate_bulk_certificates(job.event, students, app.config['CERTIFICATE_FOLDER'], template_id,
+                                   workers=app.config['RENDER_WORKERS'], progress=progress)
+    
+    result = dict(job.options.get('plan', {}))
+    result.update({'successful': job.done, 'failed': job.failed})
+    return result
+
+@app.route('/regenerate_certificates/<int:event_id>', methods=['GET', 'POST'])
+@login_required
+def regenerate_certificates(event_id):
+    """GET: JSON report of which certificates are stale and why. POST: re-render only those in the background"""
+    event = Event.query.get_or_404(event_id)
+    plan = plan_regeneration(event)
+    
+    if request.method == 'GET':
+        return jsonify(plan)
+    
+    if not plan['stale']:
+        flash(f'All {plan["checked"]} certificates for {event.title} are up to date', 'success')
+        return redirect(url_for('bulk_certificates'))
+    
+    changes = ', '.join(f'{name} ({count})' for name, count in sorted(plan['by_change'].items()))
+    job = BULK_JOBS.submit('refresh', event.id, [cert['student_id'] for cert in plan['certificates']],
+                           label=f'{event.title} (refresh {plan["stale"]} of {plan["checked"]})',
+                           options={'plan': {key: plan[key] for key in ('checked', 'unchanged', 'stale', 'by_change')}})
+    flash(f'Regenerating {plan["stale"]} of {plan["checked"]} certificates for {event.title}; changed: {changes}',
+          'info')
+    return redirect(url_for('bulk_certificates', job=job.id))
+
+@app.route('/bulk_jobs/<job_id>')
+@login_required
+def bulk_job_status(job_id):
+    """JSON progress of a background bulk job: counts, ETA and, for booklets, a download link"""
+    job = BulkJob.query.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    status = job_status(job)
+    result = status['result'] or {}
+    if result.pop('booklet_path', None):
+        result['download_url'] = url_for('download_bulk_job', job_id=job.id)
+    result.pop('download_name', None)
+    status['result'] = result or None
+    return jsonify(status)
+
+@app.route('/bulk_jobs/<job_id>/download')
+@login_required
+def download_bulk_job(job_id):
+    """Download the booklet produced by a finished bulk job"""
+    job = BulkJob.query.get(job_id)
+    result = job.result if job is not None and job.status == 'finished' else None
+    if not result or not result.get('booklet_path') or not os.path.exists(result['booklet_path']):
+        flash('That certificate booklet is not available', 'error')
+        return redirect(url_for('bulk_certificates'))
+    return send_file(result['booklet_path'], as_attachment=True, download_name=result['download_name'])
+
+@app.route('/bulk_certificates/<int:event_id>/zip')
+@login_required
+def download_certificates_zip(event_id):
+    """Stream a ZIP of every participant's certificate, rendered as the archive is written"""
+    event = Event.query.get_or_404(event_id)
+    if not EventParticipant.query.filter_by(event_id=event_id).first():
+        flash('No students registered for this event', 'warning')
+        return redirect(url_for('bulk_certificates'))
+
+    template_id = request.args.get('template_id', type=int)
+    certificate_type = request.args.get('certificate_type', 'default')
+    filename = f'certificates_{secure_filename(event.title) or event.id}.zip'
+    archive = stream_certificate_zip(event, template_id, certificate_type)
+    return Response(stream_with_context(archive), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/email_outbox')
+@login_required
+def email_outbox_status():
+    """Counts of queued, sending, sent and failed outbox emails, optionally for one event"""
+    return jsonify(outbox_status(request.args.get('event_id', type=int)))
+
+@app.route('/render_stats')
+@login_required
+def render_stats():
+    """Per-stage timing summaries of the latest bulk runs in this process"""
+    return jsonify(list(RECENT_RUNS))
 
 # EMAIL ROUTES
 
@@ -651,10 +973,12 @@ def send_certificate_email(event_id, student_id):
         return redirect(url_for('dashboard'))
     
     try:
-        pdf_path = generate_certificate_pdf(event, student, app.config['CERTIFICATE_FOLDER'])
-        if pdf_path:
+        with interactive_render():
+            pdf_path, pdf_data = get_or_render_certificate(event, student, app.config['CERTIFICATE_CACHE_FOLDER'])
+        if pdf_path and pdf_data is None:
             with open(pdf_path, 'rb') as f:
                 pdf_data = f.read()
+        if pdf_data:
             download_url = url_for('generate_pdf', event_id=event.id, student_id=student.id, _external=True)
             # Main change: use the new email sender function!
             ok = send_certificate_email_flask(student, event, pdf_data, download_url)
@@ -688,68 +1012,12 @@ def bulk_email_certificates():
         flash('No students registered for this event', 'warning')
         return redirect(url_for('bulk_certificates'))
     
-    successful_emails = 0
-    failed_emails = 0
-    
-    for participation in participants:
-        student = participation.student
-        
-        try:
-            # Generate certificate
-            pdf_path = generate_certificate_pdf(event, student, app.config['CERTIFICATE_FOLDER'])
-            
-            if pdf_path:
-                subject = f"🏆 Your Certificate - {event.title}"
-                
-                body = f"""
-Dear {student.name},
-
-Your certificate for "{event.title}" is ready!
-
-📋 Event Details:
-• Event: {event.title} ({event.event_type.value})
-• Date: {event.date.strftime('%B %d, %Y')}
-• Organizer: {event.organizer}
-• Location: {event.location}
-
-Download Link: {url_for('generate_pdf', event_id=event_id, student_id=student.id, _external=True)}
-
-Congratulations on your participation!
-
-Best regards,
-{event.organizer}
-"""
-                
-                if send_email(subject, student.email, body):
-                    successful_emails += 1
-                    
-                    # Record certificate
-                    existing_cert = Certificate.query.filter_by(student_id=student.id, event_id=event_id).first()
-                    if not existing_cert:
-                        certificate = Certificate(
-                            student_id=student.id,
-                            event_id=event_id,
-                            certificate_path=pdf_path
-                        )
-                        db.session.add(certificate)
-                else:
-                    failed_emails += 1
-            else:
-                failed_emails += 1
-                
-        except Exception as e:
-            print(f"Error sending email to {student.email}: {e}")
-            failed_emails += 1
-    
-    db.session.commit()
-    
-    # Show results
-    if successful_emails > 0:
-        flash(f'✅ Successfully sent {successful_emails} certificate notifications!', 'success')
-    if failed_emails > 0:
-        flash(f'❌ {failed_emails} emails failed to send', 'warning')
-    
-    return redirect(url_for('bulk_certificates'))
+    # Sending runs as a durable background job, so a restart resumes instead of emailing everyone again
+    job = BULK_JOBS.submit('email', event.id, [p.student_id for p in participants],
+                           label=f'{event.title} ({len(participants)} students)',
+                           options={'base_url': request.host_url})
+    flash(f'Emailing certificates to {len(participants)} students in the background', 'info')
+    return redirect(url_for('bulk_certificates', job=job.id))
 
 @app.route('/send_custom_email', methods=['POST'])
 @login_required
@@ -763,24 +1031,12 @@ def send_custom_email():
         flash('Please fill all fields and select recipients', 'error')
         return redirect(request.referrer)
     
-    successful = 0
-    failed = 0
-    
+    # Sent by the outbox worker, which retries failures and waits out the send quotas
     for email in recipient_emails:
-        try:
-            if send_email(subject, email, message):
-                successful += 1
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"Error sending to {email}: {e}")
-            failed += 1
-    
-    if successful > 0:
-        flash(f'✅ Sent {successful} emails successfully!', 'success')
-    if failed > 0:
-        flash(f'❌ {failed} emails failed to send', 'warning')
+        OUTBOX.enqueue(None, None, 'custom', email, subject, message)
+    OUTBOX.wake()
     
+    flash(f'✅ Queued {len(recipient_emails)} emails; they are sent in the background', 'success')
     return redirect(request.referrer)
 
 # PDF GENERATION ROUTES
@@ -793,12 +1049,6 @@ def generate_pdf(event_id, student_id, template_id=None):
     event = Event.query.get_or_404(event_id)
     student = Student.query.get_or_404(student_id)
 
-    pdf_path = generate_enhanced_certificate(
-            event=event, 
-            student=student, 
-            certificate_folder=app.config['CERTIFICATE_FOLDER']
-        )
-    
     # Check if student is registered for this event
     participation = EventParticipant.query.filter_by(event_id=event_id, student_id=student_id).first()
     if not participation:
@@ -806,23 +1056,35 @@ def generate_pdf(event_id, student_id, template_id=None):
         return redirect(url_for('dashboard'))
     
     try:
-        pdf_path = generate_certificate_pdf(event, student, app.config['CERTIFICATE_FOLDER'], template_id)
+        # Unchanged certificates are served from the cache without re-rendering
+        with interactive_render():
+            pdf_path, pdf_data = get_or_render_certificate(event, student, app.config['CERTIFICATE_CACHE_FOLDER'],
+                                                           template_id)
         
         if pdf_path:
-            # Record certificate generation
+            # Record certificate generation; the row points at a stored copy, the cache keeps its own file
             existing_cert = Certificate.query.filter_by(student_id=student_id, event_id=event_id).first()
             if not existing_cert:
+                if pdf_data is None:
+                    with open(pdf_path, 'rb') as f:
+                        stored_path = store_bytes(f.read())
+                else:
+                    stored_path = store_bytes(pdf_data)
                 certificate = Certificate(
                     student_id=student_id, 
                     event_id=event_id, 
                     template_id=template_id,
-                    certificate_path=pdf_path
+                    certificate_path=stored_path
                 )
+                fingerprint_certificate(certificate, event, student, template_id)
                 db.session.add(certificate)
                 db.session.commit()
             
-            # Send file
+            # Send file - straight from memory when it was just rendered
             filename = f'certificate_{student.name.replace(" ", "_")}_{event.title.replace(" ", "_")}.pdf'
+            if pdf_data:
+                return send_file(BytesIO(pdf_data), mimetype='application/pdf', as_attachment=True,
+                                 download_name=filename)
             return send_file(pdf_path, as_attachment=True, download_name=filename)
         else:
             flash('Error generating certificate. Please try again.', 'error')
@@ -912,11 +1174,31 @@ def terms():
 def help_page():
     return render_template('help.html')
 
+# CLI COMMANDS
+
+@app.cli.command('gc-certificates')
+@click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+@click.option('--min-age-hours', default=1.0, show_default=True, help='Keep files younger than this')
+@click.option('--include-cache', is_flag=True, help='Also delete unreferenced render cache entries')
+def gc_certificates(dry_run, min_age_hours, include_cache):
+    """Delete certificate PDFs no Certificate row or booklet job refers to"""
+    skip = [] if include_cache else [app.config['CERTIFICATE_CACHE_FOLDER']]
+    report = collect_garbage(app.config['CERTIFICATE_FOLDER'], skip, dry_run, min_age_hours * 3600)
+    
+    action = 'Would delete' if dry_run else 'Deleted'
+    print(f"✓ Scanned {report['scanned']} files: {report['referenced']} referenced, "
+          f"{report['too_recent']} too recent to collect")
+    print(f"✓ {action} {report['deleted']} unreferenced files, "
+          f"{report['bytes_reclaimed'] / (1024 * 1024):.1f} MB reclaimed")
+    for error in report['errors']:
+        print(f"✗ {error}")
+
 # Run the application
 if __name__ == '__main__':
     with app.app_context():
         try:
             db.create_all()
+            add_missing_columns()
             
             # Create admin user if not exists
             admin = User.query.filter_by(username='admin').first()
@@ -0,0 +1,314 @@
+import os
+import queue
+import socket
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from time import monotonic
+
+from models import db, BulkJob, BulkJobItem
+
+
+# Bulk jobs run one at a time in the background; later submissions wait their turn
+BULK_JOB_WORKERS = 1
+
+# Item states are committed every this many items or seconds, whichever comes first
+CHECKPOINT_ITEMS = 25
+CHECKPOINT_SECONDS = 2.0
+
+# A job run on another host whose worker has sent no heartbeat for this long is taken over by the next
+# process that starts; workers on this host are checked by pid instead
+STALE_AFTER = timedelta(seconds=60)
+
+# Seconds between the heartbeats written while a job runs, well inside STALE_AFTER
+HEARTBEAT_SECONDS = 15
+
+# Longest a bulk job pauses for interactive renders before carrying on anyway
+INTERACTIVE_WAIT_SECONDS = 10
+
+UNFINISHED = ('queued', 'running')
+
+# Identifies this process in BulkJob.worker_id as host:pid:start, so a later process that
+# happens to get the same pid (as in a restarted container) is not taken for this one
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Interactive renders in flight; bulk jobs hold back between certificates while any are running
+_interactive_count = 0
+_interactive_idle = threading.Condition()
+
+
+@contextmanager
+def interactive_render():
+    """Mark a user-facing render so running bulk jobs pause until it is done"""
+    global _interactive_count
+    with _interactive_idle:
+        _interactive_count += 1
+    try:
+        yield
+    finally:
+        with _interactive_idle:
+            _interactive_count -= 1
+            if _interactive_count == 0:
+                _interactive_idle.notify_all()
+
+
+def wait_for_interactive(timeout=INTERACTIVE_WAIT_SECONDS):
+    """Block while interactive renders are running, for at most timeout seconds"""
+    with _interactive_idle:
+        _interactive_idle.wait_for(lambda: _interactive_count == 0, timeout)
+
+
+class Checkpoint:
+    """Records item outcomes for a running job and commits them in small batches.
+
+    Anything else the runner adds to the session (such as Certificate rows)
+    is committed in the same transaction as the items it belongs to.
+    """
+
+    def __init__(self, job, every=CHECKPOINT_ITEMS, seconds=CHECKPOINT_SECONDS, heartbeat_seconds=HEARTBEAT_SECONDS):
+        self.job = job
+        self.every = every
+        self.seconds = seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._unsaved = 0
+        self._last = monotonic()
+
+    def mark(self, item, ok, certificate_path=None, error=None):
+        item.status = 'done' if ok else 'failed'
+        item.certificate_path = certificate_path
+        item.error = error
+        item.updated_at = datetime.utcnow()
+        if ok:
+            self.job.done += 1
+        else:
+            self.job.failed += 1
+        self._unsaved += 1
+        if self._unsaved >= self.every or monotonic() - self._last >= self.seconds:
+            self.commit()
+
+    def commit(self):
+        now = datetime.utcnow()
+        self.job.heartbeat_at = now
+        # Queued jobs this process owns stay claimed while they wait behind this one
+        BulkJob.query.filter(BulkJob.worker_id == WORKER_ID, BulkJob.status == 'queued',
+                             BulkJob.id != self.job.id).update({'heartbeat_at': now}, synchronize_session=False)
+        db.session.commit()
+        self._unsaved = 0
+        self._last = monotonic()
+
+    @contextmanager
+    def keep_alive(self, app):
+        """Write heartbeats from a background thread while the job runs.
+
+        Stages that commit no items for a while (saving a booklet, starting
+        the render pool, waiting for email quota) then still show the job's
+        worker as alive. The thread has its own session, so it never commits
+        the runner's unfinished work.
+        """
+        stop = threading.Event()
+        job_id = self.job.id
+
+        def beat():
+            while not stop.wait(self.heartbeat_seconds):
+                try:
+                    with app.app_context():
+                        BulkJob.query.filter(BulkJob.worker_id == WORKER_ID,
+                                             db.or_(BulkJob.id == job_id, BulkJob.status == 'queued')).update(
+                            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+                        db.session.commit()
+                except Exception as e:
+                    print(f"✗ Heartbeat for bulk job {job_id} could not be written: {e}")
+
+        thread = threading.Thread(target=beat, name=f"bulk-job-heartbeat-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+def pending_items(job):
+    """Items of a job that still have to be processed, in submission order"""
+    return job.items.filter_by(status='pending').order_by(BulkJobItem.position).all()
+
+
+def reset_items(job):
+    """Put every item of a job back to pending, for jobs that can only be redone from the start"""
+    job.items.update({'status': 'pending', 'certificate_path': None, 'error': None, 'updated_at': None},
+                     synchronize_session=False)
+    job.done = 0
+    job.failed = 0
+    db.session.commit()
+
+
+def job_status(job):
+    """Progress of a job as a JSON-ready dict, with an ETA while it runs"""
+    processed = job.done + job.failed
+    elapsed = None
+    eta = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if job.status == 'running' and processed:
+            eta = elapsed / processed * (job.total - processed)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'label': job.label,
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'failed': job.failed,
+        'percent': round(processed / job.total * 100, 1) if job.total else 100.0,
+        'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+        'eta_seconds': round(eta, 1) if eta is not None else None,
+        'error': job.error,
+        'result': job.result,
+        'created_at': job.created_at.isoformat(timespec='seconds') if job.created_at else None,
+        'finished_at': job.finished_at.isoformat(timespec='seconds') if job.finished_at else None,
+    }
+
+
+def _worker_gone(job, now):
+    """Whether the process recorded on an unfinished job is no longer working on it.
+
+    A worker on this host is looked up by pid, however long since its last
+    heartbeat; only one on another host is judged by heartbeat age.
+    """
+    if not job.worker_id:
+        return True
+    if job.worker_id == WORKER_ID:
+        return False
+    host, pid = (job.worker_id.split(':') + [''])[:2]
+    if host != socket.gethostname():
+        return job.heartbeat_at is None or now - job.heartbeat_at > STALE_AFTER
+    if pid == str(os.getpid()):
+        # Our pid with another start token: an earlier process that had the same pid
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return True
+    except OSError:
+        # Exists but belongs to another user
+        return False
+    return False
+
+
+class JobQueue:
+    """Queue of durable bulk jobs run by daemon threads in this process.
+
+    Jobs and their items live in the bulk_jobs and bulk_job_items tables;
+    the queue only holds job ids. Runners are registered per job kind with
+    the runner() decorator and are called as runner(job, checkpoint) inside
+    an app context. They should only touch pending items, so a job picked
+    up again after a crash carries on where its last checkpoint left off.
+    """
+
+    def __init__(self, workers=BULK_JOB_WORKERS):
+        self.workers = workers
+        self.app = None
+        self._runners = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def init_app(self, app):
+        self.app = app
+
+    def runner(self, kind):
+        """Decorator registering the function that processes jobs of a kind"""
+        def decorator(func):
+            self._runners[kind] = func
+            return func
+        return decorator
+
+    def submit(self, kind, event_id, student_ids, label=None, template_id=None, options=None):
+        """Store a job with one pending item per student, queue it and return it"""
+        now = datetime.utcnow()
+        job = BulkJob(id=uuid.uuid4().hex, kind=kind, label=label, event_id=event_id,
+                      template_id=str(template_id) if template_id else None, status='queued',
+                      total=len(student_ids), done=0, failed=0, worker_id=WORKER_ID, heartbeat_at=now)
+        job.options = options or {}
+        db.session.add(job)
+        db.session.bulk_insert_mappings(BulkJobItem, [
+            {'job_id': job.id, 'student_id': student_id, 'position': position, 'status': 'pending'}
+            for position, student_id in enumerate(student_ids)
+        ])
+        db.session.commit()
+        self._enqueue(job.id)
+        return job
+
+    def resume(self):
+        """Take over unfinished jobs whose worker has gone away; returns how many were queued"""
+        now = datetime.utcnow()
+        resumed = 0
+        for job in BulkJob.query.filter(BulkJob.status.in_(UNFINISHED)).order_by(BulkJob.created_at):
+            if not _worker_gone(job, now):
+                continue
+            # Compare-and-swap on the previous owner, so two restarted processes cannot both claim it
+            claimed = BulkJob.query.filter_by(id=job.id, worker_id=job.worker_id).update(
+                {'worker_id': WORKER_ID, 'heartbeat_at': now}, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                print(f"✓ Resuming bulk job {job.label} ({job.done + job.failed} of {job.total} already processed)")
+                self._enqueue(job.id)
+                resumed += 1
+        return resumed
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"bulk-job-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._queue.put(job_id)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self._run(job_id)
+            except Exception as e:
+                print(f"✗ Bulk job {job_id} could not be run: {e}")
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        now = datetime.utcnow()
+        claimed = BulkJob.query.filter(BulkJob.id == job_id, BulkJob.worker_id == WORKER_ID,
+                                       BulkJob.status.in_(UNFINISHED)).update(
+            {'status': 'running', 'heartbeat_at': now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            # Another process took the job over while it was waiting here
+            return
+
+        job = BulkJob.query.get(job_id)
+        if job.started_at is None:
+            job.started_at = now
+            db.session.commit()
+
+        checkpoint = Checkpoint(job)
+        try:
+            with checkpoint.keep_alive(self.app):
+                result = self._runners[job.kind](job, checkpoint)
+            checkpoint.commit()
+            job.result = result
+            job.status = 'finished'
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Bulk job {job.label} failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+BULK_JOBS = JobQueue()
@@ -0,0 +1,143 @@
+import os
+import time
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+from models import db, Certificate, CertificateTemplate, EventParticipant, Student
+from render_engines import resolve_render_engine
+from certificate_generator import (
+    OUTPUT_BYTES, _generate_resolved, _resolve_output_profile, _resolve_upload_folder, build_static_layer,
+    build_student_layouts, resolve_certificate_type,
+)
+
+
+# Participants loaded, laid out and rendered together; bounds memory however large the event is
+ZIP_BATCH_SIZE = 200
+
+# Chunk size for copying already generated certificate files into the archive
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _entry_name(student):
+    """Archive name for a student's certificate; the id keeps students with the same name apart"""
+    name = secure_filename(student.name or "") or "student"
+    return f"certificate_{name}_{student.id}.pdf"
+
+
+def _zip_info(name):
+    # PDFs are compressed already, so deflating them again costs CPU for almost no saving
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return info
+
+
+def iter_participant_batches(event_id, batch_size=ZIP_BATCH_SIZE):
+    """Yield an event's participants in batches of (student, existing certificate path or None)"""
+    student_ids = [row.student_id for row in db.session.query(EventParticipant.student_id)
+                   .filter_by(event_id=event_id).order_by(EventParticipant.id)]
+
+    for start in range(0, len(student_ids), batch_size):
+        batch_ids = student_ids[start:start + batch_size]
+        students = {s.id: s for s in Student.query.filter(Student.id.in_(batch_ids))}
+        certificates = Certificate.query.filter(Certificate.event_id == event_id,
+                                                Certificate.student_id.in_(batch_ids)).all()
+        paths = {cert.student_id: cert.certificate_path for cert in certificates}
+
+        yield [(students[sid], paths.get(sid)) for sid in batch_ids if sid in students]
+
+        # Drop the batch from the session so the identity map does not grow with the event
+        for obj in list(students.values()) + certificates:
+            db.session.expunge(obj)
+
+
+def stream_certificate_zip(event, template_id=None, certificate_type="default", upload_folder=None,
+                           batch_size=ZIP_BATCH_SIZE):
+    """Yield a ZIP archive of every participant's certificate, in non-empty chunks.
+
+    Certificates that were already generated are copied from their
+    Certificate.certificate_path; the rest are rendered in memory as the
+    archive is written. Only one batch of participants and one certificate
+    are held at a time. Students whose certificate could not be produced are
+    listed in a FAILED.txt entry at the end.
+    """
+    # An empty chunk would end a chunked response early
+    for chunk in _write_certificate_zip(event, template_id, certificate_type, upload_folder, batch_size):
+        if chunk:
+            yield chunk
+
+
+def _write_certificate_zip(event, template_id, certificate_type, upload_folder, batch_size):
+    upload_folder = _resolve_upload_folder(upload_folder)
+    template = CertificateTemplate.query.get(template_id) if template_id else None
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    profile = _resolve_output_profile()
+    render_engine = resolve_render_engine(template)
+
+    static_layer = None
+    try:
+        static_layer = build_static_layer(event, resolved_type, template, upload_folder, profile.level)
+    except Exception as e:
+        print(f"Could not prepare static layer, drawing each certificate in full: {e}")
+
+    sink = _ZipSink()
+    failed = []
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for batch in iter_participant_batches(event.id, batch_size):
+            to_render = [student for student, path in batch if not (path and os.path.exists(path))]
+            layouts = dict(zip((s.id for s in to_render),
+                               build_student_layouts(resolved_type, to_render, event, template)))
+
+            for student, path in batch:
+                entry = _zip_info(_entry_name(student))
+
+                if student.id not in layouts:
+                    with archive.open(entry, 'w') as dest, open(path, 'rb') as src:
+                        for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                            dest.write(chunk)
+                            yield sink.drain()
+                    continue
+
+                try:
+                    if render_engine.name == "reportlab":
+                        pdf_data = _generate_resolved(resolved_type, event, student, template, None, upload_folder,
+                                                      static_layer, output=OUTPUT_BYTES, layout=layouts[student.id],
+                                                      profile=profile)
+                    else:
+                        pdf_data = render_engine.render(resolved_type, event, student, template, None,
+                                                        upload_folder, output=OUTPUT_BYTES, profile=profile)
+                except Exception as e:
+                    pdf_data = None
+                    print(f"Failed to generate certificate for {student.name}: {e}")
+                if not pdf_data:
+                    failed.append(f"{student.id}\t{student.name}")
+                    continue
+
+                archive.writestr(entry, pdf_data)
+                yield sink.drain()
+
+        if failed:
+            archive.writestr(_zip_info("FAILED.txt"),
+                             "Certificates that could not be generated:\n" + "\n".join(failed) + "\n")
+
+    # Closing the archive writes the central directory
+    yield sink.drain()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import uuid
+
+from models import CertificateTemplate
+from certificate_generator import (
+    OUTPUT_BYTES, _resolve_output_profile, _resolve_upload_folder, resolve_certificate_type,
+)
+from render_assets import DEFAULT_OUTPUT_PROFILE
+from render_engines import DEFAULT_RENDER_ENGINE, resolve_render_engine
+from render_pool import EVENT_FIELDS, STUDENT_FIELDS, TEMPLATE_FIELDS
+
+
+# Bump when a generator's drawing code changes so stale cached PDFs are not served
+CACHE_VERSION = 4
+
+# (path, mtime, size) -> sha256 of the file, so unchanged assets are hashed once per process
+_asset_hashes = {}
+
+
+def file_content_hash(path):
+    """sha256 of a file's bytes, or None when the file does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _asset_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        _asset_hashes[key] = digest.hexdigest()
+    return _asset_hashes[key]
+
+
+def _fields(obj, fields):
+    if obj is None:
+        return None
+    return {field: getattr(obj, field, None) for field in fields}
+
+
+def _asset_hashes_for(event, template, upload_folder):
+    """Content hashes of every image the generators may draw for this event/template"""
+    assets = {}
+    for field in ('background_path', 'logo_path', 'signature_path'):
+        name = getattr(event, field, None)
+        assets[field] = file_content_hash(os.path.join(upload_folder, name)) if name else None
+    if template is not None:
+        for field in ('background_image', 'logo_image', 'signature_image'):
+            path = getattr(template, field, None)
+            assets[f"template_{field}"] = file_content_hash(path) if path else None
+    return assets
+
+
+def _fingerprint_payload(event, student, template, certificate_type, upload_folder, profile=None, engine=None):
+    payload = {
+        'version': CACHE_VERSION,
+        'certificate_type': certificate_type,
+        'event': _fields(event, EVENT_FIELDS),
+        'student': _fields(student, STUDENT_FIELDS),
+        'template': _fields(template, TEMPLATE_FIELDS),
+        'assets': _asset_hashes_for(event, template, upload_folder),
+    }
+    # Only a non-default profile or a budget is recorded, so fingerprints stored before profiles still match
+    if profile is not None and (profile.name != DEFAULT_OUTPUT_PROFILE or profile.max_bytes is not None):
+        payload['output'] = {'profile': profile.name, 'max_bytes': profile.max_bytes}
+    if engine is not None and engine != DEFAULT_RENDER_ENGINE:
+        payload['engine'] = engine
+    return payload
+
+
+def _hash_json(value):
+    encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def certificate_fingerprint(event, student, template, certificate_type, upload_folder, profile=None, engine=None):
+    """Hash of everything that affects a rendered certificate's content.
+
+    The issue date printed on the certificate is deliberately left out, so a
+    cached certificate keeps the date it was first issued on.
+    """
+    return _hash_json(_fingerprint_payload(event, student, template, certificate_type, upload_folder, profile,
+                                           engine))
+
+
+def certificate_fingerprint_parts(event, student, template, certificate_type, upload_folder, profile=None,
+                                  engine=None):
+    """(fingerprint, {part: hash}) where the parts (event, student, template, assets...) show what changed"""
+    payload = _fingerprint_payload(event, student, template, certificate_type, upload_folder, profile, engine)
+    parts = {name: _hash_json(value) for name, value in payload.items()}
+    return _hash_json(payload), parts
+
+
+def changed_parts(old_parts, new_parts):
+    """Names of the fingerprint parts that differ, sorted"""
+    return sorted(name for name in set(old_parts) | set(new_parts) if old_parts.get(name) != new_parts.get(name))
+
+
+def fingerprint_certificate(certificate, event, student, template_id=None, certificate_type="default",
+                            upload_folder=None, profile=None, max_bytes=None, engine=None):
+    """Store on a Certificate row the fingerprint of the inputs it is being rendered from"""
+    upload_folder = _resolve_upload_folder(upload_folder)
+    template = CertificateTemplate.query.get(template_id) if template_id else None
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    profile = _resolve_output_profile(profile, max_bytes)
+    engine = resolve_render_engine(template, engine)
+    fingerprint, parts = certificate_fingerprint_parts(event, student, template, resolved_type, upload_folder,
+                                                       profile, engine.name)
+    certificate.fingerprint = fingerprint
+    certificate.fingerprint_parts = json.dumps(parts, sort_keys=True)
+    return certificate
+
+
+def get_or_render_certificate(event, student, cache_folder, template_id=None, certificate_type="default",
+                              upload_folder=None, profile=None, max_bytes=None, engine=None):
+    """Serve a certificate from the cache, rendering and storing it on a miss.
+
+    Returns (pdf_path, pdf_data). pdf_data holds the freshly rendered bytes on
+    a miss and is None on a hit, so callers only read the file when they need
+    the bytes. Both are None if rendering failed.
+    """
+    upload_folder = _resolve_upload_folder(upload_folder)
+    template = CertificateTemplate.query.get(template_id) if template_id else None
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    profile = _resolve_output_profile(profile, max_bytes)
+    engine = resolve_render_engine(template, engine)
+
+    fingerprint = certificate_fingerprint(event, student, template, resolved_type, upload_folder, profile,
+                                          engine.name)
+    pdf_path = os.path.join(cache_folder, f"{fingerprint}.pdf")
+    if os.path.exists(pdf_path):
+        return pdf_path, None
+
+    pdf_data = engine.render(resolved_type, event, student, template, None, upload_folder,
+                             output=OUTPUT_BYTES, profile=profile)
+    if not pdf_data:
+        return None, None
+
+    # Write to a temporary name first so a concurrent reader never sees half a file
+    os.makedirs(cache_folder, exist_ok=True)
+    tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_data)
+    os.replace(tmp_path, pdf_path)
+    return pdf_path, pdf_data
@@ -1,38 +1,31 @@
 from reportlab.lib.pagesizes import letter, A4, landscape
 from reportlab.pdfgen import canvas
+from reportlab import rl_config
 from reportlab.lib.units import inch, mm
 from reportlab.lib.colors import HexColor, black, gold, white
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import os
+import time
+from io import BytesIO
 from datetime import datetime
 from models import CertificateTemplate
 from certificate_texts import format_certificate_text
+from static_layer import StaticLayer
+from render_assets import DEFAULT_OUTPUT_PROFILE, OUTPUT_PROFILES, draw_cached_image, image_quality, render_image_path
+from render_trace import debug, render_trace, stage, trace_run, traced
+from font_registry import ensure_font, fit_font_size
+from text_layout import TextStyle, build_layout_table, draw_text_layout
+from layout_engine import (
+    draw_template_static, draw_template_student, get_compiled_layout, has_layout, layout_template_students,
+)
 
 
-# Font registration - handles missing font gracefully
-def register_custom_fonts():
-    """Register custom fonts with fallback handling"""
-    try:
-        font_path = r"D:\Work Place\per - Copy\Text\Story_Script\StoryScript-Regular.ttf"
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont("StoryScript", font_path))
-            return True
-        else:
-            print(f"Warning: Custom font not found at {font_path}")
-            return False
-    except Exception as e:
-        print(f"Error registering custom font: {e}")
-        return False
+# Pass as output= to any generator to get the PDF back as bytes instead of a file
+OUTPUT_BYTES = "bytes"
 
-# Initialize fonts on module load
-CUSTOM_FONT_AVAILABLE = register_custom_fonts()
-
-
-# Initialize fonts on module load
-CUSTOM_FONT_AVAILABLE = register_custom_fonts()
+# Horizontal space kept clear on each side when names and titles are shrunk to fit
+TEXT_MARGIN = 80
 
 
 def hex_to_color(hex_string):
@@ -45,68 +38,79 @@ def hex_to_color(hex_string):
 
 def get_font(font_name, fallback="Helvetica"):
     """Get font with fallback if custom font not available"""
-    if font_name == "StoryScript" and CUSTOM_FONT_AVAILABLE:
-        return "StoryScript"
+    if ensure_font(font_name):
+        return font_name
     return fallback
 
 
-def get_image_paths(event, upload_folder):
-    """Get all image paths from event with proper fallbacks"""
+def draw_fitted_centred_string(c, x, y, text, font_name, max_size, max_width):
+    """Draw centred text at max_size, shrinking it only as far as needed to fit max_width"""
+    font_size = fit_font_size(text, font_name, max_size, max_width)
+    c.setFont(font_name, font_size)
+    c.drawCentredString(x, y, text)
+    return font_size
+
+
+@traced('asset_lookup')
+def get_image_paths(event, upload_folder, page_variant='page_landscape'):
+    """Get all image paths from event with proper fallbacks, preferring their render variants"""
     background_image = None
     logo_image = None
     signature_image = None
     
     # Debug prints
-    print(f"Event ID: {event.id}")
-    print(f"Upload folder: {upload_folder}")
+    debug(f"Event ID: {event.id}")
+    debug(f"Upload folder: {upload_folder}")
     
     # Background image from event
     if hasattr(event, 'background_path') and event.background_path:
-        background_image = os.path.join(upload_folder, event.background_path)
-        print(f"Background: {background_image}, exists: {os.path.exists(background_image)}")
+        background_image = render_image_path(os.path.join(upload_folder, event.background_path), page_variant)
+        debug(f"Background: {background_image}, exists: {os.path.exists(background_image)}")
     else:
-        print("No background path in event")
+        debug("No background path in event")
     
     # Logo image from event
     if hasattr(event, 'logo_path') and event.logo_path:
-        logo_image = os.path.join(upload_folder, event.logo_path)
-        print(f"Logo: {logo_image}, exists: {os.path.exists(logo_image)}")
+        logo_image = render_image_path(os.path.join(upload_folder, event.logo_path), 'box')
+        debug(f"Logo: {logo_image}, exists: {os.path.exists(logo_image)}")
     else:
-        print("No logo path in event")
+        debug("No logo path in event")
     
     # Signature image from event
     if hasattr(event, 'signature_path') and event.signature_path:
-        signature_image = os.path.join(upload_folder, event.signature_path)
-        print(f"Signature: {signature_image}, exists: {os.path.exists(signature_image)}")
+        signature_image = render_image_path(os.path.join(upload_folder, event.signature_path), 'box')
+        debug(f"Signature: {signature_image}, exists: {os.path.exists(signature_image)}")
     else:
-        print("No signature path in event")
+        debug("No signature path in event")
     
     return background_image, logo_image, signature_image
 
+@traced('images')
 def draw_image_if_exists(canvas, image_path, x, y, width, height, preserveAspectRatio=True, mask='auto'):
     """Safely draw image if it exists"""
     if image_path and os.path.exists(image_path):
         try:
-            canvas.drawImage(image_path, x, y, width=width, height=height, 
-                           preserveAspectRatio=preserveAspectRatio, mask=mask)
-            print(f"✓ Image drawn successfully: {os.path.basename(image_path)}")
+            draw_cached_image(canvas, image_path, x, y, width, height,
+                              preserveAspectRatio=preserveAspectRatio, mask=mask)
+            debug(f"✓ Image drawn successfully: {os.path.basename(image_path)}")
             return True
         except Exception as e:
             print(f"✗ Error drawing image {os.path.basename(image_path)}: {e}")
             return False
     else:
-        print(f"✗ Image not found or path is None: {image_path}")
+        debug(f"✗ Image not found or path is None: {image_path}")
         return False
 
+@traced('background')
 def draw_certificate_background(c, width, height, background_image=None, default_color='#FAFAFA'):
     """Draw certificate background - image or color"""
     background_drawn = False
     
     if background_image and os.path.exists(background_image):
         try:
-            c.drawImage(background_image, 0, 0, width, height, preserveAspectRatio=False)
+            draw_cached_image(c, background_image, 0, 0, width, height, preserveAspectRatio=False)
             background_drawn = True
-            print("✓ Background image drawn")
+            debug("✓ Background image drawn")
         except Exception as e:
             print(f"✗ Error drawing background: {e}")
     
@@ -114,19 +118,20 @@ def draw_certificate_background(c, width, height, background_image=None, default
     if not background_drawn:
         c.setFillColor(HexColor(default_color))
         c.rect(0, 0, width, height, fill=1)
-        print("✓ Default background color applied")
+        debug("✓ Default background color applied")
     
     return background_drawn
 
+@traced('border')
 def draw_ornamental_border(c, width, height, config, background_image=None):
     """Draw image background first, then ornamental border"""
     
     # Draw background image if provided and exists
     if background_image and os.path.exists(background_image):
         try:
-            c.drawImage(background_image, 0, 0, width=width, height=height, 
-                       preserveAspectRatio=False, mask='auto')
-            print("✓ Background image drawn in ornamental border")
+            draw_cached_image(c, background_image, 0, 0, width, height,
+                              preserveAspectRatio=False, mask='auto')
+            debug("✓ Background image drawn in ornamental border")
         except Exception as e:
             print(f"✗ Error drawing background image: {e}")
     
@@ -160,6 +165,7 @@ def draw_ornamental_border(c, width, height, config, background_image=None):
         c.line(x - corner_size/3, y, x + corner_size/3, y)
         c.line(x, y - corner_size/3, x, y + corner_size/3)
 
+@traced('border')
 def draw_decorative_elements(c, width, height, colors):
     """Add decorative flourishes and elements"""
     primary = hex_to_color(colors.get('primary', '#D4AF37'))
@@ -191,271 +197,248 @@ def draw_decorative_elements(c, width, height, colors):
     c.arc(width - 250, bottom_y - 30, width - 150, bottom_y + 30, 0, 180)
 
 
-def generate_custom_font_certificate(event, student, certificate_folder):
-    """Generate certificate with custom StoryScript font and dynamic text (NO RANKING)"""
-    filename = f"certificate_custom_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(certificate_folder, filename)
-    
-    try:
-        from flask import current_app
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'static/uploads')
-        
-        width, height = landscape(A4)
-        c = canvas.Canvas(filepath, pagesize=(width, height))
-        
-        # Get image paths and certificate text
-        background_image, logo_image, signature_image = get_image_paths(event, upload_folder)
-        cert_text = format_certificate_text(event, student)  # NO RANKING PARAMETER
-        
-        # Draw background and logo
-        draw_certificate_background(c, width, height, background_image)
-        if logo_image:
-            draw_image_if_exists(c, logo_image, 60, height - 160, 120, 120)
-        
-        # Dynamic Title based on event type
-        title_font = get_font("StoryScript", "Helvetica-Bold")
-        c.setFont(title_font, 45)
-        c.setFillColor(HexColor('#D4AF37'))
-        c.drawCentredString(width/2, height - 150, cert_text['title'])
-        
-        # Dynamic Subtitle
-        c.setFont(title_font, 30)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(width/2, height - 190, cert_text['subtitle'])
-        
-        # Student Name
-        c.setFont(title_font, 40)
-        c.setFillColor(HexColor('#000000'))
-        c.drawCentredString(width/2, height - 260, student.name.upper())
-        
-        # Dynamic Accomplishment
-        body_font = get_font("StoryScript", "Helvetica")
-        c.setFont(body_font, 16)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(width/2, height - 300, cert_text['accomplishment'])
-        
-        # Event title with emphasis
-        c.setFont(body_font, 24)
-        c.setFillColor(HexColor('#D4AF37'))
-        c.drawCentredString(width/2, height - 340, f'"{event.title}"')
-        
-        # Dynamic closing
-        c.setFont(body_font, 14)
-        c.setFillColor(HexColor('#555555'))
-        c.drawCentredString(width/2, height - 370, cert_text['closing'])
-        
-        # Event details
-        detail_y = height - 410
-        c.setFont(body_font, 12)
-        c.setFillColor(HexColor('#666666'))
-        
-        event_details = []
-        if hasattr(event, 'organizer') and event.organizer:
-            event_details.append(f"Organized by: {event.organizer}")
-        if hasattr(event, 'location') and event.location:
-            event_details.append(f"Venue: {event.location}")
-        if hasattr(event, 'start_date') and event.start_date:
-            if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
-                event_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
-            else:
-                event_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
-        
-        for detail in event_details[:3]:
-            c.drawCentredString(width/2, detail_y, detail)
-            detail_y -= 18
-        
-        # Signature section
-        signature_y = 120
-        c.setFont(body_font, 14)
-        c.setFillColor(HexColor('#333333'))
-        
-        c.drawString(100, signature_y, f"Date: {datetime.now().strftime('%B %d, %Y')}")
-        c.drawRightString(width - 100, signature_y, "Authorized Signature")
-        
-        # Draw signature
-        if signature_image:
-            draw_image_if_exists(c, signature_image, width - 250, signature_y + 10, 120, 50)
-        
-        # Certificate ID and footer
-        c.setFont("Helvetica", 8)
-        c.setFillColor(HexColor('#888888'))
-        cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
-        c.drawCentredString(width/2, 40, cert_id)
-        
-        c.setFont("Helvetica-Oblique", 7)
-        c.drawCentredString(width/2, 25, "Generated by Certificate Management System")
-        
-        c.save()
-        print(f"✓ Custom certificate saved: {filepath}")
-        return filepath
-        
-    except Exception as e:
-        print(f"Error generating custom certificate: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+def _resolve_upload_folder(upload_folder=None):
+    """Use the given upload folder, or the Flask app setting when rendering inside a request"""
+    if upload_folder is not None:
+        return upload_folder
+    from flask import current_app
+    return current_app.config.get('UPLOAD_FOLDER', 'static/uploads')
 
-def generate_enhanced_certificate(event, student, certificate_folder):
-    """Enhanced certificate with dual signatures and dynamic text (NO RANKING)"""
-    filename = f"certificate_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(certificate_folder, filename)
-    
-    try:
-        from flask import current_app
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'static/uploads')
-        
-        width, height = landscape(A4)
-        c = canvas.Canvas(filepath, pagesize=(width, height))
-        
-        # Get image paths and certificate text
-        background_image, logo_image, signature_image = get_image_paths(event, upload_folder)
-        cert_text = format_certificate_text(event, student)  # NO RANKING PARAMETER
-        
-        # Draw background and logo
-        draw_certificate_background(c, width, height, background_image)
-        if logo_image:
-            draw_image_if_exists(c, logo_image, 60, height - 160, 120, 120)
-        
-        # Use custom font if available
-        title_font = get_font("StoryScript", "Helvetica-Bold")
-        body_font = get_font("StoryScript", "Helvetica")
-        
-        # Dynamic Title
-        c.setFont(title_font, 45)
-        c.setFillColor(HexColor('#D4AF37'))
-        c.drawCentredString(width/2, height - 150, cert_text['title'])
-        
-        # Dynamic Subtitle
-        c.setFont(title_font, 30)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(width/2, height - 190, cert_text['subtitle'])
-        
-        # Student Name
-        c.setFont(title_font, 40)
-        c.setFillColor(HexColor('#000000'))
-        c.drawCentredString(width/2, height - 260, student.name.upper())
-        
-        # Dynamic Accomplishment
-        c.setFont(body_font, 16)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(width/2, height - 300, cert_text['accomplishment'])
-        
-        # Event title with highlight
-        c.setFont(body_font, 24)
-        c.setFillColor(HexColor('#D4AF37'))
-        c.drawCentredString(width/2, height - 340, f'"{event.title}"')
-        
-        # Dynamic closing
-        c.setFont(body_font, 14)
-        c.setFillColor(HexColor('#555555'))
-        c.drawCentredString(width/2, height - 370, cert_text['closing'])
-        
-        # Event details
-        details_y = height - 410
-        c.setFont(body_font, 12)
-        c.setFillColor(HexColor('#666666'))
-        
-        basic_details = []
-        if hasattr(event, 'organizer') and event.organizer:
-            basic_details.append(f"Organized by: {event.organizer}")
-        if hasattr(event, 'location') and event.location:
-            basic_details.append(f"Venue: {event.location}")
-        if hasattr(event, 'start_date') and event.start_date:
-            if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
-                basic_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
-            else:
-                basic_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
-        
-        for detail in basic_details:
-            c.drawCentredString(width/2, details_y, detail)
-            details_y -= 18
-        
-        # Dual signature section
-        signature_y = 120
-        
-        # LEFT SIGNATURE
-        left_sig_x = 150
-        if signature_image:
-            draw_image_if_exists(c, signature_image, left_sig_x - 50, signature_y + 10, 100, 40)
-        
-        c.setStrokeColor(HexColor('#333333'))
-        c.setLineWidth(1)
-        c.line(left_sig_x - 60, signature_y, left_sig_x + 60, signature_y)
-        
-        c.setFont(body_font, 11)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(left_sig_x, signature_y - 15, "Director/Principal")
-        
-        c.setFont("Helvetica-Oblique", 9)
-        c.setFillColor(HexColor('#666666'))
-        c.drawCentredString(left_sig_x, signature_y - 30, "Authorized Signature")
-        
-        # RIGHT DATE
-        right_sig_x = width - 150
-        c.line(right_sig_x - 60, signature_y, right_sig_x + 60, signature_y)
-        
-        c.setFont(body_font, 11)
-        c.setFillColor(HexColor('#333333'))
-        c.drawCentredString(right_sig_x, signature_y - 15, "Program Coordinator")
-        
-        c.setFont("Helvetica-Oblique", 9)
-        c.setFillColor(HexColor('#666666'))
-        c.drawCentredString(right_sig_x, signature_y - 30, f"Date: {datetime.now().strftime('%B %d, %Y')}")
-        
-        # Certificate ID
-        c.setFont("Helvetica", 8)
-        c.setFillColor(HexColor('#999999'))
-        cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
-        c.drawCentredString(width/2, 40, cert_id)
-        
-        # Footer
-        c.setFont("Helvetica-Oblique", 7)
-        c.drawCentredString(width/2, 25, "Generated by Certificate Management System")
-        
-        c.save()
-        print(f"✓ Enhanced certificate saved: {filepath}")
-        return filepath
-        
-    except Exception as e:
-        print(f"Error generating enhanced certificate: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
 
-def generate_premium_certificate(event, student, template, certificate_folder):
-    """Generate premium certificate with template support"""
-    filename = f"certificate_{student.id}_{event.id}_{template.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(certificate_folder, filename)
-    
-    try:
-        c = canvas.Canvas(filepath, pagesize=A4)
-        width, height = A4
-        
-        config = template.template_config
-        colors = config.get('colors', {})
-        fonts = config.get('fonts', {})
-        
-        # ADD EVENT BACKGROUND IMAGE SUPPORT
-        from flask import current_app
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'static/uploads')
-        
+def _draw_custom_font_static(c, width, height, event, template, upload_folder):
+    """Draw everything on the custom font certificate that does not depend on the student"""
+    # Get image paths and certificate text
+    background_image, logo_image, signature_image = get_image_paths(event, upload_folder)
+    cert_text = format_certificate_text(event, None)  # NO RANKING PARAMETER
+
+    # Draw background and logo
+    draw_certificate_background(c, width, height, background_image)
+    if logo_image:
+        draw_image_if_exists(c, logo_image, 60, height - 160, 120, 120)
+
+    # Dynamic Title based on event type
+    title_font = get_font("StoryScript", "Helvetica-Bold")
+    c.setFillColor(HexColor('#D4AF37'))
+    draw_fitted_centred_string(c, width/2, height - 150, cert_text['title'], title_font, 45,
+                               width - 2 * TEXT_MARGIN)
+
+    # Dynamic Subtitle
+    c.setFont(title_font, 30)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(width/2, height - 190, cert_text['subtitle'])
+
+    # Dynamic Accomplishment
+    body_font = get_font("StoryScript", "Helvetica")
+    c.setFont(body_font, 16)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(width/2, height - 300, cert_text['accomplishment'])
+
+    # Event title with emphasis
+    c.setFillColor(HexColor('#D4AF37'))
+    draw_fitted_centred_string(c, width/2, height - 340, f'"{event.title}"', body_font, 24,
+                               width - 2 * TEXT_MARGIN)
+
+    # Dynamic closing
+    c.setFont(body_font, 14)
+    c.setFillColor(HexColor('#555555'))
+    c.drawCentredString(width/2, height - 370, cert_text['closing'])
+
+    # Event details
+    detail_y = height - 410
+    c.setFont(body_font, 12)
+    c.setFillColor(HexColor('#666666'))
+
+    event_details = []
+    if hasattr(event, 'organizer') and event.organizer:
+        event_details.append(f"Organized by: {event.organizer}")
+    if hasattr(event, 'location') and event.location:
+        event_details.append(f"Venue: {event.location}")
+    if hasattr(event, 'start_date') and event.start_date:
+        if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
+            event_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
+        else:
+            event_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
+
+    for detail in event_details[:3]:
+        c.drawCentredString(width/2, detail_y, detail)
+        detail_y -= 18
+
+    # Signature section
+    signature_y = 120
+    c.setFont(body_font, 14)
+    c.setFillColor(HexColor('#333333'))
+
+    c.drawRightString(width - 100, signature_y, "Authorized Signature")
+
+    # Draw signature
+    if signature_image:
+        draw_image_if_exists(c, signature_image, width - 250, signature_y + 10, 120, 50)
+
+    # Footer
+    c.setFont("Helvetica-Oblique", 7)
+    c.setFillColor(HexColor('#888888'))
+    c.drawCentredString(width/2, 25, "Generated by Certificate Management System")
+
+
+def _draw_custom_font_student(c, width, height, event, student, template, layout=None):
+    """Draw the student name and certificate ID on the custom font certificate"""
+    if layout is None:
+        layout = build_student_layouts("custom_font", [student])[0]
+
+    # Student Name
+    c.setFillColor(HexColor('#000000'))
+    draw_text_layout(c, width/2, height - 260, layout['name'])
+
+    # Issue date, drawn per certificate so a cached static layer never carries an old one
+    c.setFont(get_font("StoryScript", "Helvetica"), 14)
+    c.setFillColor(HexColor('#333333'))
+    c.drawString(100, 120, f"Date: {datetime.now().strftime('%B %d, %Y')}")
+
+    # Certificate ID
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor('#888888'))
+    cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
+    c.drawCentredString(width/2, 40, cert_id)
+
+
+def _draw_enhanced_static(c, width, height, event, template, upload_folder):
+    """Draw everything on the enhanced certificate that does not depend on the student"""
+    # Get image paths and certificate text
+    background_image, logo_image, signature_image = get_image_paths(event, upload_folder)
+    cert_text = format_certificate_text(event, None)  # NO RANKING PARAMETER
+
+    # Draw background and logo
+    draw_certificate_background(c, width, height, background_image)
+    if logo_image:
+        draw_image_if_exists(c, logo_image, 60, height - 160, 120, 120)
+
+    # Use custom font if available
+    title_font = get_font("StoryScript", "Helvetica-Bold")
+    body_font = get_font("StoryScript", "Helvetica")
+
+    # Dynamic Title
+    c.setFillColor(HexColor('#D4AF37'))
+    draw_fitted_centred_string(c, width/2, height - 150, cert_text['title'], title_font, 45,
+                               width - 2 * TEXT_MARGIN)
+
+    # Dynamic Subtitle
+    c.setFont(title_font, 30)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(width/2, height - 190, cert_text['subtitle'])
+
+    # Dynamic Accomplishment
+    c.setFont(body_font, 16)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(width/2, height - 300, cert_text['accomplishment'])
+
+    # Event title with highlight
+    c.setFillColor(HexColor('#D4AF37'))
+    draw_fitted_centred_string(c, width/2, height - 340, f'"{event.title}"', body_font, 24,
+                               width - 2 * TEXT_MARGIN)
+
+    # Dynamic closing
+    c.setFont(body_font, 14)
+    c.setFillColor(HexColor('#555555'))
+    c.drawCentredString(width/2, height - 370, cert_text['closing'])
+
+    # Event details
+    details_y = height - 410
+    c.setFont(body_font, 12)
+    c.setFillColor(HexColor('#666666'))
+
+    basic_details = []
+    if hasattr(event, 'organizer') and event.organizer:
+        basic_details.append(f"Organized by: {event.organizer}")
+    if hasattr(event, 'location') and event.location:
+        basic_details.append(f"Venue: {event.location}")
+    if hasattr(event, 'start_date') and event.start_date:
+        if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
+            basic_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
+        else:
+            basic_details.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
+
+    for detail in basic_details:
+        c.drawCentredString(width/2, details_y, detail)
+        details_y -= 18
+
+    # Dual signature section
+    signature_y = 120
+
+    # LEFT SIGNATURE
+    left_sig_x = 150
+    if signature_image:
+        draw_image_if_exists(c, signature_image, left_sig_x - 50, signature_y + 10, 100, 40)
+
+    c.setStrokeColor(HexColor('#333333'))
+    c.setLineWidth(1)
+    c.line(left_sig_x - 60, signature_y, left_sig_x + 60, signature_y)
+
+    c.setFont(body_font, 11)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(left_sig_x, signature_y - 15, "Director/Principal")
+
+    c.setFont("Helvetica-Oblique", 9)
+    c.setFillColor(HexColor('#666666'))
+    c.drawCentredString(left_sig_x, signature_y - 30, "Authorized Signature")
+
+    # RIGHT DATE
+    right_sig_x = width - 150
+    c.line(right_sig_x - 60, signature_y, right_sig_x + 60, signature_y)
+
+    c.setFont(body_font, 11)
+    c.setFillColor(HexColor('#333333'))
+    c.drawCentredString(right_sig_x, signature_y - 15, "Program Coordinator")
+
+    # Footer
+    c.setFont("Helvetica-Oblique", 7)
+    c.setFillColor(HexColor('#999999'))
+    c.drawCentredString(width/2, 25, "Generated by Certificate Management System")
+
+
+def _draw_enhanced_student(c, width, height, event, student, template, layout=None):
+    """Draw the student name and certificate ID on the enhanced certificate"""
+    if layout is None:
+        layout = build_student_layouts("enhanced", [student])[0]
+
+    # Student Name
+    c.setFillColor(HexColor('#000000'))
+    draw_text_layout(c, width/2, height - 260, layout['name'])
+
+    # Issue date under the coordinator line
+    c.setFont("Helvetica-Oblique", 9)
+    c.setFillColor(HexColor('#666666'))
+    c.drawCentredString(width - 150, 120 - 30, f"Date: {datetime.now().strftime('%B %d, %Y')}")
+
+    # Certificate ID
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor('#999999'))
+    cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
+    c.drawCentredString(width/2, 40, cert_id)
+
+
+def _draw_premium_static(c, width, height, event, template, upload_folder):
+    """Draw everything on the premium certificate that does not depend on the student"""
+    config = template.template_config
+    colors = config.get('colors', {})
+
+    with stage('background'):
         # Try event background first, then template background
         background_drawn = False
         if hasattr(event, 'background_path') and event.background_path:
-            background_image = os.path.join(upload_folder, event.background_path)
+            background_image = render_image_path(os.path.join(upload_folder, event.background_path), 'page_portrait')
             if os.path.exists(background_image):
                 try:
-                    c.drawImage(background_image, 0, 0, width, height, preserveAspectRatio=False)
+                    draw_cached_image(c, background_image, 0, 0, width, height, preserveAspectRatio=False)
                     background_drawn = True
-                    print("✓ Event background image drawn in premium certificate")
+                    debug("✓ Event background image drawn in premium certificate")
                 except Exception as e:
                     print(f"✗ Error drawing event background: {e}")
-        
+
         # Fallback to default background if no event background
         if not background_drawn:
             c.setFillColor(HexColor('#FAFAFA'))
             c.rect(0, 0, width, height, fill=1)
-            
+
             # Add subtle watermark
             c.saveState()
             c.setFillColor(HexColor('#F5F5F5'))
@@ -465,321 +448,624 @@ def generate_premium_certificate(event, student, template, certificate_folder):
             c.setFillAlpha(0.05)
             c.drawString(200, -100, "CERTIFIED")
             c.restoreState()
-        
-        # Draw ornamental border (but pass None as background since we already drew it)
-        draw_ornamental_border(c, width, height, config, background_image=None)
-        
+
+    # Draw ornamental border (but pass None as background since we already drew it)
+    draw_ornamental_border(c, width, height, config, background_image=None)
+
+    with stage('images'):
         # ADD EVENT LOGO SUPPORT - prioritize event logo over template logo
         logo_drawn = False
         if hasattr(event, 'logo_path') and event.logo_path:
-            event_logo = os.path.join(upload_folder, event.logo_path)
+            event_logo = render_image_path(os.path.join(upload_folder, event.logo_path), 'box')
             if os.path.exists(event_logo):
                 try:
-                    c.drawImage(event_logo, 80, height - 130, 80, 80, preserveAspectRatio=True, mask='auto')
+                    draw_cached_image(c, event_logo, 80, height - 130, 80, 80, preserveAspectRatio=True, mask='auto')
                     logo_drawn = True
-                    print("✓ Event logo drawn in premium certificate")
+                    debug("✓ Event logo drawn in premium certificate")
                 except Exception as e:
                     print(f"✗ Error drawing event logo: {e}")
-        
+
         # Fallback to template logo if no event logo
         if not logo_drawn and template.logo_image and os.path.exists(template.logo_image):
             try:
-                c.drawImage(template.logo_image, 80, height - 130, 80, 80, preserveAspectRatio=True)
-                print("✓ Template logo drawn in premium certificate")
+                draw_cached_image(c, template.logo_image, 80, height - 130, 80, 80, preserveAspectRatio=True)
+                debug("✓ Template logo drawn in premium certificate")
             except Exception as e:
                 print(f"✗ Error drawing template logo: {e}")
-        
-        # Institution name
-        header_font = get_font("StoryScript", "Helvetica-Bold")
-        c.setFont(header_font, 16)
-        c.setFillColor(hex_to_color(colors.get('text', '#333333')))
-        
-        organizer_name = getattr(event, 'organizer', 'Institution Name')
-        c.drawCentredString(width/2, height - 80, organizer_name.upper())
-        
-        # Main title with elegant styling
-        c.setFont(header_font, 42)
-        c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
-        title_y = height - 140
-        c.drawCentredString(width/2, title_y, "CERTIFICATE")
-        
-        c.setFont(header_font, 28)
-        c.drawCentredString(width/2, title_y - 35, "OF ACHIEVEMENT")
-        
-        # Add decorative elements
-        draw_decorative_elements(c, width, height, colors)
-        
-        # Certification text
-        body_font = get_font("StoryScript", "Helvetica-Oblique")
-        c.setFont(body_font, 18)
-        c.setFillColor(hex_to_color(colors.get('text', '#555555')))
-        text_y = height - 220
-        c.drawCentredString(width/2, text_y, "This is proudly presented to")
-        
-        # Student name with elegant box
-        name_y = text_y - 60
-        name_box_width = len(student.name) * 18 + 60
-        name_box_height = 50
-        
-        # Name background box
-        c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
-        c.setStrokeColor(hex_to_color(colors.get('accent', '#8B4513')))
-        c.setLineWidth(2)
-        c.rect((width - name_box_width)/2, name_y - 15, name_box_width, name_box_height, fill=1, stroke=1)
-        
-        # Student name
-        name_font = get_font("StoryScript", "Helvetica-Bold")
-        c.setFont(name_font, 36)
-        c.setFillColor(white)
-        c.drawCentredString(width/2, name_y + 5, student.name.upper())
-        
-        # Achievement description
-        achievement_y = name_y - 80
-        c.setFont(body_font, 16)
-        c.setFillColor(hex_to_color(colors.get('text', '#444444')))
-        
-        # Include event type in description
-        event_type_text = ""
-        if hasattr(event, 'event_type') and event.event_type:
-            event_type_text = f" ({event.event_type.value})"
-        
-        c.drawCentredString(width/2, achievement_y, f"for outstanding participation in {event.title}{event_type_text}")
-        
-        # Event title with highlight
-        event_y = achievement_y - 50
-        c.setFont(name_font, 24)
-        c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
-        c.drawCentredString(width/2, event_y, f'"{event.title}"')
-        
-        # Event details box
-        details_y = event_y - 100
-        details_box_height = 80
-        details_box_width = 400
-        
-        # Details background
-        c.setFillColor(HexColor('#F8F9FA'))
-        c.setStrokeColor(hex_to_color(colors.get('accent', '#8B4513')))
-        c.setLineWidth(1)
-        c.rect((width - details_box_width)/2, details_y - details_box_height/2, 
-               details_box_width, details_box_height, fill=1, stroke=1)
-        
-        # Event details text
-        c.setFont(body_font, 13)
-        c.setFillColor(hex_to_color(colors.get('text', '#333333')))
-        
-        details_lines = []
-        
-        if hasattr(event, 'event_type') and event.event_type:
-            details_lines.append(f"Event Type: {event.event_type.value}")
-        
-        if hasattr(event, 'location') and event.location:
-            details_lines.append(f"Venue: {event.location}")
-        
-        if hasattr(event, 'start_date') and event.start_date:
-            if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
-                details_lines.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
-            else:
-                details_lines.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
-        elif hasattr(event, 'date') and event.date:
-            details_lines.append(f"Date: {event.date.strftime('%B %d, %Y')}")
-        
-        for i, line in enumerate(details_lines[:3]):  # Limit to 3 lines
-            c.drawCentredString(width/2, details_y + 20 - (i * 18), line)
-        
-        # Signature section
-        signature_y = 140
-        
+
+    # Institution name
+    header_font = get_font("StoryScript", "Helvetica-Bold")
+    c.setFont(header_font, 16)
+    c.setFillColor(hex_to_color(colors.get('text', '#333333')))
+
+    organizer_name = getattr(event, 'organizer', 'Institution Name')
+    c.drawCentredString(width/2, height - 80, organizer_name.upper())
+
+    # Main title with elegant styling
+    c.setFont(header_font, 42)
+    c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
+    title_y = height - 140
+    c.drawCentredString(width/2, title_y, "CERTIFICATE")
+
+    c.setFont(header_font, 28)
+    c.drawCentredString(width/2, title_y - 35, "OF ACHIEVEMENT")
+
+    # Add decorative elements
+    draw_decorative_elements(c, width, height, colors)
+
+    # Certification text
+    body_font = get_font("StoryScript", "Helvetica-Oblique")
+    c.setFont(body_font, 18)
+    c.setFillColor(hex_to_color(colors.get('text', '#555555')))
+    text_y = height - 220
+    c.drawCentredString(width/2, text_y, "This is proudly presented to")
+
+    # Achievement description
+    name_y = text_y - 60
+    achievement_y = name_y - 80
+    c.setFont(body_font, 16)
+    c.setFillColor(hex_to_color(colors.get('text', '#444444')))
+
+    # Include event type in description
+    event_type_text = ""
+    if hasattr(event, 'event_type') and event.event_type:
+        event_type_text = f" ({event.event_type.value})"
+
+    draw_fitted_centred_string(c, width/2, achievement_y,
+                               f"for outstanding participation in {event.title}{event_type_text}",
+                               body_font, 16, width - 2 * TEXT_MARGIN)
+
+    # Event title with highlight
+    name_font = get_font("StoryScript", "Helvetica-Bold")
+    event_y = achievement_y - 50
+    c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
+    draw_fitted_centred_string(c, width/2, event_y, f'"{event.title}"', name_font, 24,
+                               width - 2 * TEXT_MARGIN)
+
+    # Event details box
+    details_y = event_y - 100
+    details_box_height = 80
+    details_box_width = 400
+
+    # Details background
+    c.setFillColor(HexColor('#F8F9FA'))
+    c.setStrokeColor(hex_to_color(colors.get('accent', '#8B4513')))
+    c.setLineWidth(1)
+    c.rect((width - details_box_width)/2, details_y - details_box_height/2,
+           details_box_width, details_box_height, fill=1, stroke=1)
+
+    # Event details text
+    c.setFont(body_font, 13)
+    c.setFillColor(hex_to_color(colors.get('text', '#333333')))
+
+    details_lines = []
+
+    if hasattr(event, 'event_type') and event.event_type:
+        details_lines.append(f"Event Type: {event.event_type.value}")
+
+    if hasattr(event, 'location') and event.location:
+        details_lines.append(f"Venue: {event.location}")
+
+    if hasattr(event, 'start_date') and event.start_date:
+        if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
+            details_lines.append(f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
+        else:
+            details_lines.append(f"Date: {event.start_date.strftime('%B %d, %Y')}")
+    elif hasattr(event, 'date') and event.date:
+        details_lines.append(f"Date: {event.date.strftime('%B %d, %Y')}")
+
+    for i, line in enumerate(details_lines[:3]):  # Limit to 3 lines
+        c.drawCentredString(width/2, details_y + 20 - (i * 18), line)
+
+    # Signature section
+    signature_y = 140
+
+    with stage('images'):
         # Left signature area - prioritize event signature over template signature
         left_sig_x = 120
         signature_drawn = False
         if hasattr(event, 'signature_path') and event.signature_path:
-            event_signature = os.path.join(upload_folder, event.signature_path)
+            event_signature = render_image_path(os.path.join(upload_folder, event.signature_path), 'box')
             if os.path.exists(event_signature):
                 try:
-                    c.drawImage(event_signature, left_sig_x - 40, signature_y, 80, 30, preserveAspectRatio=True, mask='auto')
+                    draw_cached_image(c, event_signature, left_sig_x - 40, signature_y, 80, 30,
+                                      preserveAspectRatio=True, mask='auto')
                     signature_drawn = True
-                    print("✓ Event signature drawn in premium certificate")
+                    debug("✓ Event signature drawn in premium certificate")
                 except Exception as e:
                     print(f"✗ Error drawing event signature: {e}")
-        
+
         # Fallback to template signature
         if not signature_drawn and template.signature_image and os.path.exists(template.signature_image):
             try:
-                c.drawImage(template.signature_image, left_sig_x - 40, signature_y, 80, 30, preserveAspectRatio=True)
-                print("✓ Template signature drawn in premium certificate")
+                draw_cached_image(c, template.signature_image, left_sig_x - 40, signature_y, 80, 30,
+                                  preserveAspectRatio=True)
+                debug("✓ Template signature drawn in premium certificate")
             except Exception as e:
                 print(f"✗ Error drawing template signature: {e}")
-        
-        c.setFont(body_font, 11)
-        c.setFillColor(black)
-        c.drawCentredString(left_sig_x, signature_y - 15, "Director/Principal")
-        c.setLineWidth(1)
-        c.line(left_sig_x - 60, signature_y - 20, left_sig_x + 60, signature_y - 20)
-        c.setFont("Helvetica-Oblique", 9)
-        c.drawCentredString(left_sig_x, signature_y - 35, "Authorized Signature")
-        
-        # Right date area
-        right_date_x = width - 120
-        c.setFont(body_font, 11)
-        c.drawCentredString(right_date_x, signature_y - 15, f"{datetime.now().strftime('%B %d, %Y')}")
-        c.line(right_date_x - 60, signature_y - 20, right_date_x + 60, signature_y - 20)
-        c.setFont("Helvetica-Oblique", 9)
-        c.drawCentredString(right_date_x, signature_y - 35, "Date of Issue")
-        
-        # Certificate ID
-        c.setFont("Helvetica", 8)
-        c.setFillColor(HexColor('#888888'))
-        cert_id = f"CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
-        c.drawString(60, 60, f"Certificate ID: {cert_id}")
-        
-        # Footer
-        c.setFont("Helvetica-Oblique", 8)
-        c.setFillColor(hex_to_color(colors.get('accent', '#8B4513')))
-        footer_text = f"Generated using {template.name} • Certificate Management System"
-        c.drawCentredString(width/2, 40, footer_text)
-        
-        c.save()
-        print(f"✓ Premium certificate saved: {filepath}")
-        return filepath
-        
-    except Exception as e:
-        print(f"Error generating premium certificate: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
 
+    c.setFont(body_font, 11)
+    c.setFillColor(black)
+    c.drawCentredString(left_sig_x, signature_y - 15, "Director/Principal")
+    c.setLineWidth(1)
+    c.line(left_sig_x - 60, signature_y - 20, left_sig_x + 60, signature_y - 20)
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawCentredString(left_sig_x, signature_y - 35, "Authorized Signature")
 
+    # Right date area
+    right_date_x = width - 120
+    c.line(right_date_x - 60, signature_y - 20, right_date_x + 60, signature_y - 20)
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawCentredString(right_date_x, signature_y - 35, "Date of Issue")
 
-def generate_certificate_with_template(event, student, template, certificate_folder):
-    """Generate certificate using specific template"""
-    return generate_premium_certificate(event, student, template, certificate_folder)
+    # Footer
+    c.setFont("Helvetica-Oblique", 8)
+    c.setFillColor(hex_to_color(colors.get('accent', '#8B4513')))
+    footer_text = f"Generated using {template.name} • Certificate Management System"
+    c.drawCentredString(width/2, 40, footer_text)
 
 
-def generate_basic_certificate(event, student, certificate_folder):
-    """Enhanced basic certificate generation"""
-    filename = f"certificate_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(certificate_folder, filename)
-    
-    try:
-        c = canvas.Canvas(filepath, pagesize=A4)
-        width, height = A4
-        
-        # ADD BACKGROUND IMAGE SUPPORT
-        from flask import current_app
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'static/uploads')
-        
+def _draw_premium_student(c, width, height, event, student, template, layout=None):
+    """Draw the boxed student name and certificate ID on the premium certificate"""
+    colors = template.template_config.get('colors', {})
+    if layout is None:
+        layout = build_student_layouts("premium", [student])[0]
+
+    # Student name with elegant box sized to the laid out name
+    name_y = height - 220 - 60
+    name_layout = layout['name']
+    extra_height = (len(name_layout.lines) - 1) * name_layout.leading
+    name_box_width = name_layout.width + 60
+    name_box_height = 50 + extra_height
+
+    # Name background box
+    c.setFillColor(hex_to_color(colors.get('primary', '#D4AF37')))
+    c.setStrokeColor(hex_to_color(colors.get('accent', '#8B4513')))
+    c.setLineWidth(2)
+    c.rect((width - name_box_width)/2, name_y - 15 - extra_height/2, name_box_width, name_box_height,
+           fill=1, stroke=1)
+
+    # Student name
+    c.setFillColor(white)
+    draw_text_layout(c, width/2, name_y + 5, name_layout)
+
+    # Issue date above the "Date of Issue" line
+    c.setFont(get_font("StoryScript", "Helvetica-Oblique"), 11)
+    c.setFillColor(black)
+    c.drawCentredString(width - 120, 140 - 15, f"{datetime.now().strftime('%B %d, %Y')}")
+
+    # Certificate ID
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor('#888888'))
+    cert_id = f"CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
+    c.drawString(60, 60, f"Certificate ID: {cert_id}")
+
+
+def _draw_basic_static(c, width, height, event, template, upload_folder):
+    """Draw everything on the basic certificate that does not depend on the student"""
+    with stage('background'):
         # Draw background image if available, otherwise use default background
         background_drawn = False
         if hasattr(event, 'background_path') and event.background_path:
-            background_image = os.path.join(upload_folder, event.background_path)
+            background_image = render_image_path(os.path.join(upload_folder, event.background_path), 'page_portrait')
             if os.path.exists(background_image):
                 try:
-                    c.drawImage(background_image, 0, 0, width, height, preserveAspectRatio=False)
+                    draw_cached_image(c, background_image, 0, 0, width, height, preserveAspectRatio=False)
                     background_drawn = True
-                    print("✓ Background image drawn in basic certificate")
+                    debug("✓ Background image drawn in basic certificate")
                 except Exception as e:
                     print(f"✗ Error drawing background in basic certificate: {e}")
-        
+
         # Only use default background if no image was drawn
         if not background_drawn:
             c.setFillColor(HexColor('#FAFAFA'))
             c.rect(0, 0, width, height, fill=1)
-        
+
+    with stage('images'):
         # ADD LOGO IMAGE SUPPORT
         if hasattr(event, 'logo_path') and event.logo_path:
-            logo_image = os.path.join(upload_folder, event.logo_path)
+            logo_image = render_image_path(os.path.join(upload_folder, event.logo_path), 'box')
             if os.path.exists(logo_image):
                 try:
-                    c.drawImage(logo_image, 60, height - 130, width=100, height=100,
-                               preserveAspectRatio=True, mask='auto')
-                    print("✓ Logo image drawn in basic certificate")
+                    draw_cached_image(c, logo_image, 60, height - 130, 100, 100,
+                                      preserveAspectRatio=True, mask='auto')
+                    debug("✓ Logo image drawn in basic certificate")
                 except Exception as e:
                     print(f"✗ Error drawing logo in basic certificate: {e}")
-        
-        # Border
-        #c.setStrokeColor(gold)
-        #c.setLineWidth(4)
-        #c.rect(40, 40, width-80, height-80)
-        
-        # Title with custom font
-        title_font = get_font("StoryScript", "Helvetica-Bold")
-        c.setFont(title_font, 36)
-        c.setFillColor(gold)
-        c.drawCentredString(width/2, height-180, "CERTIFICATE OF ACHIEVEMENT")
-        
-        # Decorative line
-        c.setStrokeColor(HexColor("#FBFBFB"))
-        c.setLineWidth(2)
-        c.line(150, height-200, width-150, height-200)
-        
-        # Content
-        body_font = get_font("StoryScript", "Helvetica")
-        c.setFont(body_font, 18)
-        c.setFillColor(black)
-        c.drawCentredString(width/2, height-240, "This is to certify that")
-        
-        c.setFont(title_font, 30)
-        c.setFillColor(gold)
-        c.drawCentredString(width/2, height-300, student.name.upper())
-        
-        c.setFont(body_font, 16)
-        c.setFillColor(black)
-        event_type_text = ""
-        if hasattr(event, 'event_type') and event.event_type:
-            event_type_text = f" ({event.event_type.value})"
-        
-        c.drawCentredString(width/2, height-340, f"has successfully participated in{event_type_text}")
-        
-        c.setFont(title_font, 22)
-        c.setFillColor(gold)
-        c.drawCentredString(width/2, height-380, event.title)
-        
-        # Event details
-        c.setFont(body_font, 14)
-        c.setFillColor(black)
-        
-        if hasattr(event, 'organizer') and event.organizer:
-            c.drawCentredString(width/2, height-420, f"Organized by: {event.organizer}")
-        
-        if hasattr(event, 'location') and event.location:
-            c.drawCentredString(width/2, height-440, f"Location: {event.location}")
-        
-        if hasattr(event, 'start_date') and event.start_date:
-            if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
-                c.drawCentredString(width/2, height-460, f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
-            else:
-                c.drawCentredString(width/2, height-480, f"Date: {event.start_date.strftime('%B %d, %Y')}")
-        elif hasattr(event, 'date') and event.date:
-            c.drawCentredString(width/2, height-460, f"Date: {event.date.strftime('%B %d, %Y')}")
-        
+
+    # Border
+    #c.setStrokeColor(gold)
+    #c.setLineWidth(4)
+    #c.rect(40, 40, width-80, height-80)
+
+    # Title with custom font
+    title_font = get_font("StoryScript", "Helvetica-Bold")
+    c.setFont(title_font, 36)
+    c.setFillColor(gold)
+    c.drawCentredString(width/2, height-180, "CERTIFICATE OF ACHIEVEMENT")
+
+    # Decorative line
+    c.setStrokeColor(HexColor("#FBFBFB"))
+    c.setLineWidth(2)
+    c.line(150, height-200, width-150, height-200)
+
+    # Content
+    body_font = get_font("StoryScript", "Helvetica")
+    c.setFont(body_font, 18)
+    c.setFillColor(black)
+    c.drawCentredString(width/2, height-240, "This is to certify that")
+
+    c.setFont(body_font, 16)
+    c.setFillColor(black)
+    event_type_text = ""
+    if hasattr(event, 'event_type') and event.event_type:
+        event_type_text = f" ({event.event_type.value})"
+
+    c.drawCentredString(width/2, height-340, f"has successfully participated in{event_type_text}")
+
+    c.setFillColor(gold)
+    draw_fitted_centred_string(c, width/2, height-380, event.title, title_font, 22, width - 2 * TEXT_MARGIN)
+
+    # Event details
+    c.setFont(body_font, 14)
+    c.setFillColor(black)
+
+    if hasattr(event, 'organizer') and event.organizer:
+        c.drawCentredString(width/2, height-420, f"Organized by: {event.organizer}")
+
+    if hasattr(event, 'location') and event.location:
+        c.drawCentredString(width/2, height-440, f"Location: {event.location}")
+
+    if hasattr(event, 'start_date') and event.start_date:
+        if hasattr(event, 'end_date') and event.end_date and event.start_date != event.end_date:
+            c.drawCentredString(width/2, height-460, f"Date: {event.start_date.strftime('%B %d, %Y')} - {event.end_date.strftime('%B %d, %Y')}")
+        else:
+            c.drawCentredString(width/2, height-480, f"Date: {event.start_date.strftime('%B %d, %Y')}")
+    elif hasattr(event, 'date') and event.date:
+        c.drawCentredString(width/2, height-460, f"Date: {event.date.strftime('%B %d, %Y')}")
+
+    with stage('images'):
         # ADD SIGNATURE IMAGE SUPPORT
         if hasattr(event, 'signature_path') and event.signature_path:
-            signature_image = os.path.join(upload_folder, event.signature_path)
+            signature_image = render_image_path(os.path.join(upload_folder, event.signature_path), 'box')
             if os.path.exists(signature_image):
                 try:
-                    c.drawImage(signature_image, width - 200, 100, 
-                               width=120, height=50, preserveAspectRatio=True, mask='auto')
-                    print("✓ Signature image drawn in basic certificate")
+                    draw_cached_image(c, signature_image, width - 200, 100, 120, 50,
+                                      preserveAspectRatio=True, mask='auto')
+                    debug("✓ Signature image drawn in basic certificate")
                 except Exception as e:
                     print(f"✗ Error drawing signature in basic certificate: {e}")
-        
-        # Signature line and text
-        c.setStrokeColor(black)
-        c.setLineWidth(1)
-        c.line(width - 200, 90, width - 80, 90)
-        c.setFont(body_font, 12)
-        c.drawCentredString(width - 140, 70, "Authorized Signature")
-        
-        # Certificate ID
-        c.setFont("Helvetica", 8)
-        c.setFillColor(HexColor('#888888'))
-        cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
-        c.drawCentredString(width/2, 50, cert_id)
-        
-        c.save()
-        print(f"✓ Basic certificate saved: {filepath}")
-        return filepath
-    
+
+    # Signature line and text
+    c.setStrokeColor(black)
+    c.setLineWidth(1)
+    c.line(width - 200, 90, width - 80, 90)
+    c.setFont(body_font, 12)
+    c.drawCentredString(width - 140, 70, "Authorized Signature")
+
+
+def _draw_basic_student(c, width, height, event, student, template, layout=None):
+    """Draw the student name and certificate ID on the basic certificate"""
+    if layout is None:
+        layout = build_student_layouts("basic", [student])[0]
+
+    c.setFillColor(gold)
+    draw_text_layout(c, width/2, height-300, layout['name'])
+
+    # Certificate ID
+    c.setFont("Helvetica", 8)
+    c.setFillColor(HexColor('#888888'))
+    cert_id = f"Certificate ID: CERT-{event.id}-{student.id}-{datetime.now().strftime('%Y%m%d')}"
+    c.drawCentredString(width/2, 50, cert_id)
+
+
+# Page size and drawing functions for each certificate type. Static drawers take
+# (c, width, height, event, template, upload_folder), student drawers take
+# (c, width, height, event, student, template, layout=None). The "template" type
+# runs a template's compiled declarative layout and takes its page size from it.
+CERTIFICATE_LAYOUTS = {
+    "custom_font": (landscape(A4), _draw_custom_font_static, _draw_custom_font_student),
+    "enhanced": (landscape(A4), _draw_enhanced_static, _draw_enhanced_student),
+    "premium": (A4, _draw_premium_static, _draw_premium_student),
+    "basic": (A4, _draw_basic_static, _draw_basic_student),
+    "template": (None, draw_template_static, draw_template_student),
+}
+
+
+def certificate_pagesize(certificate_type, template=None):
+    """Page size of a certificate type; template layouts choose their own"""
+    if certificate_type == "template":
+        return get_compiled_layout(template).pagesize
+    return CERTIFICATE_LAYOUTS[certificate_type][0]
+
+# Student text laid out before drawing, per certificate type. Each field maps to
+# (font, fallback font, max size, smallest one-line size before wrapping, max lines, box padding).
+STUDENT_TEXT_STYLES = {
+    "custom_font": {'name': ("StoryScript", "Helvetica-Bold", 40, 24, 2, 0)},
+    "enhanced": {'name': ("StoryScript", "Helvetica-Bold", 40, 24, 2, 0)},
+    "premium": {'name': ("StoryScript", "Helvetica-Bold", 36, 22, 2, 60)},
+    "basic": {'name': ("StoryScript", "Helvetica-Bold", 30, 18, 2, 0)},
+}
+
+
+def build_student_layouts(certificate_type, students, event=None, template=None):
+    """Lay out the student text of a whole run in one pass; returns one layout row per student"""
+    if certificate_type == "template":
+        return layout_template_students(event, students, template)
+
+    width = CERTIFICATE_LAYOUTS[certificate_type][0][0]
+    styles = {
+        field: TextStyle(get_font(font, fallback), max_size, width - 2 * TEXT_MARGIN - padding, min_size, max_lines)
+        for field, (font, fallback, max_size, min_size, max_lines, padding)
+        in STUDENT_TEXT_STYLES[certificate_type].items()
+    }
+    # A student without a usable name gets no row and fails on its own when drawn
+    rows = [{'name': student.name.upper()} if isinstance(student.name, str) else None for student in students]
+    return build_layout_table(rows, styles)
+
+
+def build_static_layer(event, certificate_type, template=None, upload_folder=None, image_level=0):
+    """The student-independent part of a certificate, drawn once per document as a form XObject"""
+    upload_folder = _resolve_upload_folder(upload_folder)
+    _, draw_static, _ = CERTIFICATE_LAYOUTS[certificate_type]
+    pagesize = certificate_pagesize(certificate_type, template)
+    width, height = pagesize
+    return StaticLayer(
+        pagesize,
+        lambda c: draw_static(c, width, height, event, template, upload_folder),
+        image_level
+    )
+
+
+class OutputProfile:
+    """An output profile from OUTPUT_PROFILES with an optional per-certificate byte budget.
+
+    One instance is shared by the renders of a run. When a certificate only
+    fits the budget with smaller images, the certificates after it start at
+    that image quality instead of stepping down again.
+    """
+
+    def __init__(self, name=DEFAULT_OUTPUT_PROFILE, max_bytes=None):
+        if name not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile: {name}")
+        self.name = name
+        self.max_bytes = max_bytes or None
+        self.levels, self.document_info = OUTPUT_PROFILES[name]
+        # Certificates of the run that stayed over the budget even at the smallest images
+        self.over_budget = 0
+        self._start = 0
+
+    @property
+    def level(self):
+        """Image quality level the next certificate is drawn at first"""
+        return self.levels[self._start]
+
+    def attempts(self):
+        """Image quality levels to try for the next certificate, best first"""
+        if self.max_bytes is None:
+            return self.levels[self._start:self._start + 1]
+        return self.levels[self._start:]
+
+    def settle(self, level):
+        """Remember the level a certificate fitted the budget at"""
+        self._start = self.levels.index(level)
+
+
+def _resolve_output_profile(profile=None, max_bytes=None):
+    """An OutputProfile for a profile name and byte budget, defaulting to the Flask app settings"""
+    if isinstance(profile, OutputProfile):
+        return profile
+    if profile is None or max_bytes is None:
+        from flask import current_app
+        profile = profile or current_app.config.get('CERTIFICATE_OUTPUT_PROFILE', DEFAULT_OUTPUT_PROFILE)
+        if max_bytes is None:
+            max_bytes = current_app.config.get('CERTIFICATE_MAX_BYTES')
+    return OutputProfile(profile, max_bytes)
+
+
+def _set_document_info(c, event, student=None):
+    """Title, author and subject in the PDF itself, so an archived file describes itself"""
+    c.setTitle(f"Certificate - {event.title}")
+    c.setAuthor(getattr(event, 'organizer', None) or "")
+    if student is not None:
+        c.setSubject(f"Awarded to {student.name}")
+    c.setCreator("Certificate Generator")
+
+
+def _describe_output(output):
+    """Short description of an output target for log messages"""
+    if isinstance(output, str) and output != OUTPUT_BYTES:
+        return output
+    return "in memory"
+
+
+def _issue_day_canvas(target, pagesize):
+    """Canvas whose PDF ID does not depend on the clock and whose dates are the start of the UTC day.
+
+    Re-rendering a certificate from the same inputs on the same day then
+    gives byte-identical PDFs, which content-addressed storage relies on.
+    ReportLab's invariant mode fixes the ID and timestamp; the dates written
+    are the issue day, through the public date formatter. SOURCE_DATE_EPOCH
+    and a global invariant setting keep ReportLab's own dates.
+    """
+    c = canvas.Canvas(target, pagesize=pagesize, invariant=1)
+    if rl_config.invariant or os.environ.get('SOURCE_DATE_EPOCH', '').strip():
+        return c
+
+    day = time.gmtime(int(time.time()) // 86400 * 86400)
+    c.setDateFormatter(lambda *_: "D:%04d%02d%02d000000+00'00'" % day[:3])
+    return c
+
+
+def _render_certificate(output, certificate_type, event, student, template, upload_folder, static_layer=None,
+                        layout=None, profile=None):
+    """Draw one certificate to a path, a writable buffer or bytes (OUTPUT_BYTES).
+
+    Returns the path, the buffer or the PDF bytes respectively. A prepared
+    static layer is stamped instead of redrawn when given, and a row from
+    build_student_layouts is drawn as is instead of measuring the student.
+    profile is an OutputProfile (screen quality and no budget when None);
+    with a byte budget the PDF is drawn in memory, with smaller images each
+    time, until it fits.
+    """
+    profile = profile or OutputProfile()
+    budgeted = profile.max_bytes is not None
+    with render_trace(certificate_type) as trace:
+        _, draw_static, draw_student = CERTIFICATE_LAYOUTS[certificate_type]
+        pagesize = certificate_pagesize(certificate_type, template)
+        width, height = pagesize
+
+        for level in profile.attempts():
+            target = BytesIO() if budgeted or output == OUTPUT_BYTES else output
+            with image_quality(level):
+                c = _issue_day_canvas(target, pagesize)
+                if profile.document_info:
+                    _set_document_info(c, event, student)
+
+                if static_layer is not None and static_layer.image_level == level:
+                    with stage('static_layer'):
+                        static_layer.stamp(c)
+                else:
+                    # Anything the static drawers do outside a more specific stage is text. The graphics
+                    # state is saved around it, as a form does, so the student drawers start from the same state
+                    with stage('text'):
+                        c.saveState()
+                        draw_static(c, width, height, event, template, upload_folder)
+                        c.restoreState()
+
+                with stage('text'):
+                    draw_student(c, width, height, event, student, template, layout)
+
+                with stage('save'):
+                    c.save()
+
+            if not budgeted or target.tell() <= profile.max_bytes:
+                break
+        else:
+            print(f"✗ Certificate for {student.name} is {target.tell()} bytes, over the "
+                  f"{profile.max_bytes} byte budget even with the smallest images")
+            trace.over_budget = True
+            profile.over_budget += 1
+        if budgeted:
+            profile.settle(level)
+
+        if output == OUTPUT_BYTES:
+            result = target.getvalue()
+            trace.output_bytes = len(result)
+            return result
+        if budgeted:
+            with stage('save'):
+                if isinstance(output, str):
+                    with open(output, 'wb') as f:
+                        f.write(target.getbuffer())
+                else:
+                    output.write(target.getbuffer())
+        trace.output_bytes = os.path.getsize(output) if isinstance(output, str) else output.tell()
+        return output
+
+
+def generate_custom_font_certificate(event, student, certificate_folder, upload_folder=None, static_layer=None,
+                                     output=None, layout=None, profile=None):
+    """Generate certificate with custom StoryScript font and dynamic text (NO RANKING)"""
+    if output is None:
+        filename = f"certificate_custom_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        output = os.path.join(certificate_folder, filename)
+
+    try:
+        upload_folder = _resolve_upload_folder(upload_folder)
+        result = _render_certificate(output, "custom_font", event, student, None, upload_folder, static_layer,
+                                     layout, profile)
+        debug(f"✓ Custom certificate saved: {_describe_output(output)}")
+        return result
+
+    except Exception as e:
+        print(f"Error generating custom certificate: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def generate_enhanced_certificate(event, student, certificate_folder, upload_folder=None, static_layer=None,
+                                  output=None, layout=None, profile=None):
+    """Enhanced certificate with dual signatures and dynamic text (NO RANKING)"""
+    if output is None:
+        filename = f"certificate_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        output = os.path.join(certificate_folder, filename)
+
+    try:
+        upload_folder = _resolve_upload_folder(upload_folder)
+        result = _render_certificate(output, "enhanced", event, student, None, upload_folder, static_layer,
+                                     layout, profile)
+        debug(f"✓ Enhanced certificate saved: {_describe_output(output)}")
+        return result
+
+    except Exception as e:
+        print(f"Error generating enhanced certificate: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def generate_premium_certificate(event, student, template, certificate_folder, upload_folder=None, static_layer=None,
+                                 output=None, layout=None, profile=None):
+    """Generate premium certificate with template support"""
+    if output is None:
+        filename = f"certificate_{student.id}_{event.id}_{template.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        output = os.path.join(certificate_folder, filename)
+
+    try:
+        upload_folder = _resolve_upload_folder(upload_folder)
+        result = _render_certificate(output, "premium", event, student, template, upload_folder, static_layer,
+                                     layout, profile)
+        debug(f"✓ Premium certificate saved: {_describe_output(output)}")
+        return result
+
+    except Exception as e:
+        print(f"Error generating premium certificate: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+
+def generate_template_certificate(event, student, template, certificate_folder, upload_folder=None, static_layer=None,
+                                  output=None, layout=None, profile=None):
+    """Generate certificate from the declarative layout stored in the template"""
+    if output is None:
+        filename = f"certificate_{student.id}_{event.id}_{template.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        output = os.path.join(certificate_folder, filename)
+
+    try:
+        upload_folder = _resolve_upload_folder(upload_folder)
+        result = _render_certificate(output, "template", event, student, template, upload_folder, static_layer,
+                                     layout, profile)
+        debug(f"✓ Template certificate saved: {_describe_output(output)}")
+        return result
+
+    except Exception as e:
+        print(f"Error generating template certificate: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def generate_certificate_with_template(event, student, template, certificate_folder):
+    """Generate certificate using specific template"""
+    return generate_premium_certificate(event, student, template, certificate_folder)
+
+
+def generate_basic_certificate(event, student, certificate_folder, upload_folder=None, static_layer=None,
+                               output=None, layout=None, profile=None):
+    """Enhanced basic certificate generation"""
+    if output is None:
+        filename = f"certificate_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        output = os.path.join(certificate_folder, filename)
+
+    try:
+        upload_folder = _resolve_upload_folder(upload_folder)
+        result = _render_certificate(output, "basic", event, student, None, upload_folder, static_layer,
+                                     layout, profile)
+        debug(f"✓ Basic certificate saved: {_describe_output(output)}")
+        return result
+
     except Exception as e:
         print(f"Error generating basic certificate: {e}")
         import traceback
@@ -787,55 +1073,266 @@ def generate_basic_certificate(event, student, certificate_folder):
         return None
 
 
-def generate_certificate_pdf(event, student, certificate_folder, template_id=None, certificate_type="default"):
-    """Main function to generate certificate (NO RANKING SUPPORT)"""
-    template = None
-    
-    if template_id:
-        template = CertificateTemplate.query.get(template_id)
-    
+def resolve_certificate_type(event, template=None, certificate_type="default"):
+    """Pick the generator for an event: custom_font, enhanced, basic, premium or template"""
     # Certificate type selection (NO RANKING PARAMETERS)
-    if certificate_type == "custom_font":
-        return generate_custom_font_certificate(event, student, certificate_folder)
-    elif certificate_type == "enhanced":
-        return generate_enhanced_certificate(event, student, certificate_folder)
-    elif certificate_type == "basic":
-        return generate_basic_certificate(event, student, certificate_folder)
+    if certificate_type in ("custom_font", "enhanced", "basic"):
+        return certificate_type
+    elif has_layout(template):
+        # A template that describes its own layout is drawn from it
+        return "template"
     elif certificate_type == "premium" and template:
-        return generate_premium_certificate(event, student, template, certificate_folder)
-    
+        return "premium"
+
     # Auto-detection logic
     event_type = ""
     if hasattr(event, 'event_type') and event.event_type:
         event_type = event.event_type.value.lower()
-    
+
     event_title = event.title.lower() if hasattr(event, 'title') else ""
-    
+
     if ('webinar' in event_title or 'flask' in event_title or 'development' in event_title):
-        return generate_custom_font_certificate(event, student, certificate_folder)
-    
+        return "custom_font"
+
     if (event_type in ['lecture', 'seminar'] or 'research' in event_title):
-        return generate_basic_certificate(event, student, certificate_folder)
-    
+        return "basic"
+
     if template:
-        return generate_premium_certificate(event, student, template, certificate_folder)
-    
-    return generate_enhanced_certificate(event, student, certificate_folder)
+        return "premium"
+
+    return "enhanced"
+
+
+def _generate_resolved(certificate_type, event, student, template, certificate_folder, upload_folder=None,
+                       static_layer=None, output=None, layout=None, profile=None):
+    """Call the generator for an already resolved certificate type"""
+    if certificate_type == "custom_font":
+        return generate_custom_font_certificate(event, student, certificate_folder, upload_folder, static_layer, output,
+                                                layout, profile)
+    elif certificate_type == "basic":
+        return generate_basic_certificate(event, student, certificate_folder, upload_folder, static_layer, output,
+                                          layout, profile)
+    elif certificate_type == "premium":
+        return generate_premium_certificate(event, student, template, certificate_folder, upload_folder, static_layer,
+                                            output, layout, profile)
+    elif certificate_type == "template":
+        return generate_template_certificate(event, student, template, certificate_folder, upload_folder,
+                                             static_layer, output, layout, profile)
+    return generate_enhanced_certificate(event, student, certificate_folder, upload_folder, static_layer, output,
+                                         layout, profile)
+
+
+def generate_certificate_pdf(event, student, certificate_folder, template_id=None, certificate_type="default",
+                             output=None, profile=None, max_bytes=None, engine=None):
+    """Main function to generate certificate (NO RANKING SUPPORT)
+
+    output may be None (timestamped file in certificate_folder), a file path,
+    a writable buffer, or OUTPUT_BYTES to get the PDF back as bytes.
+    profile ("screen", "print" or "archive") and max_bytes, the byte budget
+    the certificate is shrunk to fit, default to the app settings. engine
+    ("reportlab" or "html") defaults to the template's choice, then the app's.
+    """
+    from render_engines import resolve_render_engine
+
+    template = None
+
+    if template_id:
+        template = CertificateTemplate.query.get(template_id)
+
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    profile = _resolve_output_profile(profile, max_bytes)
+    return resolve_render_engine(template, engine).render(resolved_type, event, student, template,
+                                                          certificate_folder, output=output, profile=profile)
+
 
+def generate_certificate_booklet(event, students, certificate_folder, certificate_type, template=None,
+                                 upload_folder=None, progress=None, profile=None):
+    """Write one multi-page PDF for an event, one page per student.
 
-def generate_bulk_certificates(event, students, certificate_folder, template_id=None, certificate_type="default"):
-    """Generate bulk certificates (NO RANKING SUPPORT)"""
+    The static layer is drawn once as a form XObject that every page
+    references, so the background, logo and signature images are embedded a
+    single time no matter how many students the booklet holds. Returns the
+    booklet path and a per-student list of page numbers (None when a student
+    could not be drawn). progress, if given, is called after each page as
+    progress(student, booklet path or None when the page failed).
+
+    The booklet is drawn at the profile's best image quality; a byte budget
+    is per certificate and does not apply to it.
+    """
+    filename = f"certificates_event_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    filepath = os.path.join(certificate_folder, filename)
+
+    upload_folder = _resolve_upload_folder(upload_folder)
+    profile = profile or OutputProfile()
+    _, _, draw_student = CERTIFICATE_LAYOUTS[certificate_type]
+    pagesize = certificate_pagesize(certificate_type, template)
+    width, height = pagesize
+    c = _issue_day_canvas(filepath, pagesize)
+    if profile.document_info:
+        _set_document_info(c, event)
+
+    static_layer = build_static_layer(event, certificate_type, template, upload_folder, profile.level)
+    with stage('static_layer'):
+        static_layer.define(c)
+
+    with stage('layout'):
+        layouts = build_student_layouts(certificate_type, students, event, template)
+
+    pages = []
+    for student, layout in zip(students, layouts):
+        mark = len(c._code)
+        try:
+            with render_trace(certificate_type):
+                with stage('static_layer'):
+                    static_layer.stamp(c)
+                with stage('text'):
+                    draw_student(c, width, height, event, student, template, layout)
+        except Exception as e:
+            # Drop the half-drawn page and carry on with the next student
+            del c._code[mark:]
+            print(f"Failed to add {student.name} to certificate booklet: {e}")
+            pages.append(None)
+            if progress:
+                progress(student, None)
+            continue
+        c.showPage()
+        pages.append(c.getPageNumber() - 1)
+        if progress:
+            progress(student, filepath)
+
+    # Pages share one file, so its size and save time belong to the run
+    with stage('save'):
+        c.save()
+    debug(f"✓ Certificate booklet saved: {filepath}")
+    return filepath, pages
+
+
+def generate_bulk_certificates(event, students, certificate_folder, template_id=None, certificate_type="default",
+                               use_static_layer=True, workers=None, single_pdf=False, progress=None, profile=None,
+                               max_bytes=None, engine=None):
+    """Generate bulk certificates (NO RANKING SUPPORT)
+
+    With use_static_layer (the default) the background, border, images and
+    event details are recorded once for the whole run and only the student
+    name and certificate ID are drawn per certificate. When workers is above
+    one the certificates are rendered in a process pool instead of this
+    process; paths are returned in the same order as students either way.
+
+    With single_pdf the whole event is written to one booklet with a page
+    per student; every student that made it into the booklet gets the
+    booklet path in the returned list.
+
+    progress, if given, is called as progress(student, pdf_path) as each
+    certificate finishes (pdf_path is None on failure), so callers can
+    report on and checkpoint long runs.
+
+    profile ("screen", "print" or "archive") and max_bytes, the byte budget
+    each certificate is shrunk to fit, default to the app settings. engine
+    ("reportlab" or "html") defaults to the template's choice, then the
+    app's; booklets are always drawn with ReportLab.
+    """
+    from render_engines import resolve_render_engine
+
+    template = CertificateTemplate.query.get(template_id) if template_id else None
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    upload_folder = _resolve_upload_folder()
+    profile = _resolve_output_profile(profile, max_bytes)
+    render_engine = resolve_render_engine(template, engine)
+
+    # Every render below is traced into one summary, printed once when the run ends
+    with trace_run(f"event {event.id} ({len(students)} students)") as run:
+        if render_engine.name != "reportlab" and not single_pdf:
+            pdf_paths = _generate_bulk_with_engine(render_engine, event, students, certificate_folder, template,
+                                                   resolved_type, upload_folder, progress, profile)
+        else:
+            pdf_paths = _generate_bulk_resolved(event, students, certificate_folder, template, resolved_type,
+                                                upload_folder, use_static_layer, workers, single_pdf, run,
+                                                progress, profile)
+    print(run.format())
+    return pdf_paths
+
+
+def _generate_bulk_with_engine(render_engine, event, students, certificate_folder, template, resolved_type,
+                               upload_folder, progress=None, profile=None):
+    """Bulk run through a render engine other than ReportLab, one certificate at a time in this process"""
     pdf_paths = []
-    
     for student in students:
+        pdf_path = render_engine.render(resolved_type, event, student, template, certificate_folder, upload_folder,
+                                        profile=profile)
+        if pdf_path is None:
+            print(f"Failed to generate certificate for {student.name}")
+        else:
+            debug(f"Generated certificate for {student.name}: {pdf_path}")
+        pdf_paths.append(pdf_path)
+        if progress:
+            progress(student, pdf_path)
+    return pdf_paths
+
+
+def _generate_bulk_resolved(event, students, certificate_folder, template, resolved_type, upload_folder,
+                            use_static_layer, workers, single_pdf, run, progress=None, profile=None):
+    """Body of generate_bulk_certificates, run inside its trace_run"""
+    profile = profile or OutputProfile()
+    if single_pdf:
+        try:
+            booklet_path, pages = generate_certificate_booklet(event, students, certificate_folder,
+                                                               resolved_type, template, upload_folder, progress,
+                                                               profile)
+        except Exception as e:
+            print(f"Error generating certificate booklet: {e}")
+            import traceback
+            traceback.print_exc()
+            return [None] * len(students)
+        if os.path.exists(booklet_path):
+            run.output_bytes = os.path.getsize(booklet_path)
+        return [booklet_path if page is not None else None for page in pages]
+
+    with stage('layout'):
+        # Names are measured and wrapped for the whole run up front, so the draw loop only draws
+        layouts = build_student_layouts(resolved_type, students, event, template)
+
+    if workers and workers > 1:
+        from render_pool import iter_render_jobs, make_render_jobs
+
+        jobs = make_render_jobs(event, students, template, resolved_type, certificate_folder,
+                                upload_folder, use_static_layer, layouts, profile)
+        pdf_paths = []
+        for student, result in zip(students, iter_render_jobs(jobs, workers)):
+            if result.get('trace'):
+                run.add(result['trace'])
+            if result['error']:
+                print(f"Failed to generate certificate for {student.name}: {result['error']}")
+            else:
+                debug(f"Generated certificate for {student.name}: {result['path']}")
+            pdf_paths.append(result['path'])
+            if progress:
+                progress(student, result['path'])
+        return pdf_paths
+
+    pdf_paths = []
+
+    static_layer = None
+    for student, layout in zip(students, layouts):
+        # Built up front, and again if the byte budget settles on smaller images part way through
+        if use_static_layer and (static_layer is None or static_layer.image_level != profile.level):
+            try:
+                with stage('static_layer_build'):
+                    static_layer = build_static_layer(event, resolved_type, template, upload_folder, profile.level)
+            except Exception as e:
+                print(f"Could not prepare static layer, drawing each certificate in full: {e}")
+                use_static_layer = False
+
         try:
-            pdf_path = generate_certificate_pdf(event, student, certificate_folder, template_id, certificate_type)
+            pdf_path = _generate_resolved(resolved_type, event, student, template, certificate_folder,
+                                          upload_folder, static_layer, layout=layout, profile=profile)
             pdf_paths.append(pdf_path)
-            print(f"Generated certificate for {student.name}: {pdf_path}")
+            debug(f"Generated certificate for {student.name}: {pdf_path}")
         except Exception as e:
             print(f"Failed to generate certificate for {student.name}: {e}")
             pdf_paths.append(None)
-    
+        if progress:
+            progress(student, pdf_paths[-1])
+
     return pdf_paths
 
 
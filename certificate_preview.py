@@ -0,0 +1,112 @@
+import os
+import re
+import uuid
+from io import BytesIO
+
+from PIL import Image
+
+from models import CertificateTemplate
+from certificate_cache import certificate_fingerprint, get_or_render_certificate
+from certificate_generator import _resolve_output_profile, _resolve_upload_folder, resolve_certificate_type
+from render_engines import resolve_render_engine
+
+try:
+    import pymupdf
+except ImportError:  # PyMuPDF rasterizes the previews; without it they are unavailable
+    pymupdf = None
+
+
+# Preview width in pixels unless another is asked for, and the range that may be asked for
+PREVIEW_WIDTH = 600
+PREVIEW_MIN_WIDTH = 100
+PREVIEW_MAX_WIDTH = 1600
+
+# Previews are palette PNGs; a textured background still looks right and the file is about a third smaller
+PREVIEW_COLORS = 256
+
+# Bump when rasterizing changes so previously cached previews are not served
+PREVIEW_VERSION = 1
+
+# Preview keys are "<sha256>_<width>_v<version>"; anything else is never looked up on disk
+PREVIEW_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}_\d+_v\d+$')
+
+
+def preview_available():
+    """Whether PNG previews can be rendered in this environment"""
+    return pymupdf is not None
+
+
+def _resolve_preview_folder(preview_folder=None):
+    """Use the given preview folder, or the Flask app setting"""
+    if preview_folder is not None:
+        return preview_folder
+    from flask import current_app
+    return current_app.config.get('CERTIFICATE_PREVIEW_FOLDER', os.path.join('certificates', 'previews'))
+
+
+def clamp_preview_width(width):
+    """A requested preview width, limited to the allowed range"""
+    return max(PREVIEW_MIN_WIDTH, min(PREVIEW_MAX_WIDTH, int(width or PREVIEW_WIDTH)))
+
+
+def preview_key(event, student, template_id=None, certificate_type="default", width=PREVIEW_WIDTH,
+                upload_folder=None):
+    """Cache key of a preview: the fingerprint of the PDF it shows, its width and PREVIEW_VERSION"""
+    upload_folder = _resolve_upload_folder(upload_folder)
+    template = CertificateTemplate.query.get(template_id) if template_id else None
+    resolved_type = resolve_certificate_type(event, template, certificate_type)
+    fingerprint = certificate_fingerprint(event, student, template, resolved_type, upload_folder,
+                                          _resolve_output_profile(), resolve_render_engine(template).name)
+    return f"{fingerprint}_{clamp_preview_width(width)}_v{PREVIEW_VERSION}"
+
+
+def preview_path(key, preview_folder=None):
+    """Where the PNG for a preview key lives, or None for a malformed key"""
+    if not PREVIEW_KEY_PATTERN.match(key):
+        return None
+    return os.path.join(_resolve_preview_folder(preview_folder), key[:2], f"{key}.png")
+
+
+def rasterize_pdf(pdf_data, width=PREVIEW_WIDTH):
+    """The first page of a PDF as PNG bytes, scaled to width pixels"""
+    with pymupdf.open(stream=pdf_data, filetype='pdf') as doc:
+        page = doc[0]
+        zoom = width / page.rect.width
+        pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+        image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    buffer = BytesIO()
+    image.quantize(PREVIEW_COLORS, method=Image.Quantize.MEDIANCUT).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def get_or_render_preview(event, student, cache_folder, template_id=None, certificate_type="default",
+                          width=PREVIEW_WIDTH, upload_folder=None, preview_folder=None):
+    """Serve a certificate's PNG preview from disk, rasterizing the certificate on a miss.
+
+    Returns (key, png_path); png_path is None if the certificate could not be
+    rendered. The PDF comes from get_or_render_certificate, so previewing a
+    certificate also warms the cache its download and email are served from.
+    """
+    width = clamp_preview_width(width)
+    key = preview_key(event, student, template_id, certificate_type, width, upload_folder)
+    png_path = preview_path(key, preview_folder)
+    if os.path.exists(png_path):
+        return key, png_path
+
+    pdf_path, pdf_data = get_or_render_certificate(event, student, cache_folder, template_id, certificate_type,
+                                                   upload_folder)
+    if pdf_path is None:
+        return key, None
+    if pdf_data is None:
+        with open(pdf_path, 'rb') as f:
+            pdf_data = f.read()
+    png_data = rasterize_pdf(pdf_data, width)
+
+    # Write to a temporary name first so a concurrent reader never sees half a file
+    os.makedirs(os.path.dirname(png_path), exist_ok=True)
+    tmp_path = f"{png_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(png_data)
+    os.replace(tmp_path, png_path)
+    return key, png_path
@@ -0,0 +1,65 @@
+import json
+import os
+from collections import Counter
+
+from models import Certificate, CertificateTemplate
+from certificate_cache import certificate_fingerprint_parts, changed_parts
+from certificate_generator import _resolve_output_profile, _resolve_upload_folder, resolve_certificate_type
+from render_engines import resolve_render_engine
+
+
+def plan_regeneration(event, upload_folder=None, certificate_type="default", profile=None, max_bytes=None):
+    """Compare every certificate of an event with the inputs it would be rendered from now.
+
+    Returns a report with counts and, for each stale certificate, the
+    fingerprint parts that changed (event, student, template, assets,
+    certificate_type, version, output, engine), plus "no fingerprint" for
+    certificates issued before fingerprints were stored and "file missing"
+    when the PDF is gone. Nothing is rendered.
+    """
+    upload_folder = _resolve_upload_folder(upload_folder)
+    profile = _resolve_output_profile(profile, max_bytes)
+    templates = {}
+    engines = {}
+    stale = []
+    unchanged = 0
+    by_change = Counter()
+
+    for certificate in Certificate.query.filter_by(event_id=event.id).order_by(Certificate.id):
+        template_id = certificate.template_id
+        if template_id not in templates:
+            templates[template_id] = CertificateTemplate.query.get(template_id) if template_id else None
+            engines[template_id] = resolve_render_engine(templates[template_id]).name
+        template = templates[template_id]
+
+        resolved_type = resolve_certificate_type(event, template, certificate_type)
+        _, parts = certificate_fingerprint_parts(event, certificate.student, template, resolved_type, upload_folder,
+                                                 profile, engines[template_id])
+
+        if certificate.fingerprint_parts:
+            changes = changed_parts(json.loads(certificate.fingerprint_parts), parts)
+        else:
+            changes = ['no fingerprint']
+        if not certificate.certificate_path or not os.path.exists(certificate.certificate_path):
+            changes.append('file missing')
+
+        if not changes:
+            unchanged += 1
+            continue
+        by_change.update(changes)
+        stale.append({
+            'certificate_id': certificate.id,
+            'student_id': certificate.student_id,
+            'student': certificate.student.name,
+            'template_id': template_id,
+            'changes': changes,
+        })
+
+    return {
+        'event_id': event.id,
+        'checked': unchanged + len(stale),
+        'unchanged': unchanged,
+        'stale': len(stale),
+        'by_change': dict(by_change),
+        'certificates': stale,
+    }
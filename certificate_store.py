@@ -0,0 +1,174 @@
+import hashlib
+import os
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, BulkJob, Certificate, OutboxMessage
+
+
+# Files younger than this are never collected, so a PDF stored moments before its row is committed survives
+GC_MIN_AGE_SECONDS = 3600
+
+
+def _resolve_store_folder(store_folder=None):
+    """Use the given store folder, or the Flask app setting"""
+    if store_folder is not None:
+        return store_folder
+    from flask import current_app
+    return current_app.config.get('CERTIFICATE_STORE_FOLDER', os.path.join('certificates', 'store'))
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_path(digest, store_folder=None):
+    """Where the PDF with a given sha256 lives: store/ab/abcdef....pdf"""
+    return os.path.join(_resolve_store_folder(store_folder), digest[:2], f"{digest}.pdf")
+
+
+def _adopt(target):
+    """Reuse an already stored copy; touching it keeps the garbage collector's grace period"""
+    os.utime(target)
+    return target
+
+
+def store_bytes(data, store_folder=None):
+    """Store PDF bytes under their content hash and return the path; identical bytes are written once"""
+    target = store_path(hashlib.sha256(data).hexdigest(), store_folder)
+    if os.path.exists(target):
+        return _adopt(target)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    return target
+
+
+def store_file(path, store_folder=None):
+    """Move a freshly generated PDF into the store and return its stored path.
+
+    When the same bytes are already stored the new file is simply removed.
+    """
+    target = store_path(_hash_file(path), store_folder)
+    if os.path.abspath(path) == os.path.abspath(target):
+        return target
+    if os.path.exists(target):
+        os.remove(path)
+        return _adopt(target)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return target
+
+
+def reference_counts():
+    """Number of Certificate rows pointing at each path, plus finished booklets and PDFs of unsent emails"""
+    counts = Counter(dict(
+        db.session.query(Certificate.certificate_path, db.func.count(Certificate.id))
+        .filter(Certificate.certificate_path.isnot(None))
+        .group_by(Certificate.certificate_path)
+    ))
+    for job in BulkJob.query.filter_by(kind='booklet', status='finished'):
+        booklet_path = (job.result or {}).get('booklet_path')
+        if booklet_path:
+            counts[booklet_path] += 1
+    # A certificate email waiting for a retry becomes the student's certificate once it is sent
+    for (path,) in db.session.query(OutboxMessage.certificate_path).filter(
+            OutboxMessage.status.in_(('queued', 'sending')), OutboxMessage.certificate_path.isnot(None)):
+        counts[path] += 1
+    # Rows may hold relative or absolute paths; compare them the way the files are opened
+    return Counter({os.path.abspath(path): count for path, count in counts.items()})
+
+
+def release_file(path):
+    """Delete a PDF once the current transaction commits, if nothing refers to it by then.
+
+    Nothing is deleted when the transaction is rolled back, so a row that
+    still points at the file after a failed commit never loses it.
+    """
+    if path:
+        db.session.info.setdefault('released_files', set()).add(os.path.abspath(path))
+
+
+@event.listens_for(Session, 'before_commit')
+def _check_released_files(session):
+    """Decide which released files are unreferenced, while the transaction can still be queried"""
+    released = session.info.pop('released_files', None)
+    if not released:
+        return
+    session.flush()
+    references = reference_counts()
+    unreferenced = {}
+    for path in released:
+        if not references.get(path):
+            try:
+                unreferenced[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    session.info['unreferenced_files'] = unreferenced
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_released_files(session):
+    for path, mtime in session.info.pop('unreferenced_files', {}).items():
+        try:
+            # store_file touches a stored copy it reuses, so a changed mtime means another run just adopted it
+            if os.stat(path).st_mtime_ns == mtime:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_released_files(session, previous_transaction):
+    session.info.pop('released_files', None)
+    session.info.pop('unreferenced_files', None)
+
+
+def collect_garbage(folder, skip_folders=(), dry_run=False, min_age_seconds=GC_MIN_AGE_SECONDS):
+    """Delete PDFs under folder that nothing references and report the space reclaimed.
+
+    Folders in skip_folders (such as the render cache) are left alone. With
+    dry_run nothing is deleted, but the report says what would be.
+    """
+    references = reference_counts()
+    skip = [os.path.abspath(path) for path in skip_folders]
+    cutoff = time.time() - min_age_seconds
+    report = {'scanned': 0, 'referenced': 0, 'too_recent': 0, 'deleted': 0, 'bytes_reclaimed': 0,
+              'dry_run': dry_run, 'errors': []}
+
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip]
+        for name in files:
+            if not name.endswith('.pdf'):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            report['scanned'] += 1
+            if references.get(path):
+                report['referenced'] += 1
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    report['too_recent'] += 1
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except OSError as e:
+                report['errors'].append(f"{path}: {e}")
+                continue
+            report['deleted'] += 1
+            report['bytes_reclaimed'] += stat.st_size
+
+    return report
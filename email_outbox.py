@@ -0,0 +1,256 @@
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, OutboxMessage
+from email_sender import prepare_email, send_email_batch
+
+
+# Sends of a message before transient failures are given up on
+OUTBOX_MAX_ATTEMPTS = 8
+
+# Wait before the first retry, doubled after every further failure up to OUTBOX_BACKOFF_MAX
+OUTBOX_BACKOFF = timedelta(seconds=30)
+OUTBOX_BACKOFF_MAX = timedelta(hours=1)
+
+# Messages claimed per drain
+OUTBOX_BATCH_SIZE = 100
+
+# A message left "sending" this long belonged to a worker that died mid-send and is queued again. A worker
+# refreshes the claim of its whole batch before each send, so only a worker that stopped sending goes stale
+OUTBOX_SENDING_STALE_AFTER = timedelta(minutes=10)
+
+# Longest the worker sleeps between looks at the outbox while messages are waiting
+OUTBOX_POLL_SECONDS = 30
+
+
+def retry_delay(attempts):
+    """Wait before the next send of a message that has failed attempts times"""
+    return min(OUTBOX_BACKOFF * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+
+
+class Outbox:
+    """Durable email queue drained by a daemon thread in this process.
+
+    Messages live in the email_outbox table, one per event, student and
+    kind, so queueing an email that was already sent does nothing; an email
+    queued without a student is always a new message. Transient
+    failures (4xx replies, dropped connections) are retried with exponential
+    backoff up to OUTBOX_MAX_ATTEMPTS; permanent ones fail straight away.
+    Functions registered per kind with the sent() decorator are called
+    with each message once it has gone out.
+    """
+
+    def __init__(self, poll_seconds=OUTBOX_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.app = None
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def sent(self, kind):
+        """Decorator registering the function called with each sent message of a kind"""
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def find(self, event_id, student_id, kind):
+        return OutboxMessage.query.filter_by(event_id=event_id, student_id=student_id, kind=kind).first()
+
+    def enqueue(self, event_id, student_id, kind, recipient, subject, body, html_body=None, certificate_path=None):
+        """Queue an email, due now, and return its row; one already sent or being sent is returned unchanged"""
+        message = self.find(event_id, student_id, kind) if student_id is not None else None
+        if message is not None and message.status in ('sent', 'sending'):
+            return message
+        if message is None:
+            message = OutboxMessage(event_id=event_id, student_id=student_id, kind=kind, attempts=0)
+            db.session.add(message)
+        elif message.status == 'failed':
+            # Queued again by hand after it was given up on, so it gets a full set of attempts
+            message.attempts = 0
+
+        now = datetime.utcnow()
+        message.recipient = recipient
+        message.subject = subject
+        message.body = body
+        message.html_body = html_body
+        message.certificate_path = certificate_path
+        message.status = 'queued'
+        message.next_attempt_at = now
+        message.updated_at = now
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker queued the same email first
+            db.session.rollback()
+            return self.find(event_id, student_id, kind)
+        return message
+
+    def claim(self, message_ids):
+        """Take queued messages for sending; returns the ones this call got, which no other worker will send.
+
+        Each returned message has the claim's token in held_claim; deliver()
+        only sends a message while the row still holds that token.
+        """
+        token = uuid.uuid4().hex
+        OutboxMessage.query.filter(OutboxMessage.id.in_(list(message_ids)), OutboxMessage.status == 'queued').update(
+            {'status': 'sending', 'claim_token': token, 'claimed_at': datetime.utcnow()},
+            synchronize_session=False)
+        db.session.commit()
+        claimed = OutboxMessage.query.filter_by(claim_token=token).order_by(OutboxMessage.id).all()
+        for message in claimed:
+            # Kept outside the mapped columns, which later commits expire and could reload with another worker's token
+            message.held_claim = token
+        return claimed
+
+    def deliver(self, messages, on_result=None):
+        """Send claimed messages concurrently and record each outcome as it arrives.
+
+        messages may be a generator. on_result is called with each message
+        and its send result after the outcome is committed. Returns counts of
+        sent, retrying, deferred (queued for a later quota slot), failed and
+        skipped messages; a message is skipped, untouched, when it was queued
+        again as stale and claimed by another worker before its send.
+        """
+        report = {'sent': 0, 'retrying': 0, 'deferred': 0, 'failed': 0, 'skipped': 0}
+
+        def prepared():
+            for message in messages:
+                yield prepare_email(message.subject, message.recipient, message.body, message.html_body, key=message)
+
+        def still_claimed(prepared_message):
+            message = prepared_message['key']
+            return self._refresh_claim(message.id, message.held_claim)
+
+        def record(result):
+            message = result['key']
+            if result['skipped']:
+                print(f"✗ Email to {message.recipient} was taken over by another worker, not sending it again")
+                report['skipped'] += 1
+            else:
+                report[self._record(message, result)] += 1
+            if on_result is not None:
+                on_result(message, result)
+
+        send_email_batch(prepared(), record, before_send=still_claimed)
+        return report
+
+    def _refresh_claim(self, message_id, token):
+        """Mark the messages claimed with token as still being sent; False when message_id is no longer among them"""
+        now = datetime.utcnow()
+        OutboxMessage.query.filter_by(claim_token=token, status='sending').update(
+            {'claimed_at': now}, synchronize_session=False)
+        db.session.commit()
+        return (db.session.query(OutboxMessage.id)
+                .filter_by(id=message_id, claim_token=token, status='sending').first() is not None)
+
+    def _record(self, message, result):
+        now = datetime.utcnow()
+        message.claim_token = None
+        message.updated_at = now
+        if result['deferred_until'] is not None:
+            # Over the send quota: not an attempt, just a later slot
+            message.status = 'queued'
+            message.next_attempt_at = result['deferred_until']
+            message.last_error = result['error']
+            db.session.commit()
+            return 'deferred'
+
+        message.attempts = (message.attempts or 0) + 1
+        if result['ok']:
+            message.status = 'sent'
+            message.sent_at = now
+            message.last_error = None
+        elif result['transient'] and message.attempts < OUTBOX_MAX_ATTEMPTS:
+            message.status = 'queued'
+            message.next_attempt_at = now + retry_delay(message.attempts)
+            message.last_error = result['error']
+        else:
+            message.status = 'failed'
+            message.last_error = result['error']
+        # Committed straight away so a restart never sends it twice
+        db.session.commit()
+
+        if message.status != 'sent':
+            return 'retrying' if message.status == 'queued' else 'failed'
+        handler = self._handlers.get(message.kind)
+        if handler is not None:
+            try:
+                handler(message)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"✗ Email to {message.recipient} was sent but could not be recorded: {e}")
+                traceback.print_exc()
+        return 'sent'
+
+    def drain(self, limit=OUTBOX_BATCH_SIZE):
+        """Send the messages that are due; returns counts like deliver()"""
+        now = datetime.utcnow()
+        OutboxMessage.query.filter(OutboxMessage.status == 'sending',
+                                   OutboxMessage.claimed_at < now - OUTBOX_SENDING_STALE_AFTER).update(
+            {'status': 'queued', 'claim_token': None, 'next_attempt_at': now}, synchronize_session=False)
+        db.session.commit()
+
+        due = [message_id for (message_id,) in
+               db.session.query(OutboxMessage.id)
+               .filter(OutboxMessage.status == 'queued', OutboxMessage.next_attempt_at <= now)
+               .order_by(OutboxMessage.next_attempt_at)
+               .limit(limit)]
+        if not due:
+            return {'sent': 0, 'retrying': 0, 'deferred': 0, 'failed': 0, 'skipped': 0}
+        return self.deliver(self.claim(due))
+
+    def next_due(self):
+        """When the earliest queued message is due, or None when nothing is queued"""
+        return (db.session.query(db.func.min(OutboxMessage.next_attempt_at))
+                .filter(OutboxMessage.status == 'queued').scalar())
+
+    def wake(self):
+        """Start the worker if it is not running and have it look at the outbox now"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="email-outbox", daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def _work(self):
+        """Drain due messages until nothing is queued, sleeping until the next one is due"""
+        while True:
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.drain()
+                    next_due = self.next_due()
+            except Exception as e:
+                print(f"✗ Email outbox could not be drained: {e}")
+                traceback.print_exc()
+                next_due = datetime.utcnow() + timedelta(seconds=self.poll_seconds)
+
+            if next_due is None:
+                with self._lock:
+                    if not self._wake.is_set():
+                        self._thread = None
+                        return
+                continue
+            wait = (next_due - datetime.utcnow()).total_seconds()
+            self._wake.wait(min(self.poll_seconds, max(0, wait)))
+
+
+def outbox_status(event_id=None):
+    """Counts of outbox messages by status, for one event or all of them"""
+    query = db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id))
+    if event_id is not None:
+        query = query.filter(OutboxMessage.event_id == event_id)
+    return dict(query.group_by(OutboxMessage.status))
+
+
+OUTBOX = Outbox()
@@ -1,10 +1,24 @@
+import asyncio
+import contextvars
+import hashlib
+import re
 import smtplib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from flask import render_template, current_app
-from datetime import datetime
+from flask import render_template, current_app, has_app_context
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+from markupsafe import escape
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, EmailSendSlot
 
 # Edit these
 SMTP_SERVER = "smtp.gmail.com"
@@ -12,6 +26,349 @@ SMTP_PORT = 587
 SENDER_EMAIL = "24034211086@gnu.ac.in"  # Set to your Gmail (App Password required)
 SENDER_PASSWORD = "wntn picx fqwx brzm"  # App Password, never your regular Gmail password
 
+# Authenticated SMTP connections kept open between messages
+SMTP_POOL_SIZE = 4
+# A connection idle this long is sent a NOOP so the server does not drop it
+SMTP_KEEPALIVE_SECONDS = 30
+# A connection idle this long is closed
+SMTP_IDLE_SECONDS = 120
+# Connections are replaced after this many messages; providers cap messages per session
+SMTP_MAX_MESSAGES = 100
+SMTP_TIMEOUT = 30
+
+# Messages send_email_batch has in flight at once, one pooled SMTP session each
+EMAIL_CONCURRENCY = SMTP_POOL_SIZE
+# Prepared messages waiting for a free session; keeps a lazily built batch from running far ahead of the sends
+EMAIL_QUEUE_SIZE = 2 * EMAIL_CONCURRENCY
+
+# Provider sending limits (Google Workspace allows 2,000 messages a day), counted across every worker and
+# process; override with the EMAIL_SEND_QUOTAS app setting
+SEND_QUOTAS = {'second': 2, 'minute': 60, 'day': 2000}
+QUOTA_WINDOWS = {'second': timedelta(seconds=1), 'minute': timedelta(minutes=1), 'day': timedelta(days=1)}
+# A send whose slot is further off than this is not waited for; the outbox queues it for its slot instead
+MAX_SEND_WAIT = timedelta(seconds=60)
+# Tries at reserving a slot while other workers keep taking the same turn
+RESERVE_ATTEMPTS = 20
+
+# Base64-encoded attachments kept by content hash, so a file attached to many emails is encoded once
+ATTACHMENT_CACHE_SIZE = 16
+
+# Stand-in a composer renders where a per-recipient value goes; control characters never occur in real text
+FIELD_MARKER = '\x1f{}\x1f'
+
+
+class _PooledConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = monotonic()
+
+
+class SMTPPool:
+    """Logged-in SMTP connections reused across messages.
+
+    Opening a connection costs a TLS handshake and an AUTH round trip, so
+    connections go back to the pool after each message. Idle ones are kept
+    alive with NOOPs and closed after SMTP_IDLE_SECONDS. A connection the
+    server has dropped is replaced and the message sent again.
+    """
+
+    def __init__(self, server, port, username, password, size=SMTP_POOL_SIZE,
+                 keepalive_seconds=SMTP_KEEPALIVE_SECONDS, idle_seconds=SMTP_IDLE_SECONDS,
+                 max_messages=SMTP_MAX_MESSAGES, timeout=SMTP_TIMEOUT):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive_seconds = keepalive_seconds
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._reaper = None
+        self.opened = 0
+
+    def _open(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            smtp.starttls()
+            smtp.login(self.username, self.password)
+        except Exception:
+            _close(smtp)
+            raise
+        self.opened += 1
+        return _PooledConnection(smtp)
+
+    def _alive(self, conn):
+        """Whether an idle connection still answers; one used recently is trusted without a round trip"""
+        if monotonic() - conn.last_used < self.keepalive_seconds:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _take(self):
+        """An idle connection that still works, or a new one"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._open()
+            if monotonic() - conn.last_used < self.idle_seconds and self._alive(conn):
+                return conn
+            _close(conn.smtp)
+
+    def _give_back(self, conn):
+        conn.last_used = monotonic()
+        if conn.messages >= self.max_messages:
+            _close(conn.smtp)
+            return
+        with self._lock:
+            self._idle.append(conn)
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="smtp-pool-reaper", daemon=True)
+                self._reaper.start()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a logged-in connection; it is returned to the pool unless using it failed"""
+        with self._slots:
+            conn = self._take()
+            try:
+                yield conn
+            except smtplib.SMTPServerDisconnected:
+                _close(conn.smtp)
+                raise
+            except smtplib.SMTPException:
+                # The server answered (a refused recipient, say), so the session is still usable
+                self._give_back(conn)
+                raise
+            except OSError:
+                _close(conn.smtp)
+                raise
+            except Exception:
+                self._give_back(conn)
+                raise
+            else:
+                self._give_back(conn)
+
+    def sendmail(self, sender, recipients, message):
+        """Send one message, reconnecting once if the pooled connection turns out to be dead"""
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    conn.messages += 1
+                    return conn.smtp.sendmail(sender, recipients, message)
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def _reap(self):
+        """Keep idle connections alive and close the ones idle too long; stops once the pool is empty"""
+        while True:
+            sleep(self.keepalive_seconds)
+            with self._lock:
+                idle, self._idle = self._idle, []
+            kept = []
+            for conn in idle:
+                if monotonic() - conn.last_used >= self.idle_seconds or not self._alive(conn):
+                    _close(conn.smtp)
+                else:
+                    kept.append(conn)
+            with self._lock:
+                self._idle.extend(kept)
+                if not self._idle:
+                    self._reaper = None
+                    return
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close(conn.smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+SMTP_POOL = SMTPPool(SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD)
+
+
+class SendDeferred(Exception):
+    """No send slot is free soon enough; until is the earliest slot the quotas allow"""
+
+    def __init__(self, until):
+        super().__init__(f"Send quota reached, next slot at {until.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+        self.until = until
+
+
+class SendRateLimiter:
+    """Spaces sends so no quota window ever holds more sends than the provider allows.
+
+    Every send reserves a slot in the email_send_slots table, so the quotas
+    hold across threads and processes. A slot is the earliest time at which
+    each window ending there has room. Reservations are handed out first
+    come, first served: sends beyond a quota are not refused but moved to
+    the moment the oldest send leaves the window. Slots live in the database,
+    so sends are only limited inside a Flask app context.
+    """
+
+    def __init__(self, quotas=None, max_wait=MAX_SEND_WAIT):
+        self._quotas = quotas
+        self.max_wait = max_wait
+
+    def quotas(self):
+        """Sends allowed per window, from the constructor, the EMAIL_SEND_QUOTAS app setting or SEND_QUOTAS"""
+        if self._quotas is not None:
+            return self._quotas
+        return current_app.config.get('EMAIL_SEND_QUOTAS', SEND_QUOTAS)
+
+    def next_slot(self, after):
+        """Earliest time from after at which one more send fits every quota"""
+        slot = after
+        quotas = self.quotas()
+        moved = True
+        while moved:
+            moved = False
+            for name, limit in quotas.items():
+                window = QUOTA_WINDOWS[name]
+                # With limit sends already in the window ending at slot, wait until the oldest of them leaves it
+                oldest = (db.session.query(EmailSendSlot.send_at)
+                          .filter(EmailSendSlot.send_at > slot - window)
+                          .order_by(EmailSendSlot.send_at.desc())
+                          .offset(limit - 1).limit(1).scalar())
+                if oldest is not None:
+                    slot = oldest + window
+                    moved = True
+        return slot
+
+    def reserve(self, max_wait=None):
+        """Reserve the next send slot and return the seconds to wait for it.
+
+        Raises SendDeferred, without reserving anything, when the slot is
+        more than max_wait away.
+        """
+        if not has_app_context():
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+        longest = max(QUOTA_WINDOWS[name] for name in self.quotas())
+
+        for attempt in range(RESERVE_ATTEMPTS):
+            now = datetime.utcnow()
+            last = EmailSendSlot.query.order_by(EmailSendSlot.id.desc()).first()
+            # Slots are handed out in order, so a send never jumps ahead of one already waiting
+            slot = self.next_slot(max(now, last.send_at) if last is not None else now)
+            if slot - now > max_wait:
+                raise SendDeferred(slot)
+
+            EmailSendSlot.query.filter(EmailSendSlot.send_at < now - longest).delete(synchronize_session=False)
+            db.session.add(EmailSendSlot(id=last.id + 1 if last is not None else 1, send_at=slot))
+            try:
+                db.session.commit()
+            except (IntegrityError, OperationalError):
+                # Another worker took this turn (or held the database lock); look again
+                db.session.rollback()
+                continue
+            return max(0.0, (slot - now).total_seconds())
+
+        raise RuntimeError("Could not reserve an email send slot")
+
+
+RATE_LIMITER = SendRateLimiter()
+
+_encoded_attachments = OrderedDict()
+_encoded_attachments_lock = threading.Lock()
+
+
+def _attachment_part(data, name):
+    """A base64 attachment part, reusing the encoding of identical bytes attached before"""
+    digest = hashlib.sha256(data).digest()
+    with _encoded_attachments_lock:
+        encoded = _encoded_attachments.get(digest)
+        if encoded is not None:
+            _encoded_attachments.move_to_end(digest)
+
+    part = MIMEBase('application', 'octet-stream')
+    if encoded is None:
+        part.set_payload(data)
+        encoders.encode_base64(part)
+        with _encoded_attachments_lock:
+            _encoded_attachments[digest] = part.get_payload()
+            while len(_encoded_attachments) > ATTACHMENT_CACHE_SIZE:
+                _encoded_attachments.popitem(last=False)
+    else:
+        part.set_payload(encoded)
+        part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-Disposition', f'attachment; filename="{name}"')
+    return part
+
+
+def build_message(subject, recipient, body, html_body=None, attachment_data=None, attachment_name=None):
+    """The MIME message send_email sends: plain text, optional HTML and an optional attachment"""
+    msg = MIMEMultipart('mixed')
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = recipient
+    msg['Subject'] = subject
+
+    # Alternative part: plain text and HTML
+    text_part = MIMEText(body, 'plain')
+    alt_part = MIMEMultipart('alternative')
+    alt_part.attach(text_part)
+
+    if html_body:
+        html_part = MIMEText(html_body, 'html')
+        alt_part.attach(html_part)
+
+    msg.attach(alt_part)
+
+    # Attachment part
+    if attachment_data and attachment_name:
+        msg.attach(_attachment_part(attachment_data, attachment_name))
+
+    return msg
+
+
+def prepare_email(subject, recipient, body, html_body=None, attachment_data=None, attachment_name=None,
+                  key=None):
+    """A message ready for send_email_batch; key is handed back with its result"""
+    message = build_message(subject, recipient, body, html_body, attachment_data, attachment_name)
+    return {'recipient': recipient, 'message': message.as_string(), 'key': key}
+
+
+def is_transient_error(error):
+    """Whether a failed send is worth retrying: 4xx replies, dropped connections and network errors"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        # A rejected login is a configuration problem, but once it is fixed the queued mail should still go out
+        return 400 <= error.smtp_code < 500 or isinstance(error, smtplib.SMTPAuthenticationError)
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # smtplib's own errors derive from OSError too; what is left here are socket errors and timeouts
+    return isinstance(error, OSError)
+
+
+def _deliver(recipient, message):
+    """Send one prepared message over a pooled connection; returns the exception, or None once sent"""
+    try:
+        SMTP_POOL.sendmail(SENDER_EMAIL, recipient, message)
+    except Exception as e:
+        print(f"❌ Failed to send email to {recipient}: {e}")
+        return e
+    print(f"✅ Email sent successfully to {recipient}")
+    return None
+
+
 def send_email(
     subject,
     recipient,
@@ -35,46 +392,184 @@ def send_email(
         bool: True if sent successfully, False otherwise
     """
     try:
-        msg = MIMEMultipart('mixed')
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = recipient
-        msg['Subject'] = subject
-
-        # Alternative part: plain text and HTML
-        text_part = MIMEText(body, 'plain')
-        alt_part = MIMEMultipart('alternative')
-        alt_part.attach(text_part)
-
-        if html_body:
-            html_part = MIMEText(html_body, 'html')
-            alt_part.attach(html_part)
-
-        msg.attach(alt_part)
-
-        # Attachment part
-        if attachment_data and attachment_name:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment_data)
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename="{attachment_name}"')
-            msg.attach(part)
-
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, recipient, msg.as_string())
-        server.quit()
-
-        print(f"✅ Email sent successfully to {recipient}")
-        return True
-
+        msg = build_message(subject, recipient, body, html_body, attachment_data, attachment_name)
+        sleep(RATE_LIMITER.reserve())
     except Exception as e:
         print(f"❌ Failed to send email to {recipient}: {e}")
         return False
+    return _deliver(recipient, msg.as_string()) is None
+
+
+async def dispatch_emails(messages, on_result=None, concurrency=EMAIL_CONCURRENCY, queue_size=EMAIL_QUEUE_SIZE,
+                          before_send=None):
+    """Send prepared messages with up to concurrency of them in flight and return their results in order.
+
+    messages may be any iterable, including a generator that renders as it
+    goes; it is consumed no further than queue_size messages ahead of the
+    sends. SMTP is blocking, so each send runs on its own thread over a
+    pooled connection. Each send first waits for its RATE_LIMITER slot; one
+    that would wait longer than MAX_SEND_WAIT is not sent and its result
+    carries deferred_until instead. on_result is called in completion order
+    with each result: a dict of recipient, key, ok, error, whether the error
+    is transient, deferred_until and skipped. before_send, when given, is
+    called with each message just before its slot is reserved; a message it
+    returns False for is not sent and its result is skipped. The iterable,
+    the slot reservations and the callbacks share one thread that sees the caller's app context, so they
+    may use its database session but never run at the same time.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(queue_size)
+    results = []
+    messages = iter(messages)
+    # Rendering, slot reservations and on_result all touch the caller's database session, so they run
+    # one at a time on a single thread, in a copy of the caller's context, and never block the loop
+    context = contextvars.copy_context()
+
+    def in_caller(caller, func, *args):
+        return loop.run_in_executor(caller, context.run, func, *args)
+
+    async def produce(caller):
+        while True:
+            message = await in_caller(caller, next, messages, None)
+            if message is None:
+                break
+            results.append(None)
+            await queue.put((len(results) - 1, message))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def send(caller, executor):
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            index, message = entry
+            deferred_until = None
+            skipped = before_send is not None and not await in_caller(caller, before_send, message)
+            if skipped:
+                error = None
+            else:
+                try:
+                    await asyncio.sleep(await in_caller(caller, RATE_LIMITER.reserve))
+                except SendDeferred as e:
+                    print(f"❌ Deferred email to {message['recipient']}: {e}")
+                    error, deferred_until = e, e.until
+                else:
+                    error = await loop.run_in_executor(executor, _deliver, message['recipient'], message['message'])
+            result = {'recipient': message['recipient'], 'key': message.get('key'),
+                      'ok': error is None and not skipped,
+                      'error': str(error) if error is not None else None,
+                      'transient': error is not None and (deferred_until is not None or is_transient_error(error)),
+                      'deferred_until': deferred_until, 'skipped': skipped}
+            results[index] = result
+            if on_result is not None:
+                await in_caller(caller, on_result, result)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-caller") as caller, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email-send") as executor:
+        tasks = [asyncio.create_task(produce(caller))]
+        tasks += [asyncio.create_task(send(caller, executor)) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # If on_result or the iterable raised, stop the rest rather than leave them waiting on the queue
+            for task in tasks:
+                task.cancel()
+    return results
+
+
+def send_email_batch(messages, on_result=None, concurrency=EMAIL_CONCURRENCY, before_send=None):
+    """Send prepared messages concurrently from synchronous code; see dispatch_emails"""
+    return asyncio.run(dispatch_emails(messages, on_result, concurrency, before_send=before_send))
+
+def certificate_plain_body(event, recipient_name, certificate_download_url):
+    """Plain text body of a certificate email sent by a bulk email job"""
+    return f"""
+Dear {recipient_name},
+
+Your certificate for "{event.title}" is ready!
+
+📋 Event Details:
+• Event: {event.title} ({event.event_type.value})
+• Date: {event.date.strftime('%B %d, %Y') if event.date else ''}
+• Organizer: {event.organizer}
+• Location: {event.location}
+
+Download Link: {certificate_download_url}
+
+Congratulations on your participation!
+
+Best regards,
+{event.organizer}
+"""
+
+
+def certificate_download_plain_body(event, recipient_name, certificate_download_url):
+    """Plain text body of a single certificate email sent from the event page"""
+    return f"""Dear {recipient_name},
+
+Congratulations! Your certificate for the event "{event.title}" is ready.
+
+You can download your certificate here: {certificate_download_url}
+
+Best regards,
+{event.organizer}
+"""
+
+
+def _split_fields(text, fields):
+    """Rendered text cut at its field markers: literal text at even indexes, field names at odd ones"""
+    pattern = '|'.join(re.escape(FIELD_MARKER.format(name)) for name in fields)
+    parts = re.split(f'({pattern})', text)
+    parts[1::2] = [part.strip('\x1f') for part in parts[1::2]]
+    return parts
+
+
+def _fill_fields(parts, values):
+    filled = list(parts)
+    filled[1::2] = [values[name] for name in parts[1::2]]
+    return ''.join(filled)
+
+
+class CertificateEmailComposer:
+    """The certificate emails of one event, rendered once and personalised by substitution.
+
+    email_certificate.html and the plain text body are rendered for the
+    event with markers in place of the student's name and download link;
+    compose() only splices those in, HTML-escaped where Jinja would have
+    escaped them. plain_body builds the plain text body from the event and
+    the two fields, certificate_plain_body by default. Create it inside a
+    Flask app context.
+    """
+
+    FIELDS = ('recipient_name', 'certificate_download_url')
+
+    def __init__(self, event, plain_body=certificate_plain_body):
+        self.event = event
+        self.subject = f"🏆 Your Certificate - {event.title}"
+        markers = {name: FIELD_MARKER.format(name) for name in self.FIELDS}
+        html_body = render_template(
+            "email_certificate.html",
+            subject=self.subject,
+            event=event,
+            current_year=datetime.now().year,
+            **markers
+        )
+        self._html = _split_fields(html_body, self.FIELDS)
+        self._plain = _split_fields(plain_body(event, **markers), self.FIELDS)
+
+    def compose(self, student, download_url):
+        """Subject, plain text body and HTML body of one student's certificate email"""
+        values = {'recipient_name': student.name, 'certificate_download_url': download_url}
+        return {
+            'subject': self.subject,
+            'body': _fill_fields(self._plain, values),
+            'html_body': _fill_fields(self._html, {name: str(escape(value)) for name, value in values.items()}),
+        }
+
 
 def send_certificate_email_flask(
-    student, event, pdf_data, download_url
+    student, event, pdf_data, download_url, composer=None
 ):
     """
     Compose and send a creative certificate email (to use in your Flask routes).
@@ -84,32 +579,16 @@ def send_certificate_email_flask(
         event: Event model (must have .title, .organizer, .event_type, .date, .location)
         pdf_data (bytes): Certificate PDF bytes
         download_url (str): External download link for certificate (from url_for(..., _external=True))
+        composer (CertificateEmailComposer, optional): Composer for the event, reused across a batch
     """
-    subject = f"🏆 Your Certificate - {event.title}"
-    plain_body = f"""Dear {student.name},
-
-Congratulations! Your certificate for the event "{event.title}" is ready.
-
-You can download your certificate here: {download_url}
-
-Best regards,
-{event.organizer}
-"""
-
-    html_body = render_template(
-        "email_certificate.html",
-        subject=subject,
-        recipient_name=student.name,
-        event=event,
-        certificate_download_url=download_url,
-        current_year=datetime.now().year
-    )
+    composer = composer or CertificateEmailComposer(event, certificate_download_plain_body)
+    email = composer.compose(student, download_url)
 
     return send_email(
-        subject=subject,
+        subject=email['subject'],
         recipient=student.email,
-        body=plain_body,
-        html_body=html_body,
+        body=email['body'],
+        html_body=email['html_body'],
         attachment_data=pdf_data,
         attachment_name=f"{student.name}_certificate.pdf"
     )
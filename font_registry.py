@@ -0,0 +1,90 @@
+import os
+import threading
+from functools import lru_cache
+from math import floor
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+# Folder holding the bundled font families; override with CERTIFICATE_FONT_FOLDER
+FONT_FOLDER = os.environ.get(
+    'CERTIFICATE_FONT_FOLDER',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Text'),
+)
+
+# Font name used in drawing code -> TTF file relative to FONT_FOLDER
+FONT_FILES = {
+    'StoryScript': os.path.join('Story_Script', 'StoryScript-Regular.ttf'),
+}
+
+# Font name -> whether it could be registered, so each face is parsed at most once per process
+_font_status = {}
+_font_lock = threading.Lock()
+
+
+def set_font_folder(folder):
+    """Load fonts that have not been registered yet from another folder"""
+    global FONT_FOLDER
+    with _font_lock:
+        FONT_FOLDER = folder
+        for name, available in list(_font_status.items()):
+            if not available:
+                del _font_status[name]
+
+
+def ensure_font(font_name):
+    """Register a font the first time it is asked for; True when it can be drawn with"""
+    available = _font_status.get(font_name)
+    if available is not None:
+        return available
+
+    with _font_lock:
+        if font_name in _font_status:
+            return _font_status[font_name]
+
+        if font_name in pdfmetrics.standardFonts or font_name in pdfmetrics.getRegisteredFontNames():
+            available = True
+        elif font_name not in FONT_FILES:
+            print(f"Warning: No font file configured for {font_name}")
+            available = False
+        else:
+            font_path = os.path.join(FONT_FOLDER, FONT_FILES[font_name])
+            if not os.path.exists(font_path):
+                print(f"Warning: Custom font not found at {font_path}")
+                available = False
+            else:
+                try:
+                    pdfmetrics.registerFont(TTFont(font_name, font_path))
+                    available = True
+                except Exception as e:
+                    print(f"Error registering custom font: {e}")
+                    available = False
+
+        _font_status[font_name] = available
+        return available
+
+
+@lru_cache(maxsize=8192)
+def string_width(text, font_name, font_size):
+    """Width of a string in points, memoised per (text, font, size)"""
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+
+@lru_cache(maxsize=256)
+def font_metrics(font_name, font_size):
+    """(ascent, descent) of a font at a size, memoised"""
+    return pdfmetrics.getAscentDescent(font_name, font_size)
+
+
+def fit_font_size(text, font_name, max_size, max_width, min_size=None):
+    """Largest font size up to max_size, in half points, at which text fits within max_width"""
+    # Widths scale linearly with size, so one cached measurement at 1pt serves every size
+    unit_width = string_width(text, font_name, 1)
+    if unit_width <= 0:
+        return max_size
+
+    size = min(max_size, floor(max_width / unit_width * 2) / 2)
+    if min_size is not None:
+        size = max(size, min_size)
+    return size
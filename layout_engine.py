@@ -0,0 +1,397 @@
+import json
+import os
+import re
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+
+from reportlab.lib.colors import HexColor, black
+from reportlab.lib.pagesizes import A4, landscape
+
+from certificate_texts import format_certificate_text
+from font_registry import ensure_font, fit_font_size, font_metrics
+from render_assets import draw_cached_image, render_image_path
+from render_trace import stage
+from text_layout import TextStyle, build_layout_table, draw_text_layout, layout_text
+
+
+# Declarative layouts live in CertificateTemplate.template_config next to colors and fonts:
+#
+#   "page": "landscape" | "portrait"
+#   "elements": [
+#       {"type": "rect", "x": 24, "y": 24, "width": "100%-48", "height": "100%-48",
+#        "fill": "secondary", "stroke": "accent", "line_width": 3, "radius": 0},
+#       {"type": "line", "x1": "50%-150", "y1": 200, "x2": "50%+150", "y2": 200, "stroke": "accent"},
+#       {"type": "circle", "x": "50%", "y": 100, "r": 10, "fill": "primary"},
+#       {"type": "image", "slot": "logo", "x": 60, "y": "100%-150", "width": 90, "height": 90,
+#        "preserve_aspect": true, "mask": "auto"},
+#       {"type": "text", "text": "{student.name}", "transform": "upper", "font": "name",
+#        "x": "50%", "y": "100%-260", "align": "center", "color": "primary",
+#        "max_width": 600, "min_size": 24, "max_lines": 2,
+#        "box": {"padding": 30, "padding_y": 8, "fill": "primary", "stroke": "accent", "line_width": 2}}
+#   ]
+#
+# Positions and sizes are points from the bottom-left corner, or "<percent>%" of the page with an
+# optional "+/-points" offset. Colors are keys of "colors" or hex strings. Fonts are keys of "fonts"
+# or {"family": ..., "size": ...}; "size" on the element overrides the size. Text is a format string
+# over event, student, text (the event type wording, e.g. {text[title]}), date and cert_id, limited
+# to the fields in TEXT_FIELDS; an element whose bound values are empty is skipped. Image slots are background, logo and signature,
+# taken from the event first and the template second.
+
+PAGE_SIZES = {'landscape': landscape(A4), 'portrait': A4}
+
+# Any text element using a student binding is drawn per student
+STUDENT_BINDINGS = ('student', 'cert_id')
+
+# The only fields text may read, so a stored template cannot reach past them into the models
+TEXT_FIELDS = frozenset({
+    'event.title', 'event.organizer', 'event.location', 'event.description', 'event.year',
+    'event.event_type.value', 'event.date', 'event.start_date', 'event.end_date',
+    'student.name', 'student.email', 'student.student_id', 'student.department', 'student.course',
+    'text[title]', 'text[subtitle]', 'text[accomplishment]', 'text[closing]',
+    'date', 'cert_id',
+})
+
+# Bindings that change from day to day, drawn per certificate so a cached static layer never carries them
+DATED_BINDINGS = ('date',)
+
+IMAGE_SLOTS = {
+    'background': ('background_path', 'background_image'),
+    'logo': ('logo_path', 'logo_image'),
+    'signature': ('signature_path', 'signature_image'),
+}
+
+_LENGTH = re.compile(r'^\s*(-?\d+(?:\.\d+)?)%\s*(?:([+-])\s*(\d+(?:\.\d+)?))?\s*$')
+
+CompiledLayout = namedtuple('CompiledLayout', 'pagesize static_ops student_ops student_styles')
+
+
+class LayoutError(ValueError):
+    """A template layout spec that cannot be compiled"""
+
+
+def has_layout(template):
+    """True when a template carries a declarative element list"""
+    return template is not None and bool(template.template_config.get('elements'))
+
+
+def _length(value, extent):
+    """Resolve a number or "<percent>%[+-offset]" against a page extent"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _LENGTH.match(str(value))
+    if not match:
+        raise LayoutError(f"Invalid position or size: {value!r}")
+    result = float(match.group(1)) * extent / 100
+    if match.group(2):
+        offset = float(match.group(3))
+        result += offset if match.group(2) == '+' else -offset
+    return result
+
+
+def _color(value, colors):
+    if value is None:
+        return None
+    try:
+        return HexColor(colors.get(value, value))
+    except Exception:
+        raise LayoutError(f"Invalid color: {value!r}")
+
+
+def _font(element, fonts):
+    """(font name, size) for an element, falling back to Helvetica when a face cannot be loaded"""
+    spec = element.get('font', 'content')
+    if isinstance(spec, str):
+        spec = fonts.get(spec, {'family': spec})
+    family = spec.get('family', 'Helvetica')
+    size = float(element.get('size', spec.get('size', 12)))
+    return (family if ensure_font(family) else 'Helvetica'), size
+
+
+def _text_fields(text):
+    """The binding names used by a format string, validated against TEXT_FIELDS"""
+    fields = []
+    try:
+        parsed = list(Formatter().parse(text))
+    except ValueError as e:
+        raise LayoutError(f"Invalid text {text!r}: {e}")
+    for _, field, spec, _ in parsed:
+        if field is None:
+            continue
+        if field not in TEXT_FIELDS:
+            raise LayoutError(f"Unknown text binding {{{field}}} in {text!r}")
+        # str.format fills fields nested in a format spec too, which would get past the check above
+        if spec and '{' in spec:
+            raise LayoutError(f"Nested binding in {{{field}:{spec}}} in {text!r}")
+        fields.append(field)
+    return tuple(fields)
+
+
+class _OpList:
+    """Collects draw operations, dropping color and line width changes that do not change anything"""
+
+    def __init__(self):
+        self.ops = []
+        self._state = {}
+
+    def set(self, name, value):
+        if value is not None and self._state.get(name) != value:
+            self._state[name] = value
+            self.ops.append((name, value))
+
+    def add(self, *op):
+        self.ops.append(op)
+
+
+def compile_layout(config):
+    """Turn a template_config with "elements" into flat static and per-student draw operations"""
+    pagesize = PAGE_SIZES.get(config.get('page', 'landscape'))
+    if pagesize is None:
+        raise LayoutError(f"Unknown page: {config.get('page')!r}")
+    width, height = pagesize
+    colors = config.get('colors', {})
+    fonts = config.get('fonts', {})
+    margin = config.get('layout', {}).get('margin', 40)
+
+    static, student = _OpList(), _OpList()
+    student_styles = {}
+
+    for index, element in enumerate(config.get('elements', [])):
+        try:
+            _compile_element(index, element, static, student, student_styles, width, height, colors, fonts,
+                             margin)
+        except KeyError as e:
+            raise LayoutError(f"Element {index} ({element.get('type')}) is missing {e}")
+
+    return CompiledLayout(pagesize, tuple(static.ops), tuple(student.ops), student_styles)
+
+
+def _compile_element(index, element, static, student, student_styles, width, height, colors, fonts, margin):
+    """Append the draw operations for one layout element"""
+    kind = element.get('type')
+    fill = _color(element.get('fill'), colors)
+    stroke = _color(element.get('stroke'), colors)
+
+    if kind == 'rect':
+        static.set('fill', fill)
+        static.set('stroke', stroke)
+        static.set('line_width', element.get('line_width', 1) if stroke else None)
+        static.add('rect', _length(element.get('x', 0), width), _length(element.get('y', 0), height),
+                   _length(element['width'], width), _length(element['height'], height),
+                   float(element.get('radius', 0)), fill is not None, stroke is not None)
+    elif kind == 'line':
+        static.set('stroke', stroke or black)
+        static.set('line_width', element.get('line_width', 1))
+        static.add('line', _length(element['x1'], width), _length(element['y1'], height),
+                   _length(element['x2'], width), _length(element['y2'], height))
+    elif kind == 'circle':
+        static.set('fill', fill)
+        static.set('stroke', stroke)
+        static.set('line_width', element.get('line_width', 1) if stroke else None)
+        static.add('circle', _length(element['x'], width), _length(element['y'], height),
+                   float(element['r']), fill is not None, stroke is not None)
+    elif kind == 'image':
+        if element.get('slot') not in IMAGE_SLOTS:
+            raise LayoutError(f"Unknown image slot: {element.get('slot')!r}")
+        static.add('image', element['slot'], _length(element.get('x', 0), width),
+                   _length(element.get('y', 0), height), _length(element['width'], width),
+                   _length(element['height'], height), bool(element.get('preserve_aspect', False)),
+                   element.get('mask'))
+    elif kind == 'text':
+        text = element.get('text', '')
+        fields = _text_fields(text)
+        font_name, size = _font(element, fonts)
+        color = _color(element.get('color', colors.get('text', '#000000')), colors)
+        x = _length(element.get('x', '50%'), width)
+        y = _length(element['y'], height)
+        transform = element.get('transform')
+        max_width = element.get('max_width')
+        max_width = _length(max_width, width) if max_width is not None else None
+
+        roots = {re.split(r'[.\[]', field, maxsplit=1)[0] for field in fields}
+        if roots & set(STUDENT_BINDINGS):
+            # Student text is laid out ahead of drawing (see layout_template_students) and centred
+            key = f"e{index}"
+            student_styles[key] = (text, fields, transform, TextStyle(
+                font_name, size, max_width if max_width is not None else width - 2 * margin,
+                element.get('min_size'), int(element.get('max_lines', 1)),
+            ))
+            box = element.get('box')
+            if box is not None:
+                box = (float(box.get('padding', 20)), float(box.get('padding_y', 8)),
+                       _color(box.get('fill'), colors), _color(box.get('stroke'), colors),
+                       float(box.get('line_width', 1)))
+            student.add('student_text', key, x, y, color, box)
+        else:
+            align = element.get('align', 'center')
+            if align not in ('left', 'center', 'right'):
+                raise LayoutError(f"Unknown text align: {align!r}")
+            ops = student if roots & set(DATED_BINDINGS) else static
+            if ops is student:
+                # student_text changes the fill behind the op list's back, so it is always set here
+                student.add('fill', color)
+            else:
+                static.set('fill', color)
+            ops.add('text', x, y, align, font_name, size, text, fields, transform, max_width)
+    else:
+        raise LayoutError(f"Unknown element type: {kind!r}")
+
+
+@lru_cache(maxsize=64)
+def _compile_cached(template_id, config_json):
+    return compile_layout(json.loads(config_json))
+
+
+def get_compiled_layout(template):
+    """Compiled layout for a template, compiled once per template and stored config"""
+    config = getattr(template, 'config', None)
+    if not isinstance(config, str):
+        # Templates built in code carry only the parsed dict
+        config = json.dumps(template.template_config, sort_keys=True, default=str)
+    return _compile_cached(getattr(template, 'id', None), config)
+
+
+def _binding_values(event, student=None):
+    now = datetime.now()
+    values = {
+        'event': event,
+        'student': student,
+        'text': format_certificate_text(event, None),
+        'date': now.strftime('%B %d, %Y'),
+        'cert_id': None,
+    }
+    if student is not None:
+        values['cert_id'] = f"CERT-{event.id}-{student.id}-{now.strftime('%Y%m%d')}"
+    return values
+
+
+def _render_text(text, fields, transform, values):
+    """Fill a text element's bindings; None when any bound value is empty"""
+    formatter = Formatter()
+    for field in fields:
+        value, _ = formatter.get_field(field, (), values)
+        if value is None or value == '':
+            return None
+    rendered = text.format_map(values)
+    if transform == 'upper':
+        rendered = rendered.upper()
+    elif transform == 'title':
+        rendered = rendered.title()
+    return rendered
+
+
+def _image_paths(event, template, upload_folder, pagesize):
+    """Resolve each image slot to a file, preferring the event's upload over the template image"""
+    page_variant = 'page_landscape' if pagesize[0] > pagesize[1] else 'page_portrait'
+    paths = {}
+    for slot, (event_field, template_field) in IMAGE_SLOTS.items():
+        path = None
+        name = getattr(event, event_field, None)
+        if name:
+            variant = page_variant if slot == 'background' else 'box'
+            path = render_image_path(os.path.join(upload_folder, name), variant)
+        if not (path and os.path.exists(path)):
+            path = getattr(template, template_field, None) if template is not None else None
+        paths[slot] = path if path and os.path.exists(path) else None
+    return paths
+
+
+def run_ops(c, ops, values, images=None, layout=None, student_styles=None):
+    """Execute compiled draw operations on a canvas"""
+    for op in ops:
+        name = op[0]
+        if name == 'fill':
+            c.setFillColor(op[1])
+        elif name == 'stroke':
+            c.setStrokeColor(op[1])
+        elif name == 'line_width':
+            c.setLineWidth(op[1])
+        elif name == 'rect':
+            _, x, y, w, h, radius, fill, stroke = op
+            if radius:
+                c.roundRect(x, y, w, h, radius, fill=fill, stroke=stroke)
+            else:
+                c.rect(x, y, w, h, fill=fill, stroke=stroke)
+        elif name == 'line':
+            c.line(*op[1:])
+        elif name == 'circle':
+            _, x, y, r, fill, stroke = op
+            c.circle(x, y, r, fill=fill, stroke=stroke)
+        elif name == 'image':
+            _, slot, x, y, w, h, preserve, mask = op
+            if images and images.get(slot):
+                with stage('background' if slot == 'background' else 'images'):
+                    draw_cached_image(c, images[slot], x, y, w, h, preserveAspectRatio=preserve, mask=mask)
+        elif name == 'text':
+            _, x, y, align, font_name, size, text, fields, transform, max_width = op
+            rendered = _render_text(text, fields, transform, values)
+            if rendered is None:
+                continue
+            if max_width is not None:
+                size = fit_font_size(rendered, font_name, size, max_width)
+            c.setFont(font_name, size)
+            if align == 'center':
+                c.drawCentredString(x, y, rendered)
+            elif align == 'right':
+                c.drawRightString(x, y, rendered)
+            else:
+                c.drawString(x, y, rendered)
+        elif name == 'student_text':
+            _, key, x, y, color, box = op
+            text_layout = layout.get(key) if layout else None
+            if text_layout is None:
+                text, fields, transform, style = student_styles[key]
+                rendered = _render_text(text, fields, transform, values)
+                if rendered is None:
+                    continue
+                text_layout = layout_text(rendered, style)
+            if box is not None:
+                _draw_text_box(c, x, y, text_layout, box)
+            c.setFillColor(color)
+            draw_text_layout(c, x, y, text_layout)
+
+
+def _draw_text_box(c, x, y, text_layout, box):
+    padding, padding_y, fill, stroke, line_width = box
+    ascent, descent = font_metrics(text_layout.font_name, text_layout.font_size)
+    half_block = (len(text_layout.lines) - 1) * text_layout.leading / 2
+    top = y + half_block + ascent + padding_y
+    bottom = y - half_block + descent - padding_y
+    box_width = text_layout.width + 2 * padding
+    if fill is not None:
+        c.setFillColor(fill)
+    if stroke is not None:
+        c.setStrokeColor(stroke)
+        c.setLineWidth(line_width)
+    c.rect(x - box_width / 2, bottom, box_width, top - bottom, fill=fill is not None, stroke=stroke is not None)
+
+
+def layout_template_students(event, students, template):
+    """Lay out the student text elements of a template for a whole run; one row per student"""
+    compiled = get_compiled_layout(template)
+    styles = {key: spec[3] for key, spec in compiled.student_styles.items()}
+    rows = []
+    for student in students:
+        values = _binding_values(event, student)
+        row = {}
+        for key, (text, fields, transform, _) in compiled.student_styles.items():
+            rendered = _render_text(text, fields, transform, values)
+            if rendered is not None:
+                row[key] = rendered
+        rows.append(row)
+    return build_layout_table(rows, styles)
+
+
+def draw_template_static(c, width, height, event, template, upload_folder):
+    """Draw the student-independent elements of a template layout"""
+    compiled = get_compiled_layout(template)
+    images = _image_paths(event, template, upload_folder, compiled.pagesize)
+    run_ops(c, compiled.static_ops, _binding_values(event), images)
+
+
+def draw_template_student(c, width, height, event, student, template, layout=None):
+    """Draw the student elements of a template layout, from a prepared layout row when given"""
+    compiled = get_compiled_layout(template)
+    run_ops(c, compiled.student_ops, _binding_values(event, student), layout=layout,
+            student_styles=compiled.student_styles)
@@ -5,6 +5,7 @@ import enum
 import json
 from flask import url_for
 from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.schema import CreateColumn
 
 
 db = SQLAlchemy()
@@ -160,8 +161,144 @@ class Certificate(db.Model):
     template_id = db.Column(db.Integer, db.ForeignKey('certificate_template.id'))
     certificate_path = db.Column(db.String(300))
     issued_date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Hash of the event, student, template and assets the PDF was rendered from, plus one hash per part
+    fingerprint = db.Column(db.String(64))
+    fingerprint_parts = db.Column(db.Text)
     
     # Relationships
     student = db.relationship('Student', backref='certificates')
     event = db.relationship('Event', backref='certificates')
     template = db.relationship('CertificateTemplate', backref='certificates')
+
+class BulkJob(db.Model):
+    """A background bulk run (certificates, booklet or email); its items are checkpointed as they finish"""
+    __tablename__ = 'bulk_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    label = db.Column(db.String(200))
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    template_id = db.Column(db.String(50))
+    status = db.Column(db.String(20), default='queued', index=True)
+    total = db.Column(db.Integer, default=0)
+    done = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    options_json = db.Column(db.Text)
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # Process running the job and its last heartbeat, so a restarted worker can take over
+    worker_id = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Relationships
+    event = db.relationship('Event', backref='bulk_jobs')
+    items = db.relationship('BulkJobItem', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    @property
+    def options(self):
+        """Get job options as dictionary"""
+        return json.loads(self.options_json) if self.options_json else {}
+    
+    @options.setter
+    def options(self, options_dict):
+        self.options_json = json.dumps(options_dict)
+    
+    @property
+    def result(self):
+        """Get job result as dictionary"""
+        return json.loads(self.result_json) if self.result_json else None
+    
+    @result.setter
+    def result(self, result_dict):
+        self.result_json = json.dumps(result_dict) if result_dict is not None else None
+
+class BulkJobItem(db.Model):
+    """One student's share of a bulk job: pending until it is done or failed"""
+    __tablename__ = 'bulk_job_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('bulk_jobs.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), default='pending')
+    certificate_path = db.Column(db.String(300))
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+    
+    # Relationships
+    student = db.relationship('Student')
+    
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'student_id', name='unique_job_student'),
+        db.Index('ix_bulk_job_items_job_status', 'job_id', 'status'),
+    )
+
+class OutboxMessage(db.Model):
+    """An email waiting to be sent, retried with backoff; at most one per event, student and kind"""
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Both empty for an email that is not about a student, such as a custom email; those are never merged
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'))
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'))
+    kind = db.Column(db.String(30), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(300), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    # The certificate the email is about, recorded for the student once it is sent
+    certificate_path = db.Column(db.String(300))
+    # queued, sending, sent or failed (gave up)
+    status = db.Column(db.String(20), default='queued')
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    # Set when a worker takes the message, so two workers never send it both
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    event = db.relationship('Event')
+    student = db.relationship('Student')
+    
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'student_id', 'kind', name='unique_outbox_event_student_kind'),
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class EmailSendSlot(db.Model):
+    """A send time reserved by the email rate limiter; slots of the last day are what the quotas count"""
+    __tablename__ = 'email_send_slots'
+    
+    # Assigned by the limiter as the previous slot's id plus one, so two workers cannot reserve the same turn
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    send_at = db.Column(db.DateTime, nullable=False, index=True)
+
+def add_missing_columns():
+    """Add model columns missing from existing tables; create_all only creates whole tables.
+
+    A column can only be added when existing rows have a value for it, so NOT
+    NULL columns without a server default are reported and left out.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                print(f"✗ Column {table.name}.{column.name} is NOT NULL without a server default; "
+                      f"add it by hand")
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column_ddl}'))
+            print(f"✓ Added column {table.name}.{column.name}")
+    db.session.commit()
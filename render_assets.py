@@ -0,0 +1,315 @@
+import copy
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader, _digester
+from reportlab.pdfbase.pdfdoc import PDFImageXObject, PDFObjectReference, xObjectName
+
+from render_trace import stage
+
+
+# Upper bound for encoded image data kept in memory per process
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Render variants written next to an upload: name -> (box in points, resolution in dpi, JPEG quality).
+# The "-q1" and "-q2" variants are smaller steps for byte budgets, written the first time they are drawn.
+RENDER_VARIANTS = {
+    'page_landscape': ((842, 595), 150, 85),
+    'page_portrait': ((595, 842), 150, 85),
+    'box': ((120, 120), 300, 85),
+    'page_landscape-q1': ((842, 595), 110, 70),
+    'page_portrait-q1': ((595, 842), 110, 70),
+    'box-q1': ((120, 120), 200, 75),
+    'page_landscape-q2': ((842, 595), 72, 50),
+    'page_portrait-q2': ((595, 842), 72, 50),
+    'box-q2': ((120, 120), 150, 60),
+}
+
+# Image quality levels each output profile draws at, best first, and whether the PDF gets
+# document info. Level None draws the uploaded originals, 0 the page-resolution variants and
+# 1 and 2 the smaller ones; a byte budget steps down through a profile's levels until it fits.
+OUTPUT_PROFILES = {
+    'screen': ((0, 1, 2), False),
+    'print': ((None, 0, 1, 2), False),
+    'archive': ((None,), True),
+}
+
+DEFAULT_OUTPUT_PROFILE = 'screen'
+
+# Variants produced for each kind of event image
+UPLOAD_VARIANTS = {
+    'background': ('page_landscape', 'page_portrait'),
+    'logo': ('box',),
+    'signature': ('box',),
+}
+
+VARIANT_EXTENSIONS = ('.jpg', '.png')
+
+# Image quality level being drawn on this thread
+_local = threading.local()
+
+
+def register_shared_xobject(doc, reg_name, xobject):
+    """Register an already encoded image XObject in another document without re-encoding it"""
+    if reg_name in doc.idToObject:
+        return
+    # ReportLab tags registered objects with their document name, so each
+    # document gets a shallow clone that shares the encoded stream data
+    clone = copy.copy(xobject)
+    clone.__dict__.pop('__InternalName__', None)
+    doc.Reference(clone, reg_name)
+
+
+class PreparedImage:
+    """An image file decoded, alpha-split and encoded into PDF XObjects once"""
+
+    def __init__(self, path, mask):
+        # Same name canvas.drawImage derives for a filename, so it finds our object
+        self.name = _digester(f"{path}{mask}")
+        self.reg_name = xObjectName(self.name)
+
+        reader = ImageReader(path)
+        self.xobject = PDFImageXObject(self.name, reader, mask=mask)
+        self.xobject.name = self.name
+        self.smask = getattr(self.xobject, '_smask', None)
+        if self.smask is not None:
+            self.smask_reg_name = xObjectName(self.smask.name)
+            self.xobject.smask = PDFObjectReference(self.smask_reg_name)
+            del self.xobject._smask
+
+        self.nbytes = len(self.xobject.streamContent)
+        if self.smask is not None:
+            self.nbytes += len(self.smask.streamContent)
+
+    def register(self, doc):
+        """Make this image available to canvas.drawImage in the given document"""
+        register_shared_xobject(doc, self.reg_name, self.xobject)
+        if self.smask is not None:
+            register_shared_xobject(doc, self.smask_reg_name, self.smask)
+
+
+class ImageAssetCache:
+    """Process-wide LRU of prepared images keyed by path, mtime, size and mask"""
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, mask=None):
+        """Return the PreparedImage for a file, or None when the file does not exist"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = (path, stat.st_mtime_ns, stat.st_size, str(mask))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Decode outside the lock; two threads may race on a cold entry, which is harmless
+        entry = PreparedImage(path, mask)
+        with self._lock:
+            self.misses += 1
+            if entry.nbytes <= self.max_bytes and key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += entry.nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+IMAGE_CACHE = ImageAssetCache()
+
+
+def draw_cached_image(c, image_path, x, y, width, height, preserveAspectRatio=False, mask=None):
+    """canvas.drawImage for a file path, reusing the decoded and encoded image across renders"""
+    entry = IMAGE_CACHE.get(image_path, mask)
+    if entry is not None:
+        entry.register(c._doc)
+    return c.drawImage(image_path, x, y, width=width, height=height,
+                       preserveAspectRatio=preserveAspectRatio, mask=mask)
+
+
+def _variant_base(path, variant):
+    root, _ = os.path.splitext(path)
+    return f"{root}@{variant}"
+
+
+def variant_path(path, variant):
+    """Path of an up-to-date render variant of an image, or None if there is none"""
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    base = _variant_base(path, variant)
+    for ext in VARIANT_EXTENSIONS:
+        candidate = base + ext
+        try:
+            if os.stat(candidate).st_mtime_ns >= source_mtime:
+                return candidate
+        except OSError:
+            continue
+    return None
+
+
+@contextmanager
+def image_quality(level):
+    """Draw images at a quality level (see OUTPUT_PROFILES) on this thread while the block runs"""
+    previous = getattr(_local, 'level', 0)
+    _local.level = level
+    try:
+        yield
+    finally:
+        _local.level = previous
+
+
+def current_image_quality():
+    """The image quality level render_image_path picks variants for on this thread"""
+    return getattr(_local, 'level', 0)
+
+
+def _leveled_variant(variant, level):
+    return variant if level == 0 else f"{variant}-q{level}"
+
+
+def render_image_path(path, variant):
+    """The image file to draw for a given use at the current quality level.
+
+    Falls back to the next better variant, and finally the original, when a
+    variant does not exist; reduced variants are written on first use.
+    """
+    if not path:
+        return path
+    level = current_image_quality()
+    if level is None:
+        return path
+    with stage('asset_lookup'):
+        for step in range(level, -1, -1):
+            name = _leveled_variant(variant, step)
+            found = variant_path(path, name) or (step > 0 and _create_variant(path, name))
+            if found:
+                return found
+        return path
+
+
+def _has_alpha(image):
+    if image.mode in ('RGBA', 'LA'):
+        return True
+    return image.mode == 'P' and 'transparency' in image.info
+
+
+def _write_variant(image, source_path, variant, keep_alpha, force=False):
+    """Resize one image into a variant's box and save it; returns the path or None if not needed"""
+    (box_w, box_h), dpi, quality = RENDER_VARIANTS[variant]
+    max_w = round(box_w * dpi / 72)
+    max_h = round(box_h * dpi / 72)
+
+    if keep_alpha and _has_alpha(image):
+        image = image.convert('RGBA')
+        # A fully opaque alpha channel would only cost a soft mask per render
+        if image.getchannel('A').getextrema() == (255, 255):
+            image = image.convert('RGB')
+    elif image.mode not in ('L', 'RGB'):
+        # Page backgrounds are drawn without a mask, so alpha is dropped just as the renderer does
+        image = image.convert('RGB')
+
+    if keep_alpha:
+        # Logos and signatures keep their aspect ratio inside the box
+        size = image.size
+        if image.width > max_w or image.height > max_h:
+            scale = min(max_w / image.width, max_h / image.height)
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    else:
+        # Backgrounds are stretched to the page, so each axis is capped independently
+        size = (min(image.width, max_w), min(image.height, max_h))
+
+    source_ext = os.path.splitext(source_path)[1].lower()
+    if not force and size == image.size and image.mode != 'RGBA' and source_ext in ('.jpg', '.jpeg'):
+        # Already a page-resolution JPEG; drawing the original costs nothing extra
+        return None
+    if size != image.size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    base = _variant_base(source_path, variant)
+    # Written aside and renamed, so a render running at the same time never reads half a file
+    tmp_path = f"{base}.{uuid.uuid4().hex}.tmp"
+    if image.mode == 'RGBA' or (keep_alpha and source_ext not in ('.jpg', '.jpeg')):
+        out_path = base + '.png'
+        image.save(tmp_path, format='PNG', optimize=True)
+    else:
+        out_path = base + '.jpg'
+        image.save(tmp_path, format='JPEG', quality=quality, optimize=True)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _create_variant(path, variant):
+    """Write one reduced variant of an image on demand; returns its path, or None if it cannot be made"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with Image.open(path) as image:
+            return _write_variant(image, path, variant, keep_alpha=not variant.startswith('page_'), force=True)
+    except Exception as e:
+        print(f"✗ Could not create {variant} variant for {os.path.basename(path)}: {e}")
+        return None
+
+
+def create_render_variants(path, kind):
+    """Write the page-resolution variants for an uploaded event image ('background', 'logo' or 'signature')"""
+    created = []
+    try:
+        with Image.open(path) as image:
+            keep_alpha = kind != 'background'
+            largest = max(
+                round(max(RENDER_VARIANTS[v][0]) * RENDER_VARIANTS[v][1] / 72) for v in UPLOAD_VARIANTS[kind]
+            )
+            # Let the JPEG decoder downscale large photos while loading
+            image.draft('RGB', (largest, largest))
+            image.load()
+            for variant in UPLOAD_VARIANTS[kind]:
+                out_path = _write_variant(image, path, variant, keep_alpha)
+                if out_path:
+                    created.append(out_path)
+        print(f"✓ Render variants created for {os.path.basename(path)}: {len(created)}")
+    except Exception as e:
+        print(f"✗ Could not create render variants for {os.path.basename(path)}: {e}")
+    return created
+
+
+def delete_render_variants(path):
+    """Remove every render variant written for an image"""
+    for variant in RENDER_VARIANTS:
+        base = _variant_base(path, variant)
+        for ext in VARIANT_EXTENSIONS:
+            if os.path.exists(base + ext):
+                os.remove(base + ext)
@@ -0,0 +1,361 @@
+"""Offline certificate rendering benchmark.
+
+Renders every generator against synthetic events and students, with and
+without background, logo and signature images, and writes throughput,
+latency percentiles, peak RSS and output sizes to a JSON file. Every case
+runs in a fresh process of its own, so its peak RSS is that case's alone
+rather than the high-water mark of all cases before it. Each case
+runs once per render engine (ReportLab and, where WeasyPrint is installed,
+HTML) and the engines are compared side by side. No Flask app or database
+is needed.
+
+    python render_benchmark.py --count 50 --output benchmark_results.json
+    python render_benchmark.py --baseline benchmark_results.json
+    python render_benchmark.py --profile screen --max-bytes 100000
+    python render_benchmark.py --engines reportlab html
+
+With --baseline the run is compared against an earlier results file and
+the exit status is 1 when any case got slower than the tolerance allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from time import perf_counter
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+import reportlab
+
+from certificate_generator import (
+    OutputProfile, _generate_resolved, build_static_layer, build_student_layouts, resolve_certificate_type,
+)
+from models import EventType
+from render_assets import DEFAULT_OUTPUT_PROFILE, IMAGE_CACHE, OUTPUT_PROFILES, create_render_variants
+from render_engines import DEFAULT_RENDER_ENGINE, RENDER_ENGINES
+from render_pool import worker_context
+from render_trace import trace_run
+from template_config import PREDEFINED_TEMPLATES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Generators benchmarked without a template; premium runs once per predefined template
+PLAIN_GENERATORS = ['custom_font', 'enhanced', 'basic']
+
+FIRST_NAMES = ['Aarav', 'Maria', 'Chen', 'Olusegun', 'Fatima', 'Lakshmi', 'John', 'Anastasia', 'Mohammed', 'Sofia']
+LAST_NAMES = ['Patel', 'Garcia', 'Wei', 'Adeyemi', 'Al-Hashimi', 'Venkataraman', 'Smith',
+              'Konstantinopoulou', 'Rahman', 'Rodriguez de la Fuente']
+
+
+def make_assets(folder):
+    """Write a synthetic background, logo and signature into folder, with their render variants"""
+    background = Image.new('RGB', (2480, 1754), '#F4EFE1')
+    draw = ImageDraw.Draw(background)
+    for i in range(0, 2480, 40):
+        draw.line([(i, 0), (2480 - i, 1754)], fill=(200 + i % 50, 190, 160), width=3)
+    draw.rectangle([60, 60, 2420, 1694], outline='#8B4513', width=24)
+    background.save(os.path.join(folder, 'bench_background.jpg'), quality=90)
+
+    logo = Image.new('RGBA', (600, 600), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse([20, 20, 580, 580], fill=(30, 58, 138, 255), outline=(212, 175, 55, 255), width=30)
+    draw.rectangle([200, 200, 400, 400], fill=(212, 175, 55, 255))
+    logo.save(os.path.join(folder, 'bench_logo.png'))
+
+    signature = Image.new('RGBA', (800, 300), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(signature)
+    draw.line([(40, 220), (200, 60), (320, 240), (480, 80), (760, 200)], fill=(20, 20, 80, 255), width=12)
+    signature.save(os.path.join(folder, 'bench_signature.png'))
+
+    # Uploads get page-resolution variants, so the benchmark draws what production draws
+    for filename, kind in (('bench_background.jpg', 'background'), ('bench_logo.png', 'logo'),
+                           ('bench_signature.png', 'signature')):
+        create_render_variants(os.path.join(folder, filename), kind)
+
+
+def make_event(with_assets):
+    """A synthetic event, with image paths relative to the benchmark upload folder when with_assets is set"""
+    return SimpleNamespace(
+        id=1, title='Applied Machine Learning for Scientific Computing', event_type=EventType.Workshop,
+        organizer='Department of Computer Science', location='Main Auditorium, Block A',
+        start_date=date(2025, 3, 10), end_date=date(2025, 3, 12), date=date(2025, 3, 10),
+        background_path='bench_background.jpg' if with_assets else None,
+        logo_path='bench_logo.png' if with_assets else None,
+        signature_path='bench_signature.png' if with_assets else None,
+    )
+
+
+def make_students(count, seed=0):
+    """Synthetic students with a realistic spread of name lengths, the same for every run"""
+    rng = random.Random(seed)
+    students = []
+    for i in range(count):
+        parts = [rng.choice(FIRST_NAMES)] + [rng.choice(LAST_NAMES) for _ in range(rng.choice([1, 1, 2, 3]))]
+        students.append(SimpleNamespace(id=i + 1, name=" ".join(parts)))
+    return students
+
+
+def make_template(key, index):
+    """A stand-in CertificateTemplate built the same way create_default_templates builds one"""
+    data = PREDEFINED_TEMPLATES[key]
+    config = {"colors": data["colors"], "fonts": data["fonts"], "layout": data.get("layout", {})}
+    if "elements" in data:
+        config["page"] = data.get("page", "landscape")
+        config["elements"] = data["elements"]
+    return SimpleNamespace(id=index, name=data["name"], template_config=config, logo_image=None, signature_image=None)
+
+
+def benchmark_cases(generators=None):
+    """(case name, requested generator, template or None) for every generator and predefined template"""
+    cases = [(name, name, None) for name in PLAIN_GENERATORS]
+    for index, key in enumerate(PREDEFINED_TEMPLATES, start=1):
+        cases.append((f"premium/{key}", 'premium', make_template(key, index)))
+    if generators:
+        cases = [case for case in cases if case[0] in generators or case[0].split('/')[0] in generators]
+    return cases
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB, or None where it cannot be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def run_case(name, generator, template, with_assets, students, upload_folder, output_folder, static_layer=True,
+             profile=DEFAULT_OUTPUT_PROFILE, max_bytes=None, engine=DEFAULT_RENDER_ENGINE):
+    """Render every student for one case and return its measurements"""
+    event = make_event(with_assets)
+    certificate_type = resolve_certificate_type(event, template, generator)
+    output_profile = OutputProfile(profile, max_bytes)
+    render_engine = RENDER_ENGINES[engine]
+    # Static layers and precomputed layouts are ReportLab's; other engines render each certificate whole
+    static_layer = static_layer and engine == DEFAULT_RENDER_ENGINE
+    # Each case starts cold, so the first render pays for image decoding like a fresh worker would
+    IMAGE_CACHE.clear()
+
+    latencies = []
+    sizes = []
+    failures = 0
+    with contextlib.redirect_stdout(io.StringIO()), trace_run(name, keep=False) as run:
+        start = perf_counter()
+        layer = None
+        if static_layer:
+            layer = build_static_layer(event, certificate_type, template, upload_folder, output_profile.level)
+        if engine == DEFAULT_RENDER_ENGINE:
+            layouts = build_student_layouts(certificate_type, students, event, template)
+        else:
+            layouts = [None] * len(students)
+        setup_seconds = perf_counter() - start
+
+        for student, layout in zip(students, layouts):
+            t0 = perf_counter()
+            try:
+                if layer is not None and layer.image_level != output_profile.level:
+                    # The byte budget settled on smaller images, as a bulk run would rebuild its layer
+                    layer = build_static_layer(event, certificate_type, template, upload_folder,
+                                               output_profile.level)
+                if engine == DEFAULT_RENDER_ENGINE:
+                    path = _generate_resolved(certificate_type, event, student, template, output_folder,
+                                              upload_folder, layer, layout=layout, profile=output_profile)
+                else:
+                    path = render_engine.render(certificate_type, event, student, template, output_folder,
+                                                upload_folder, profile=output_profile)
+            except Exception:
+                path = None
+            latencies.append(perf_counter() - t0)
+            if path is None:
+                failures += 1
+                continue
+            sizes.append(os.path.getsize(path))
+            os.remove(path)
+        seconds = perf_counter() - start
+
+    warm = latencies[1:] or latencies
+    return {
+        'case': name,
+        'engine': engine,
+        'generator': certificate_type,
+        'assets': with_assets,
+        'static_layer': static_layer,
+        'certificates': len(students),
+        'failures': failures,
+        'seconds': round(seconds, 4),
+        'setup_ms': round(setup_seconds * 1000, 3),
+        'certificates_per_second': round(len(students) / seconds, 2) if seconds else None,
+        'first_ms': round(latencies[0] * 1000, 3) if latencies else None,
+        'p50_ms': round(percentile(warm, 0.50) * 1000, 3) if warm else None,
+        'p95_ms': round(percentile(warm, 0.95) * 1000, 3) if warm else None,
+        'mean_output_bytes': sum(sizes) // len(sizes) if sizes else None,
+        'max_output_bytes': max(sizes) if sizes else None,
+        'over_budget': sum(size > max_bytes for size in sizes) if max_bytes else None,
+        'peak_rss_kb': peak_rss_kb(),
+        'stages': run.as_dict()['stages'],
+    }
+
+
+def run_isolated_case(*args, **kwargs):
+    """run_case in a fresh process, so the peak RSS it reports belongs to that case only"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=worker_context()) as executor:
+        return executor.submit(run_case, *args, **kwargs).result()
+
+
+def available_engines(engines=None):
+    """The requested engines (all of them by default) that can run here; the others are reported and skipped"""
+    selected = []
+    for engine in engines or list(RENDER_ENGINES):
+        if RENDER_ENGINES[engine].available():
+            selected.append(engine)
+        else:
+            print(f"✗ Skipping the {engine} engine: it is not available in this environment")
+    return selected
+
+
+def run_benchmark(count=50, generators=None, static_layer=True, seed=0, profile=DEFAULT_OUTPUT_PROFILE,
+                  max_bytes=None, engines=None):
+    """Run every case and return the full results document"""
+    engines = available_engines(engines)
+    work_folder = tempfile.mkdtemp(prefix='certificate_bench_')
+    upload_folder = os.path.join(work_folder, 'uploads')
+    output_folder = os.path.join(work_folder, 'certificates')
+    os.makedirs(upload_folder)
+    os.makedirs(output_folder)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            make_assets(upload_folder)
+        students = make_students(count, seed)
+        results = []
+        for name, generator, template in benchmark_cases(generators):
+            for with_assets in (True, False):
+                for engine in engines:
+                    result = run_isolated_case(name, generator, template, with_assets, students, upload_folder,
+                                               output_folder, static_layer, profile, max_bytes, engine)
+                    results.append(result)
+                    print(f"{name:<32} {engine:<9} assets={'yes' if with_assets else 'no ':<3} "
+                          f"{result['certificates_per_second']:>8.1f}/s  p50 {result['p50_ms']:.2f}ms  "
+                          f"p95 {result['p95_ms']:.2f}ms  {result['mean_output_bytes'] or 0} bytes")
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'reportlab': reportlab.Version,
+            'pillow': Image.__version__,
+        },
+        'settings': {'count': count, 'static_layer': static_layer, 'seed': seed, 'profile': profile,
+                     'max_bytes': max_bytes, 'engines': engines},
+        'peak_rss_kb': max((r['peak_rss_kb'] for r in results if r['peak_rss_kb'] is not None), default=None),
+        'results': results,
+        'engine_comparison': compare_engines(results),
+    }
+
+
+def compare_engines(results, baseline_engine=DEFAULT_RENDER_ENGINE):
+    """Throughput and mean output size of every other engine relative to the baseline engine, per case"""
+    by_case = {}
+    for result in results:
+        by_case.setdefault((result['case'], result['assets']), {})[result.get('engine', DEFAULT_RENDER_ENGINE)] = result
+
+    comparison = []
+    for (case, assets), engines in by_case.items():
+        base = engines.get(baseline_engine)
+        if base is None:
+            continue
+        for engine, result in engines.items():
+            if engine == baseline_engine:
+                continue
+            speed = None
+            if base['certificates_per_second'] and result['certificates_per_second']:
+                speed = round(result['certificates_per_second'] / base['certificates_per_second'], 3)
+            size = None
+            if base['mean_output_bytes'] and result['mean_output_bytes']:
+                size = round(result['mean_output_bytes'] / base['mean_output_bytes'], 3)
+            comparison.append({'case': case, 'assets': assets, 'engine': engine,
+                               'throughput_ratio': speed, 'size_ratio': size})
+    return comparison
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """Cases whose throughput dropped by more than tolerance against a baseline results document"""
+    previous = {(r.get('engine', DEFAULT_RENDER_ENGINE), r['case'], r['assets']): r
+                for r in baseline.get('results', [])}
+    regressions = []
+    for result in current['results']:
+        before = previous.get((result.get('engine', DEFAULT_RENDER_ENGINE), result['case'], result['assets']))
+        if not before or not before.get('certificates_per_second') or not result['certificates_per_second']:
+            continue
+        ratio = result['certificates_per_second'] / before['certificates_per_second']
+        if ratio < 1 - tolerance:
+            regressions.append({'case': result['case'], 'engine': result.get('engine', DEFAULT_RENDER_ENGINE),
+                                'assets': result['assets'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark certificate rendering offline")
+    parser.add_argument('--count', type=int, default=50, help="certificates rendered per case")
+    parser.add_argument('--generators', nargs='*', help="only run these cases, e.g. basic premium/elegant_royal")
+    parser.add_argument('--no-static-layer', action='store_true', help="draw every certificate in full")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic student names")
+    parser.add_argument('--profile', default=DEFAULT_OUTPUT_PROFILE, choices=sorted(OUTPUT_PROFILES),
+                        help="output profile the certificates are rendered with")
+    parser.add_argument('--max-bytes', type=int, help="per-certificate byte budget")
+    parser.add_argument('--engines', nargs='*', choices=sorted(RENDER_ENGINES),
+                        help="render engines to compare (default: every one available)")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed throughput drop against the baseline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        # Read first, so the baseline can be the file this run is about to overwrite
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = run_benchmark(args.count, args.generators, not args.no_static_layer, args.seed, args.profile,
+                            args.max_bytes, args.engines)
+    for row in results['engine_comparison']:
+        print(f"{row['case']:<32} {row['engine']:<9} assets={'yes' if row['assets'] else 'no ':<3} "
+              f"{row['throughput_ratio'] or 0:>6.2f}x the throughput, {row['size_ratio'] or 0:>6.2f}x the size "
+              f"of {DEFAULT_RENDER_ENGINE}")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"✗ {regression['case']} [{regression['engine']}] (assets={regression['assets']}) "
+                  f"is at {regression['ratio']:.0%} of baseline throughput")
+        if regressions:
+            return 1
+        print("✓ No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
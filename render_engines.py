@@ -0,0 +1,252 @@
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+import font_registry
+from certificate_generator import (
+    OUTPUT_BYTES, OutputProfile, _describe_output, _generate_resolved, _resolve_upload_folder, get_image_paths,
+)
+from certificate_texts import format_certificate_text
+from render_assets import image_quality
+from render_trace import debug, render_trace, stage
+
+try:
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+except (ImportError, OSError):  # WeasyPrint also needs the Pango libraries; without them the HTML engine is off
+    weasyprint = None
+
+
+DEFAULT_RENDER_ENGINE = 'reportlab'
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Jinja template the HTML engine renders; a print version of the certificate.html design
+HTML_CERTIFICATE_TEMPLATE = 'certificate_pdf.html'
+
+# Colours of the HTML design, overridden by a certificate template's own colours
+HTML_DEFAULT_COLORS = {'gold': '#D4AF37', 'brown': '#8B4513', 'text': '#333333'}
+
+# Images and image streams the HTML engine keeps decoded between renders, least recently used dropped first
+HTML_IMAGE_CACHE_ENTRIES = 64
+
+# Engines already reported as unavailable, so the fallback is only announced once per process
+_reported_unavailable = set()
+
+
+def _file_url(path):
+    """file:// URL of an existing file for WeasyPrint, or None"""
+    if not path or not os.path.exists(path):
+        return None
+    return Path(os.path.abspath(path)).as_uri()
+
+
+def _event_dates(event):
+    start = getattr(event, 'start_date', None)
+    end = getattr(event, 'end_date', None)
+    if not start:
+        return None
+    if end and end != start:
+        return f"{start.strftime('%B %d, %Y')} - {end.strftime('%B %d, %Y')}"
+    return start.strftime('%B %d, %Y')
+
+
+class ImageLRU(OrderedDict):
+    """WeasyPrint image cache holding at most max_entries images, dropping the least recently used.
+
+    WeasyPrint only takes a dict (anything else is read as a cache folder),
+    so this is one, made safe for renders on several threads.
+    """
+
+    def __init__(self, max_entries=HTML_IMAGE_CACHE_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.max_entries:
+                self.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
+
+
+class ReportLabEngine:
+    """The hand-drawn ReportLab generators in certificate_generator"""
+
+    name = 'reportlab'
+
+    def available(self):
+        return True
+
+    def render(self, certificate_type, event, student, template, certificate_folder, upload_folder=None,
+               output=None, profile=None):
+        """Render one certificate; returns the path, buffer or bytes like the generators do, or None"""
+        return _generate_resolved(certificate_type, event, student, template, certificate_folder, upload_folder,
+                                  output=output, profile=profile)
+
+
+class HtmlEngine:
+    """certificate_pdf.html, compiled once by Jinja and laid out to PDF by WeasyPrint.
+
+    The page gets the same certificate text, event images and output profile
+    as the ReportLab generators. The certificate type only picks a ReportLab
+    drawing, so every certificate shares this one design; a template only
+    lends it its colours.
+    """
+
+    name = 'html'
+
+    def __init__(self, template_name=HTML_CERTIFICATE_TEMPLATE, template_folder=TEMPLATE_FOLDER):
+        self.template_name = template_name
+        self.template_folder = template_folder
+        self._template = None
+        # WeasyPrint's FontConfiguration is not thread-safe, so every rendering thread gets its own
+        self._local = threading.local()
+        # Images decoded by WeasyPrint, kept across renders so an event's background is loaded once
+        self._image_cache = ImageLRU()
+        self._lock = threading.Lock()
+
+    def available(self):
+        return weasyprint is not None
+
+    def _compiled(self):
+        """The compiled Jinja template, built on first use"""
+        with self._lock:
+            if self._template is None:
+                environment = Environment(loader=FileSystemLoader(self.template_folder),
+                                          autoescape=select_autoescape(['html']))
+                self._template = environment.get_template(self.template_name)
+        return self._template
+
+    def _font_config(self):
+        """This thread's WeasyPrint font configuration, created on first use"""
+        font_config = getattr(self._local, 'font_config', None)
+        if font_config is None:
+            font_config = self._local.font_config = FontConfiguration()
+        return font_config
+
+    def context(self, event, student, template, upload_folder):
+        """Template variables for one certificate, with images at the current image quality level"""
+        background, logo, signature = get_image_paths(event, upload_folder)
+        config = template.template_config if template is not None else None
+        colors = (config or {}).get('colors', {})
+        font_path = os.path.join(font_registry.FONT_FOLDER, font_registry.FONT_FILES['StoryScript'])
+        now = datetime.now()
+        return {
+            'event': event,
+            'student': student,
+            'text': format_certificate_text(event, None),
+            'colors': {
+                'gold': colors.get('primary', HTML_DEFAULT_COLORS['gold']),
+                'brown': colors.get('accent', HTML_DEFAULT_COLORS['brown']),
+                'text': colors.get('text', HTML_DEFAULT_COLORS['text']),
+            },
+            'images': {
+                'background': _file_url(background),
+                'logo': _file_url(logo),
+                'signature': _file_url(signature),
+            },
+            'font_url': _file_url(font_path),
+            'event_dates': _event_dates(event),
+            'issue_date': now.strftime('%B %d, %Y'),
+            'certificate_id': f"CERT-{event.id}-{student.id}-{now.strftime('%Y%m%d')}",
+        }
+
+    def render(self, certificate_type, event, student, template, certificate_folder, upload_folder=None,
+               output=None, profile=None):
+        """Render one certificate; returns the path, buffer or bytes like the generators do, or None"""
+        if output is None:
+            filename = f"certificate_html_{student.id}_{event.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            output = os.path.join(certificate_folder, filename)
+
+        try:
+            upload_folder = _resolve_upload_folder(upload_folder)
+            result = self._render(output, event, student, template, upload_folder, profile or OutputProfile())
+            debug(f"✓ HTML certificate saved: {_describe_output(output)}")
+            return result
+
+        except Exception as e:
+            print(f"Error generating HTML certificate: {e}")
+            traceback.print_exc()
+            return None
+
+    def _render(self, output, event, student, template, upload_folder, profile):
+        compiled = self._compiled()
+        options = {'cache': self._image_cache}
+        if profile.document_info:
+            # WeasyPrint can write real PDF/A, with the document info taken from the page's <title> and <meta>
+            options['pdf_variant'] = 'pdf/a-3b'
+
+        with render_trace('html') as trace:
+            for level in profile.attempts():
+                with image_quality(level):
+                    with stage('template'):
+                        html = compiled.render(self.context(event, student, template, upload_folder))
+                    with stage('save'):
+                        document = weasyprint.HTML(string=html, base_url=upload_folder)
+                        pdf_data = document.write_pdf(font_config=self._font_config(), **options)
+                if profile.max_bytes is None or len(pdf_data) <= profile.max_bytes:
+                    break
+            else:
+                print(f"✗ Certificate for {student.name} is {len(pdf_data)} bytes, over the "
+                      f"{profile.max_bytes} byte budget even with the smallest images")
+                trace.over_budget = True
+                profile.over_budget += 1
+            if profile.max_bytes is not None:
+                profile.settle(level)
+            trace.output_bytes = len(pdf_data)
+
+        if output == OUTPUT_BYTES:
+            return pdf_data
+        if isinstance(output, str):
+            with open(output, 'wb') as f:
+                f.write(pdf_data)
+        else:
+            output.write(pdf_data)
+        return output
+
+
+RENDER_ENGINES = {
+    'reportlab': ReportLabEngine(),
+    'html': HtmlEngine(),
+}
+
+
+def engine_name(template=None, engine=None):
+    """Name of the engine asked for: engine, else the template's "engine" setting, else the app setting"""
+    if engine is None and template is not None:
+        engine = (template.template_config or {}).get('engine')
+    if engine is None:
+        from flask import current_app
+        engine = current_app.config.get('CERTIFICATE_RENDER_ENGINE', DEFAULT_RENDER_ENGINE)
+    return engine
+
+
+def resolve_render_engine(template=None, engine=None):
+    """The engine to render with; one that is not installed here falls back to ReportLab with a warning"""
+    name = engine_name(template, engine)
+    if name not in RENDER_ENGINES:
+        raise ValueError(f"Unknown render engine: {name}")
+    selected = RENDER_ENGINES[name]
+    if not selected.available():
+        if name not in _reported_unavailable:
+            _reported_unavailable.add(name)
+            print(f"✗ The {name} render engine is not available here, rendering with ReportLab instead")
+        return RENDER_ENGINES[DEFAULT_RENDER_ENGINE]
+    return selected
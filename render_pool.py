@@ -0,0 +1,166 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+import multiprocessing
+import traceback
+
+
+# Attributes copied off the SQLAlchemy models so render jobs can cross process boundaries
+EVENT_FIELDS = (
+    'id', 'title', 'event_type', 'organizer', 'date', 'location', 'start_date', 'end_date',
+    'year', 'description', 'logo_path', 'signature_path', 'background_path', 'updated_at',
+)
+STUDENT_FIELDS = ('id', 'name', 'email', 'student_id', 'phone', 'department', 'course')
+TEMPLATE_FIELDS = ('id', 'name', 'template_config', 'background_image', 'logo_image', 'signature_image')
+
+# Static layers built inside a worker process, keyed by (type, event id, template id)
+_worker_layers = {}
+
+# Render jobs handed to the pool at a time, per worker; the rest wait in the parent
+JOBS_IN_FLIGHT_PER_WORKER = 2
+
+# Imported once by the fork server so each worker starts with the renderer loaded
+WORKER_PRELOAD = ['__main__', 'render_pool', 'certificate_generator']
+
+
+def _snapshot(obj, fields):
+    """Copy the given attributes of a model into a plain picklable object"""
+    if obj is None:
+        return None
+    return SimpleNamespace(**{field: getattr(obj, field, None) for field in fields})
+
+
+def snapshot_event(event):
+    return _snapshot(event, EVENT_FIELDS)
+
+
+def snapshot_student(student):
+    return _snapshot(student, STUDENT_FIELDS)
+
+
+def snapshot_template(template):
+    # The stored config string goes along so workers key compiled layouts on it without re-serialising
+    return _snapshot(template, TEMPLATE_FIELDS + ('config',))
+
+
+def make_render_jobs(event, students, template, certificate_type, certificate_folder, upload_folder,
+                     use_static_layer=True, layouts=None, profile=None):
+    """Turn an (event, students, template, type) bulk run into plain render job dicts.
+
+    layouts, if given, is the build_student_layouts table for the students and
+    is shipped with the jobs so workers draw without measuring text. profile
+    is the run's OutputProfile; each worker process gets its own copy.
+    """
+    event_data = snapshot_event(event)
+    template_data = snapshot_template(template)
+    if layouts is None:
+        layouts = [None] * len(students)
+    return [
+        {
+            'index': index,
+            'certificate_type': certificate_type,
+            'event': event_data,
+            'student': snapshot_student(student),
+            'template': template_data,
+            'certificate_folder': certificate_folder,
+            'upload_folder': upload_folder,
+            'use_static_layer': use_static_layer,
+            'layout': layout,
+            'profile': profile,
+        }
+        for index, (student, layout) in enumerate(zip(students, layouts))
+    ]
+
+
+def _get_layer(job, layers, image_level=0):
+    """Build the static layer once per (type, event, template, image level) and reuse it for later jobs"""
+    from certificate_generator import build_static_layer
+
+    template = job['template']
+    key = (job['certificate_type'], job['event'].id, template.id if template else None, job['upload_folder'],
+           image_level)
+    if key not in layers:
+        layers[key] = build_static_layer(job['event'], job['certificate_type'], template, job['upload_folder'],
+                                         image_level)
+    return layers[key]
+
+
+def run_render_job(job, layers=None):
+    """Render a single job; errors are returned in the result instead of raised"""
+    from certificate_generator import OutputProfile, _generate_resolved
+    from render_trace import trace_run
+
+    if layers is None:
+        layers = _worker_layers
+
+    result = {'index': job['index'], 'student_id': job['student'].id, 'path': None, 'error': None}
+    # The render's trace goes back with the result so the parent can fold it into its run summary
+    with trace_run('render job', keep=False) as run:
+        try:
+            profile = job.get('profile') or OutputProfile()
+            static_layer = _get_layer(job, layers, profile.level) if job['use_static_layer'] else None
+            result['path'] = _generate_resolved(
+                job['certificate_type'], job['event'], job['student'], job['template'],
+                job['certificate_folder'], job['upload_folder'], static_layer, layout=job.get('layout'),
+                profile=profile
+            )
+            if result['path'] is None:
+                result['error'] = "Certificate generator returned no file"
+        except Exception as e:
+            result['error'] = f"{e}\n{traceback.format_exc()}"
+    result['trace'] = run.records[-1] if run.records else None
+    return result
+
+
+def worker_context():
+    """Start method for render workers: a fork server where available, otherwise spawn.
+
+    Workers never fork from the web process itself, so they do not inherit
+    its threads, held locks or open database connections.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(WORKER_PRELOAD)
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def iter_render_jobs(jobs, workers=None):
+    """Render jobs across a process pool, yielding one result per job in the original order as they finish"""
+    if not jobs:
+        return
+
+    if not workers or workers <= 1 or len(jobs) == 1:
+        layers = {}
+        for job in jobs:
+            yield run_render_job(job, layers)
+        return
+
+    from bulk_jobs import wait_for_interactive
+
+    workers = min(workers, len(jobs))
+    remaining = iter(jobs)
+    pending = deque()
+    # Each worker process is fresh, so its module-level layer cache lives for this run only
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context())
+    try:
+        for job in remaining:
+            pending.append(executor.submit(run_render_job, job))
+            if len(pending) >= workers * JOBS_IN_FLIGHT_PER_WORKER:
+                break
+        while pending:
+            result = pending.popleft().result()
+            job = next(remaining, None)
+            if job is not None:
+                # Only a few jobs are ever queued in the pool, so an interactive render waiting
+                # here gets a free worker as soon as the ones already running finish
+                wait_for_interactive()
+                pending.append(executor.submit(run_render_job, job))
+            yield result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def run_render_jobs(jobs, workers=None):
+    """Render jobs across a process pool, returning one result per job in the original order"""
+    return list(iter_render_jobs(jobs, workers))
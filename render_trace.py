@@ -0,0 +1,208 @@
+import os
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+
+# Per-step render messages ("✓ Logo drawn ...") are only printed with CERTIFICATE_RENDER_DEBUG=1
+RENDER_DEBUG = os.environ.get('CERTIFICATE_RENDER_DEBUG', '') not in ('', '0')
+
+# Summaries of the latest bulk runs in this process, oldest first
+RECENT_RUNS = deque(maxlen=20)
+
+# The render trace and bulk run being recorded on this thread, if any
+_local = threading.local()
+
+
+def set_debug(enabled):
+    """Turn per-step render messages on or off"""
+    global RENDER_DEBUG
+    RENDER_DEBUG = bool(enabled)
+
+
+def debug(message):
+    """Print a per-step render message when render debugging is on"""
+    if RENDER_DEBUG:
+        print(message)
+
+
+class _StageTimer:
+    """Accumulates exclusive time per named stage; nested stages are not counted twice"""
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self._stack = []
+
+    def enter(self, name):
+        self._stack.append([name, perf_counter(), 0.0])
+
+    def exit(self):
+        name, start, children = self._stack.pop()
+        elapsed = perf_counter() - start
+        self.stages[name] += elapsed - children
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+
+class RenderTrace(_StageTimer):
+    """Stage timings, output size and generator for one rendered certificate"""
+
+    def __init__(self, certificate_type):
+        super().__init__()
+        self.certificate_type = certificate_type
+        self.output_bytes = None
+        # Set when a byte budget could not be met even at the smallest image quality
+        self.over_budget = False
+        self.error = None
+        self.seconds = None
+        self._start = perf_counter()
+
+    def as_dict(self):
+        return {
+            'certificate_type': self.certificate_type,
+            'stages': dict(self.stages),
+            'seconds': self.seconds,
+            'output_bytes': self.output_bytes,
+            'over_budget': self.over_budget,
+            'error': self.error,
+        }
+
+
+class RunSummary(_StageTimer):
+    """Render traces of one bulk run, aggregated; run-wide stages are timed on the run itself"""
+
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+        self.renders = 0
+        self.failures = 0
+        self.over_budget = 0
+        self.output_bytes = 0
+        self.render_seconds = 0.0
+        self.render_stages = defaultdict(float)
+        self.generators = Counter()
+        self.records = []
+        self.seconds = None
+        self._start = perf_counter()
+
+    def add(self, record):
+        """Fold one RenderTrace.as_dict() into the run, including ones sent back by worker processes"""
+        self.records.append(record)
+        self.renders += 1
+        if record['error']:
+            self.failures += 1
+        if record.get('over_budget'):
+            self.over_budget += 1
+        self.output_bytes += record['output_bytes'] or 0
+        self.render_seconds += record['seconds'] or 0
+        self.generators[record['certificate_type']] += 1
+        for name, seconds in record['stages'].items():
+            self.render_stages[name] += seconds
+
+    def finish(self):
+        self.seconds = perf_counter() - self._start
+
+    def as_dict(self):
+        renders = self.renders or 1
+        stages = {name: {'total_s': round(total, 4), 'mean_ms': round(total / renders * 1000, 3)}
+                  for name, total in sorted(self.render_stages.items())}
+        other = self.render_seconds - sum(self.render_stages.values())
+        stages['other'] = {'total_s': round(other, 4), 'mean_ms': round(other / renders * 1000, 3)}
+        return {
+            'label': self.label,
+            'renders': self.renders,
+            'failures': self.failures,
+            'over_budget': self.over_budget,
+            'seconds': round(self.seconds, 4) if self.seconds is not None else None,
+            'render_seconds': round(self.render_seconds, 4),
+            'run_stages_s': {name: round(total, 4) for name, total in sorted(self.stages.items())},
+            'stages': stages,
+            'output_bytes': self.output_bytes,
+            'mean_output_bytes': self.output_bytes // renders,
+            'generators': dict(self.generators),
+        }
+
+    def format(self):
+        summary = self.as_dict()
+        per_render = ", ".join(f"{name} {values['mean_ms']:.2f}ms" for name, values in summary['stages'].items())
+        run_stages = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in summary['run_stages_s'].items())
+        generators = ", ".join(f"{name}={count}" for name, count in summary['generators'].items())
+        over_budget = f", {summary['over_budget']} over the byte budget" if summary['over_budget'] else ""
+        return (
+            f"Render summary for {self.label}: {summary['renders']} certificates "
+            f"({summary['failures']} failed{over_budget}) in {summary['seconds']:.2f}s\n"
+            f"  per certificate: {per_render}\n"
+            f"  run: {run_stages or 'none'}\n"
+            f"  output: {summary['output_bytes']} bytes, {summary['mean_output_bytes']} per certificate; "
+            f"generators: {generators or 'none'}"
+        )
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current render, or of the current run outside a render; no-op otherwise"""
+    timer = getattr(_local, 'trace', None) or getattr(_local, 'run', None)
+    if timer is None:
+        yield
+        return
+    timer.enter(name)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+
+def traced(name):
+    """Decorator form of stage() for drawing helpers"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def render_trace(certificate_type):
+    """Trace one certificate render and hand the record to the current run, if any"""
+    trace = RenderTrace(certificate_type)
+    previous = getattr(_local, 'trace', None)
+    _local.trace = trace
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = str(e)
+        raise
+    finally:
+        _local.trace = previous
+        trace.seconds = perf_counter() - trace._start
+        record = trace.as_dict()
+        run = getattr(_local, 'run', None)
+        if run is not None:
+            run.add(record)
+        else:
+            stages = ", ".join(f"{name} {seconds * 1000:.2f}ms" for name, seconds in record['stages'].items())
+            debug(f"Rendered {certificate_type} in {trace.seconds * 1000:.1f}ms ({stages})")
+
+
+def current_trace():
+    """The render trace being recorded on this thread, or None"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def trace_run(label, keep=True):
+    """Collect every render on this thread into one RunSummary; kept in RECENT_RUNS when keep is set"""
+    run = RunSummary(label)
+    previous = getattr(_local, 'run', None)
+    _local.run = run
+    try:
+        yield run
+    finally:
+        _local.run = previous
+        run.finish()
+        if keep:
+            RECENT_RUNS.append(run.as_dict())
@@ -0,0 +1,6 @@
+# ReportLab reads this module, when it is importable, the first time reportlab.rl_config is imported
+# and takes its names as defaults. It is the one place the app changes ReportLab's settings.
+
+# PDF streams are written as binary. ReportLab's default ASCII85 wrapping makes every image and page
+# stream a quarter larger, which no byte budget can step around; every PDF reader takes binary streams.
+useA85 = 0
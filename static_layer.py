@@ -0,0 +1,32 @@
+from render_assets import image_quality
+
+
+class StaticLayer:
+    """Student-independent page content drawn once per document as a form XObject.
+
+    The first stamp() on a canvas draws the layer into a form with ReportLab's
+    beginForm/endForm; every stamp then places it with doForm. A booklet
+    therefore holds the background, border and images once however many pages
+    show them. Images are drawn at image_level, an image quality level from
+    OUTPUT_PROFILES.
+    """
+
+    def __init__(self, pagesize, draw, image_level=0, name="static_layer"):
+        self.pagesize = tuple(pagesize)
+        self.image_level = image_level
+        self.name = name
+        self._draw = draw
+
+    def define(self, c):
+        """Draw the layer into its form in the canvas's document, unless it is there already"""
+        if c.hasForm(self.name):
+            return
+        c.beginForm(self.name)
+        with image_quality(self.image_level):
+            self._draw(c)
+        c.endForm()
+
+    def stamp(self, c):
+        """Place the static layer on the canvas's current page"""
+        self.define(c)
+        c.doForm(self.name)
@@ -55,6 +55,57 @@ PREDEFINED_TEMPLATES = {
             "name": {"family": "Helvetica-Bold", "size": 34},
             "content": {"family": "Helvetica", "size": 14}
         }
+    },
+
+    "minimal_landscape": {
+        "name": "Minimal Landscape",
+        "description": "Clean landscape design drawn entirely from its layout elements",
+        "colors": {
+            "primary": "#0F172A",
+            "secondary": "#F8FAFC",
+            "accent": "#B08D57",
+            "text": "#334155",
+            "muted": "#888888"
+        },
+        "fonts": {
+            "title": {"family": "StoryScript", "size": 44},
+            "subtitle": {"family": "Helvetica-Oblique", "size": 18},
+            "name": {"family": "StoryScript", "size": 40},
+            "content": {"family": "Helvetica", "size": 14},
+            "small": {"family": "Helvetica", "size": 8}
+        },
+        "layout": {
+            "margin": 60
+        },
+        "page": "landscape",
+        "elements": [
+            {"type": "rect", "x": 0, "y": 0, "width": "100%", "height": "100%", "fill": "secondary"},
+            {"type": "image", "slot": "background", "x": 0, "y": 0, "width": "100%", "height": "100%"},
+            {"type": "rect", "x": 24, "y": 24, "width": "100%-48", "height": "100%-48",
+             "stroke": "accent", "line_width": 3},
+            {"type": "rect", "x": 32, "y": 32, "width": "100%-64", "height": "100%-64",
+             "stroke": "accent", "line_width": 1},
+            {"type": "image", "slot": "logo", "x": 60, "y": "100%-150", "width": 90, "height": 90,
+             "preserve_aspect": True, "mask": "auto"},
+            {"type": "text", "text": "{text[title]}", "font": "title", "color": "primary",
+             "y": "100%-140", "max_width": "100%-320"},
+            {"type": "text", "text": "{text[subtitle]}", "font": "subtitle", "y": "100%-185"},
+            {"type": "text", "text": "{student.name}", "transform": "upper", "font": "name",
+             "color": "primary", "y": "100%-255", "min_size": 24, "max_lines": 2},
+            {"type": "line", "x1": "50%-180", "y1": "100%-280", "x2": "50%+180", "y2": "100%-280",
+             "stroke": "accent"},
+            {"type": "text", "text": "{text[accomplishment]}", "font": "content", "y": "100%-315",
+             "max_width": "100%-160"},
+            {"type": "text", "text": "{text[closing]}", "font": "content", "y": "100%-340"},
+            {"type": "text", "text": "Organized by {event.organizer}", "font": "content", "y": "100%-385"},
+            {"type": "text", "text": "{event.location}", "font": "content", "y": "100%-405"},
+            {"type": "text", "text": "Date: {date}", "font": "content", "align": "left", "x": 100, "y": 100},
+            {"type": "image", "slot": "signature", "x": "100%-250", "y": 110, "width": 120, "height": 50,
+             "preserve_aspect": True, "mask": "auto"},
+            {"type": "line", "x1": "100%-260", "y1": 105, "x2": "100%-120", "y2": 105, "stroke": "text"},
+            {"type": "text", "text": "Authorized Signature", "font": "content", "x": "100%-190", "y": 88},
+            {"type": "text", "text": "Certificate ID: {cert_id}", "font": "small", "color": "muted", "y": 45}
+        ]
     }
 }
 
@@ -74,11 +125,16 @@ def create_default_templates():
                 )
                 
                 # Set template configuration
-                template.template_config = {
+                config = {
                     "colors": template_data["colors"],
                     "fonts": template_data["fonts"],
                     "layout": template_data.get("layout", {})
                 }
+                # Templates with a declarative layout are drawn by layout_engine
+                if "elements" in template_data:
+                    config["page"] = template_data.get("page", "landscape")
+                    config["elements"] = template_data["elements"]
+                template.template_config = config
                 
                 db.session.add(template)
         
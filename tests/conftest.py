@@ -0,0 +1,154 @@
+import os
+import shutil
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import Flask  # noqa: E402
+
+from models import db, EventType  # noqa: E402
+
+
+BACKGROUND = '0eedea88-bcfc-43bb-9e2c-705118cde55a.jpg'
+LOGO = 'logo_35b55dbc-f85e-492d-a77d-a3a3ed68c1dc.png'
+SIGNATURE = 'sig_2d562857-ca20-4e5a-8a8b-58fcb262f22c.png'
+
+
+@pytest.fixture(scope='session')
+def upload_folder(tmp_path_factory):
+    """A copy of the sample uploads, so image variants written while rendering stay out of the repo"""
+    folder = tmp_path_factory.mktemp('uploads')
+    for name in (BACKGROUND, LOGO, SIGNATURE):
+        shutil.copy(os.path.join(ROOT, 'uploads', name), folder / name)
+    return str(folder)
+
+
+@pytest.fixture
+def event():
+    """A stand-in event with the uploaded background, logo and signature"""
+    return SimpleNamespace(
+        id=1, title='AI Workshop', event_type=EventType.Workshop, organizer='GNU', location='Hall A',
+        start_date=date(2025, 1, 1), end_date=date(2025, 1, 2), date=date(2025, 1, 1),
+        background_path=BACKGROUND, logo_path=LOGO, signature_path=SIGNATURE,
+    )
+
+
+@pytest.fixture
+def template():
+    return SimpleNamespace(
+        id=3, name='Elegant Royal', logo_image=None, signature_image=None, background_image=None,
+        template_config={'colors': {'primary': '#1E3A8A', 'accent': '#8B4513', 'text': '#2D3748'}},
+    )
+
+
+def make_students(count):
+    """Stand-in students with ids from 1"""
+    return [SimpleNamespace(id=i, name=f'Student Number {i}', email=f'student{i}@example.com')
+            for i in range(1, count + 1)]
+
+
+@pytest.fixture
+def students():
+    return make_students(5)
+
+
+def add_event():
+    """A stored copy of the event fixture, added to the session and flushed so it has an id"""
+    from models import Event
+    stored = Event(title='AI Workshop', event_type=EventType.Workshop, organizer='GNU', location='Hall A',
+                   teacher_id=1, start_date=date(2025, 1, 1), end_date=date(2025, 1, 2), date=date(2025, 1, 1),
+                   year=2025, background_path=BACKGROUND, logo_path=LOGO, signature_path=SIGNATURE)
+    db.session.add(stored)
+    db.session.flush()
+    return stored
+
+
+@pytest.fixture
+def stored_event(app):
+    """The event fixture stored in the bare app's database"""
+    stored = add_event()
+    db.session.commit()
+    return stored
+
+
+@pytest.fixture
+def app(tmp_path, upload_folder):
+    """A bare Flask app on a temporary SQLite database, with an app context pushed"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        UPLOAD_FOLDER=upload_folder,
+        CERTIFICATE_FOLDER=str(tmp_path / 'certificates'),
+        CERTIFICATE_CACHE_FOLDER=str(tmp_path / 'cache'),
+        CERTIFICATE_STORE_FOLDER=str(tmp_path / 'store'),
+        CERTIFICATE_PREVIEW_FOLDER=str(tmp_path / 'previews'),
+        EMAIL_SEND_QUOTAS={'second': 2, 'minute': 60, 'day': 2000},
+    )
+    for key in ('CERTIFICATE_FOLDER', 'CERTIFICATE_CACHE_FOLDER', 'CERTIFICATE_STORE_FOLDER',
+                'CERTIFICATE_PREVIEW_FOLDER'):
+        os.makedirs(app.config[key], exist_ok=True)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def web_app(tmp_path_factory, upload_folder):
+    """The real app module on a throwaway database, its folders created under a temporary directory"""
+    folder = tmp_path_factory.mktemp('web')
+    previous = os.getcwd()
+    os.environ['DATABASE_URL'] = f"sqlite:///{folder / 'web.db'}"
+    os.chdir(folder)
+    try:
+        import app as web
+    finally:
+        os.chdir(previous)
+    web.app.config.update(TESTING=True, UPLOAD_FOLDER=upload_folder,
+                          **{key: str(folder / web.app.config[key]) for key in (
+                              'CERTIFICATE_FOLDER', 'CERTIFICATE_CACHE_FOLDER', 'CERTIFICATE_STORE_FOLDER',
+                              'CERTIFICATE_PREVIEW_FOLDER')})
+    with web.app.app_context():
+        web.db.create_all()
+        web.initialize_database()
+    return web
+
+
+@pytest.fixture
+def client(web_app):
+    """A test client logged in as the admin user"""
+    client = web_app.app.test_client()
+    with web_app.app.app_context():
+        admin = web_app.User.query.filter_by(username='admin').first()
+        admin_id = admin.id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def registered(web_app):
+    """A stored event with two participants and one student who is not registered for it; returns their ids"""
+    from models import EventParticipant, Student
+    with web_app.app.app_context():
+        db.session.rollback()
+        stored = add_event()
+        participants = []
+        for i in range(3):
+            student = Student(name=f'Student {i}', email=f'student{i}.{stored.id}@example.com')
+            db.session.add(student)
+            db.session.flush()
+            participants.append(student.id)
+        for student_id in participants[:2]:
+            db.session.add(EventParticipant(event_id=stored.id, student_id=student_id))
+        db.session.commit()
+        return SimpleNamespace(event_id=stored.id, student_ids=participants[:2], outsider_id=participants[2])
@@ -0,0 +1,34 @@
+import json
+import os
+
+from certificate_cache import _hash_json
+from models import BulkJob, Certificate
+
+
+def test_a_generator_name_is_used_as_the_certificate_type(web_app, client, registered, monkeypatch):
+    calls = []
+
+    def generate(event, students, certificate_folder, template_id=None, certificate_type='default', progress=None,
+                 **kwargs):
+        calls.append((template_id, certificate_type))
+        for student in students:
+            path = os.path.join(certificate_folder, f'certificate_{student.id}_{event.id}.pdf')
+            with open(path, 'wb') as f:
+                f.write(b'%PDF-1.4 ' + student.name.encode())
+            progress(student, path)
+        return []
+    monkeypatch.setattr(web_app, 'generate_bulk_certificates', generate)
+
+    response = client.post('/bulk_certificates', data={'event_id': registered.event_id, 'template_id': 'enhanced'})
+    assert response.status_code == 302
+    web_app.BULK_JOBS._queue.join()
+
+    assert calls == [(None, 'enhanced')]
+    with web_app.app.app_context():
+        job = BulkJob.query.filter_by(event_id=registered.event_id).one()
+        assert (job.status, job.template_id, job.options) == ('finished', None, {'certificate_type': 'enhanced'})
+        certificates = Certificate.query.filter_by(event_id=registered.event_id).all()
+        assert len(certificates) == 2
+        assert all(certificate.template_id is None for certificate in certificates)
+        assert all(json.loads(certificate.fingerprint_parts)['certificate_type'] == _hash_json('enhanced')
+                   for certificate in certificates)
@@ -0,0 +1,21 @@
+import os
+
+from models import Certificate
+
+
+def test_downloaded_certificate_is_recorded_from_the_store(web_app, client, registered):
+    student_id = registered.student_ids[0]
+    response = client.get(f'/generate_pdf/{registered.event_id}/{student_id}')
+    assert response.status_code == 200 and response.data.startswith(b'%PDF')
+
+    config = web_app.app.config
+    with web_app.app.app_context():
+        certificate = Certificate.query.filter_by(event_id=registered.event_id, student_id=student_id).one()
+        path = certificate.certificate_path
+    assert path.startswith(config['CERTIFICATE_STORE_FOLDER'] + os.sep)
+    with open(path, 'rb') as f:
+        assert f.read() == response.data
+    # The cache keeps its own copy for the next download
+    cached = [os.path.join(config['CERTIFICATE_CACHE_FOLDER'], name)
+              for name in os.listdir(config['CERTIFICATE_CACHE_FOLDER'])]
+    assert path not in cached and any(os.path.getsize(name) == len(response.data) for name in cached)
@@ -0,0 +1,23 @@
+from email_outbox import OUTBOX
+from models import db, OutboxMessage
+
+
+def test_custom_emails_are_queued_in_the_outbox(web_app, client, monkeypatch):
+    woken = []
+    monkeypatch.setattr(OUTBOX, 'wake', lambda: woken.append(True))
+    form = {'recipient_emails': ['a@example.com', 'b@example.com'], 'subject': 'Hello', 'message': 'Body'}
+
+    for _ in range(2):
+        response = client.post('/send_custom_email', data=form, headers={'Referer': '/dashboard'})
+        assert response.status_code == 302
+
+    assert woken == [True, True]
+    with web_app.app.app_context():
+        messages = OutboxMessage.query.filter_by(kind='custom').order_by(OutboxMessage.id).all()
+        # A custom email sent twice is two messages, not one merged by recipient
+        assert [message.recipient for message in messages] == ['a@example.com', 'b@example.com'] * 2
+        assert {(message.status, message.event_id, message.student_id, message.subject) for message in messages} == {
+            ('queued', None, None, 'Hello')}
+        # Nothing is left for a real outbox worker to send
+        OutboxMessage.query.filter_by(kind='custom').delete()
+        db.session.commit()
@@ -0,0 +1,16 @@
+def test_preview_page_needs_a_login(web_app, registered):
+    response = web_app.app.test_client().get(
+        f'/preview_certificate/{registered.event_id}/{registered.student_ids[0]}')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_preview_page_shows_a_participant(client, registered):
+    response = client.get(f'/preview_certificate/{registered.event_id}/{registered.student_ids[0]}')
+    assert response.status_code == 200
+    assert b'Student 0' in response.data
+
+
+def test_preview_is_refused_for_a_student_outside_the_event(client, registered):
+    assert client.get(f'/preview_certificate/{registered.event_id}/{registered.outsider_id}').status_code == 404
+    assert client.get(f'/preview_certificate/{registered.event_id}/{registered.outsider_id}.png').status_code == 404
@@ -0,0 +1,148 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from bulk_jobs import STALE_AFTER, WORKER_ID, Checkpoint, JobQueue, _worker_gone, job_status, pending_items
+from models import db, BulkJob, BulkJobItem
+
+
+HOST = socket.gethostname()
+
+
+def _job(worker_id, heartbeat_age=timedelta(0), status='running'):
+    return BulkJob(id='job', kind='test', event_id=1, status=status, total=3, done=0, failed=0,
+                   worker_id=worker_id, heartbeat_at=datetime.utcnow() - heartbeat_age)
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def live_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def test_local_worker_is_judged_by_pid_not_heartbeat(dead_pid, live_pid):
+    now = datetime.utcnow()
+    assert _worker_gone(_job(f"{HOST}:{dead_pid}:abc"), now)
+    assert not _worker_gone(_job(f"{HOST}:{live_pid}:abc", heartbeat_age=STALE_AFTER * 10), now)
+    # Rows written before the start token was added
+    assert not _worker_gone(_job(f"{HOST}:{live_pid}", heartbeat_age=STALE_AFTER * 10), now)
+
+
+def test_earlier_process_with_our_pid_is_gone():
+    now = datetime.utcnow()
+    assert not _worker_gone(_job(WORKER_ID), now)
+    assert _worker_gone(_job(f"{HOST}:{os.getpid()}:00000000"), now)
+
+
+def test_remote_worker_is_judged_by_heartbeat():
+    now = datetime.utcnow()
+    assert not _worker_gone(_job("elsewhere:1:abc"), now)
+    assert _worker_gone(_job("elsewhere:1:abc", heartbeat_age=STALE_AFTER * 2), now)
+
+
+def _stored_job(worker_id, heartbeat_age, done=1):
+    """A job left running by worker_id with its first done items processed"""
+    job = _job(worker_id, heartbeat_age)
+    job.done = done
+    db.session.add(job)
+    db.session.add_all(BulkJobItem(job_id=job.id, student_id=position + 1, position=position,
+                                   status='done' if position < done else 'pending')
+                       for position in range(job.total))
+    db.session.commit()
+    return job.id
+
+
+def test_resume_leaves_a_quiet_but_live_worker_alone(app, live_pid):
+    queue = JobQueue()
+    queue.init_app(app)
+    _stored_job(f"{HOST}:{live_pid}:abc", heartbeat_age=STALE_AFTER * 10)
+    assert queue.resume() == 0
+
+
+def test_resume_runs_only_the_items_a_dead_worker_left(app, dead_pid):
+    queue = JobQueue()
+    queue.init_app(app)
+    processed = []
+
+    @queue.runner('test')
+    def run(job, checkpoint):
+        for item in pending_items(job):
+            processed.append(item.student_id)
+            checkpoint.mark(item, True)
+        return {'ok': True}
+
+    job_id = _stored_job(f"{HOST}:{dead_pid}:abc", heartbeat_age=timedelta(0))
+    assert queue.resume() == 1
+    assert queue.resume() == 0
+    queue._queue.join()
+
+    db.session.expire_all()
+    job = db.session.get(BulkJob, job_id)
+    assert processed == [2, 3]
+    assert (job.status, job.done, job.worker_id) == ('finished', 3, WORKER_ID)
+
+
+def test_heartbeat_is_written_during_a_long_stage(app):
+    job = _job(WORKER_ID, heartbeat_age=timedelta(minutes=5))
+    db.session.add(job)
+    db.session.commit()
+    before = job.heartbeat_at
+
+    with Checkpoint(job, heartbeat_seconds=0.05).keep_alive(app):
+        time.sleep(0.3)
+
+    db.session.expire_all()
+    assert db.session.get(BulkJob, 'job').heartbeat_at > before + timedelta(minutes=4)
+
+
+def test_submitted_job_runs_in_the_background_and_reports_progress(app):
+    queue = JobQueue()
+    queue.init_app(app)
+    progress = []
+
+    @queue.runner('test')
+    def run(job, checkpoint):
+        for item in pending_items(job):
+            checkpoint.mark(item, item.student_id != 2, error='no image' if item.student_id == 2 else None)
+            checkpoint.commit()
+            progress.append(job_status(job)['percent'])
+        return {'ok': True}
+
+    job_id = queue.submit('test', 1, [1, 2, 3, 4]).id
+    queue._queue.join()
+
+    db.session.expire_all()
+    status = job_status(db.session.get(BulkJob, job_id))
+    assert progress == [25.0, 50.0, 75.0, 100.0]
+    assert (status['status'], status['done'], status['failed'], status['result']) == ('finished', 3, 1, {'ok': True})
+    assert status['eta_seconds'] is None and status['elapsed_seconds'] is not None
+
+
+def test_a_failing_runner_fails_its_job(app):
+    queue = JobQueue()
+    queue.init_app(app)
+
+    @queue.runner('test')
+    def run(job, checkpoint):
+        raise RuntimeError('template missing')
+
+    job_id = queue.submit('test', 1, [1]).id
+    queue._queue.join()
+
+    db.session.expire_all()
+    status = job_status(db.session.get(BulkJob, job_id))
+    assert (status['status'], status['error']) == ('failed', 'template missing')
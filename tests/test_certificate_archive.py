@@ -0,0 +1,28 @@
+import io
+import zipfile
+
+from certificate_archive import stream_certificate_zip
+from models import db, Certificate, EventParticipant, Student
+
+
+def test_zip_streams_every_participant_and_copies_issued_certificates(stored_event, tmp_path):
+    event = stored_event
+    students = [Student(name=name, email=f'student{i}@example.com') for i, name in enumerate(['Ann Lee'] * 2 + ['Bo'])]
+    db.session.add_all(students)
+    db.session.flush()
+    db.session.add_all(EventParticipant(event_id=event.id, student_id=student.id) for student in students)
+    issued = tmp_path / 'issued.pdf'
+    issued.write_bytes(b'%PDF-1.4 issued before')
+    db.session.add(Certificate(event_id=event.id, student_id=students[2].id, certificate_path=str(issued)))
+    db.session.commit()
+
+    chunks = list(stream_certificate_zip(event, batch_size=2))
+
+    assert len(chunks) > 1 and all(chunks)
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        names = archive.namelist()
+        assert names == [f'certificate_Ann_Lee_{students[0].id}.pdf', f'certificate_Ann_Lee_{students[1].id}.pdf',
+                         f'certificate_Bo_{students[2].id}.pdf']
+        assert archive.read(names[2]) == b'%PDF-1.4 issued before'
+        assert archive.read(names[0]).startswith(b'%PDF')
+        assert archive.testzip() is None
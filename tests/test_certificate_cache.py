@@ -0,0 +1,36 @@
+import shutil
+
+import certificate_cache
+from render_engines import RENDER_ENGINES
+
+
+def test_an_unchanged_certificate_is_served_from_the_cache(app, monkeypatch, event, students, tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    path, pdf = certificate_cache.get_or_render_certificate(event, students[0], cache_folder)
+    assert pdf.startswith(b'%PDF')
+
+    renders = []
+    monkeypatch.setattr(RENDER_ENGINES['reportlab'], 'render', lambda *args, **kwargs: renders.append(args))
+    assert certificate_cache.get_or_render_certificate(event, students[0], cache_folder) == (path, None)
+    assert renders == []
+    with open(path, 'rb') as f:
+        assert f.read() == pdf
+
+
+def test_fingerprint_follows_the_certificate_inputs(event, students, template, tmp_path, upload_folder):
+    def fingerprint(event=event, student=students[0], folder=upload_folder):
+        return certificate_cache.certificate_fingerprint(event, student, template, 'basic', folder)
+
+    before = fingerprint()
+    assert fingerprint() == before
+    assert fingerprint(student=students[1]) != before
+
+    renamed = type(event)(**{**vars(event), 'title': 'ML Workshop'})
+    assert fingerprint(event=renamed) != before
+
+    # Same file names, different background bytes
+    folder = tmp_path / 'uploads'
+    shutil.copytree(upload_folder, folder)
+    with open(folder / event.background_path, 'ab') as f:
+        f.write(b'\0')
+    assert fingerprint(folder=str(folder)) != before
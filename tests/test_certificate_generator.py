@@ -0,0 +1,35 @@
+import io
+import os
+
+import pytest
+
+import certificate_generator as cg
+
+
+def _image_xrefs(document):
+    return [xref for xref in range(1, document.xref_length()) if document.xref_get_key(xref, 'Subtype')[1] == '/Image']
+
+
+def test_booklet_has_a_page_per_student_and_embeds_images_once(event, students, template, tmp_path, upload_folder):
+    fitz = pytest.importorskip('fitz')
+    path, pages = cg.generate_certificate_booklet(event, students, str(tmp_path), 'basic', template, upload_folder)
+    single = cg._render_certificate(cg.OUTPUT_BYTES, 'basic', event, students[0], template, upload_folder)
+
+    assert pages == list(range(1, len(students) + 1))
+    with fitz.open(path) as booklet, fitz.open(stream=single, filetype='pdf') as certificate:
+        assert booklet.page_count == len(students)
+        for page, student in zip(booklet, students):
+            assert student.name.upper() in page.get_text()
+        assert len(_image_xrefs(booklet)) == len(_image_xrefs(certificate)) > 0
+
+
+def test_path_buffer_and_bytes_outputs_hold_the_same_pdf(event, students, template, tmp_path, upload_folder):
+    data = cg.generate_basic_certificate(event, students[0], None, upload_folder, output=cg.OUTPUT_BYTES)
+
+    buffer = io.BytesIO()
+    assert cg.generate_basic_certificate(event, students[0], None, upload_folder, output=buffer) is buffer
+
+    path = cg.generate_basic_certificate(event, students[0], str(tmp_path), upload_folder)
+    assert os.path.dirname(path) == str(tmp_path)
+    with open(path, 'rb') as f:
+        assert f.read() == buffer.getvalue() == data
@@ -0,0 +1,29 @@
+import pytest
+from PIL import Image
+
+import certificate_preview
+from certificate_preview import get_or_render_preview, preview_path
+
+pytestmark = pytest.mark.skipif(not certificate_preview.preview_available(), reason='PyMuPDF is not installed')
+
+
+def test_preview_is_rasterized_once_and_then_served_from_disk(app, monkeypatch, event, students, tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    key, path = get_or_render_preview(event, students[0], cache_folder, width=300)
+    with Image.open(path) as image:
+        assert image.width == 300
+
+    monkeypatch.setattr(certificate_preview, 'rasterize_pdf', lambda *args: pytest.fail('rasterized again'))
+    assert get_or_render_preview(event, students[0], cache_folder, width=300) == (key, path)
+
+
+def test_each_width_and_student_has_its_own_preview(app, event, students):
+    key = certificate_preview.preview_key(event, students[0], width=300)
+    assert certificate_preview.preview_key(event, students[0], width=400) != key
+    assert certificate_preview.preview_key(event, students[1], width=300) != key
+    assert certificate_preview.preview_key(event, students[0], width=10 ** 6).endswith(
+        f'_{certificate_preview.PREVIEW_MAX_WIDTH}_v{certificate_preview.PREVIEW_VERSION}')
+
+
+def test_malformed_keys_are_never_looked_up(app):
+    assert preview_path('../../etc/passwd') is None
@@ -0,0 +1,40 @@
+from certificate_cache import fingerprint_certificate
+from certificate_refresh import plan_regeneration
+from models import db, Certificate, Student
+
+
+def _issue(event, tmp_path, count=2):
+    for i in range(count):
+        student = Student(name=f'Student {i}', email=f'student{i}@example.com')
+        path = tmp_path / f'certificate{i}.pdf'
+        path.write_bytes(b'%PDF')
+        certificate = Certificate(student=student, event=event, certificate_path=str(path))
+        db.session.add(certificate)
+        db.session.flush()
+        fingerprint_certificate(certificate, event, student)
+    db.session.commit()
+
+
+def test_unchanged_certificates_are_not_planned(stored_event, tmp_path):
+    _issue(stored_event, tmp_path)
+    plan = plan_regeneration(stored_event)
+    assert (plan['checked'], plan['unchanged'], plan['stale']) == (2, 2, 0)
+
+
+def test_only_the_changed_certificates_are_planned_with_their_reasons(stored_event, tmp_path):
+    event = stored_event
+    _issue(event, tmp_path)
+    certificates = Certificate.query.order_by(Certificate.id).all()
+    certificates[0].student.name = 'Renamed Student'
+    db.session.commit()
+
+    plan = plan_regeneration(event)
+    assert plan['stale'] == 1
+    assert plan['certificates'][0]['certificate_id'] == certificates[0].id
+    assert plan['certificates'][0]['changes'] == ['student']
+
+    event.title = 'ML Workshop'
+    db.session.commit()
+    plan = plan_regeneration(event)
+    assert plan['stale'] == 2
+    assert plan['by_change']['event'] == 2
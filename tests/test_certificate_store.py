@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+
+import certificate_generator as cg
+from certificate_store import collect_garbage, release_file, store_bytes, store_file
+from models import db, BulkJob, Certificate, OutboxMessage
+
+
+def _pdf(folder, name, data=b'%PDF-1.4 test', age=0):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def _certificate(path, student_id=1):
+    certificate = Certificate(student_id=student_id, event_id=1, certificate_path=path)
+    db.session.add(certificate)
+    db.session.commit()
+    return certificate
+
+
+def test_identical_bytes_are_stored_once(app):
+    store = app.config['CERTIFICATE_STORE_FOLDER']
+    first = store_bytes(b'%PDF same', store)
+    second = store_file(_pdf(app.config['CERTIFICATE_FOLDER'], 'new.pdf', b'%PDF same'), store)
+    assert first == second
+    assert not os.path.exists(os.path.join(app.config['CERTIFICATE_FOLDER'], 'new.pdf'))
+
+
+def test_released_file_is_deleted_only_after_commit(app):
+    path = _pdf(app.config['CERTIFICATE_FOLDER'], 'old.pdf', age=60)
+    certificate = _certificate(path)
+
+    certificate.certificate_path = None
+    release_file(path)
+    assert os.path.exists(path)
+    db.session.commit()
+    assert not os.path.exists(path)
+
+
+def test_released_file_survives_a_rollback(app):
+    path = _pdf(app.config['CERTIFICATE_FOLDER'], 'old.pdf', age=60)
+    certificate = _certificate(path)
+
+    certificate.certificate_path = None
+    release_file(path)
+    db.session.rollback()
+    db.session.commit()
+    assert os.path.exists(path)
+
+
+def test_released_file_still_referenced_is_kept(app, monkeypatch):
+    folder = app.config['CERTIFICATE_FOLDER']
+    path = _pdf(folder, 'shared.pdf', age=60)
+    # Another row refers to the same file by a relative path
+    monkeypatch.chdir(folder)
+    _certificate('shared.pdf', student_id=2)
+    queued = _pdf(folder, 'queued.pdf', age=60)
+    db.session.add(OutboxMessage(event_id=1, student_id=3, kind='certificate', recipient='a@example.com',
+                                 subject='s', body='b', certificate_path=queued, status='queued'))
+
+    release_file(path)
+    release_file(queued)
+    db.session.commit()
+    assert os.path.exists(path)
+    assert os.path.exists(queued)
+
+
+def test_released_file_adopted_meanwhile_is_kept(app):
+    store = app.config['CERTIFICATE_STORE_FOLDER']
+    path = store_bytes(b'%PDF adopted', store)
+    os.utime(path, (time.time() - 60, time.time() - 60))
+
+    release_file(path)
+
+    def adopt_after_check(session):
+        # Another run stores the same bytes between the reference check and the delete
+        store_bytes(b'%PDF adopted', store)
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    event.listen(Session, 'after_commit', adopt_after_check, insert=True)
+    try:
+        db.session.commit()
+    finally:
+        event.remove(Session, 'after_commit', adopt_after_check)
+    assert os.path.exists(path)
+
+
+def test_garbage_collection_never_deletes_referenced_files(app, monkeypatch):
+    folder = app.config['CERTIFICATE_FOLDER']
+    monkeypatch.chdir(folder)
+    referenced = _pdf(folder, 'referenced.pdf', age=7200)
+    booklet = _pdf(folder, 'booklet.pdf', age=7200)
+    unsent = _pdf(folder, 'unsent.pdf', age=7200)
+    orphan = _pdf(folder, 'orphan.pdf', age=7200)
+    recent = _pdf(folder, 'recent.pdf')
+    _certificate('referenced.pdf')
+    job = BulkJob(id='booklet', kind='booklet', event_id=1, status='finished', total=1)
+    job.result = {'booklet_path': booklet}
+    db.session.add(job)
+    db.session.add(OutboxMessage(event_id=1, student_id=2, kind='certificate', recipient='a@example.com',
+                                 subject='s', body='b', certificate_path=unsent, status='sending'))
+    db.session.commit()
+
+    report = collect_garbage(folder)
+
+    assert (report['scanned'], report['referenced'], report['too_recent'], report['deleted']) == (5, 3, 1, 1)
+    assert not os.path.exists(orphan)
+    assert all(os.path.exists(path) for path in (referenced, booklet, unsent, recent))
+
+
+def test_dry_run_deletes_nothing(app):
+    orphan = _pdf(app.config['CERTIFICATE_FOLDER'], 'orphan.pdf', age=7200)
+    report = collect_garbage(app.config['CERTIFICATE_FOLDER'], dry_run=True)
+    assert report['deleted'] == 1 and os.path.exists(orphan)
+
+
+def test_issue_day_canvas_is_reproducible_within_a_day(monkeypatch):
+    monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+
+    def render():
+        c = cg._issue_day_canvas(cg.BytesIO(), (200, 200))
+        c.drawString(10, 10, "same")
+        c.save()
+        return c._filename.getvalue()
+
+    first = render()
+    assert render() == first
+    assert time.strftime("D:%Y%m%d000000+00'00'", time.gmtime()).encode() in first
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import email_sender
+from email_outbox import Outbox, OUTBOX_SENDING_STALE_AFTER
+from models import db, OutboxMessage
+
+
+@pytest.fixture
+def outbox(app):
+    app.config['EMAIL_SEND_QUOTAS'] = {'second': 100, 'minute': 100, 'day': 100}
+    outbox = Outbox()
+    outbox.init_app(app)
+    return outbox
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_sender.SMTP_POOL, 'sendmail', lambda sender, recipient, message: sent.append(recipient))
+    return sent
+
+
+def _enqueue(outbox, student_id):
+    return outbox.enqueue(1, student_id, 'certificate', f'student{student_id}@example.com', 'Subject', 'Body')
+
+
+def test_an_email_is_queued_and_sent_once(outbox, sent):
+    first = _enqueue(outbox, 1)
+    assert _enqueue(outbox, 1).id == first.id
+    assert outbox.drain()['sent'] == 1
+
+    assert _enqueue(outbox, 1).status == 'sent'
+    assert outbox.drain()['sent'] == 0
+    assert sent == ['student1@example.com']
+    assert OutboxMessage.query.count() == 1
+
+
+def test_claims_are_refreshed_before_each_send(outbox, sent, monkeypatch):
+    messages = [_enqueue(outbox, i) for i in (1, 2)]
+    claimed = outbox.claim([message.id for message in messages])
+    old = datetime.utcnow() - OUTBOX_SENDING_STALE_AFTER + timedelta(seconds=5)
+    OutboxMessage.query.update({'claimed_at': old}, synchronize_session=False)
+    db.session.commit()
+    refreshed = []
+    engine = db.engine
+
+    def sendmail(sender, recipient, message):
+        # A drain elsewhere while the first email goes out must not take back the one still waiting
+        with engine.connect() as connection:
+            oldest = connection.execute(db.select(db.func.min(OutboxMessage.claimed_at))).scalar()
+        refreshed.append(oldest > old)
+        sent.append(recipient)
+    monkeypatch.setattr(email_sender.SMTP_POOL, 'sendmail', sendmail)
+
+    report = outbox.deliver(claimed)
+    assert report['sent'] == 2
+    assert refreshed == [True, True]
+
+
+def test_a_message_taken_over_by_another_worker_is_not_sent_again(outbox, sent):
+    messages = [_enqueue(outbox, i) for i in (1, 2)]
+    claimed = outbox.claim([message.id for message in messages])
+    # The second message was queued again as stale and claimed by another worker
+    OutboxMessage.query.filter_by(id=messages[1].id).update({'claim_token': 'other'}, synchronize_session=False)
+    db.session.commit()
+
+    report = outbox.deliver(claimed)
+    assert report['sent'] == 1 and report['skipped'] == 1
+    assert sent == ['student1@example.com']
+    assert db.session.get(OutboxMessage, messages[1].id).claim_token == 'other'
+    assert db.session.get(OutboxMessage, messages[1].id).status == 'sending'
+
+
+def test_drain_sends_messages_left_sending_by_a_dead_worker(outbox, sent):
+    message = _enqueue(outbox, 1)
+    outbox.claim([message.id])
+    OutboxMessage.query.update({'claimed_at': datetime.utcnow() - OUTBOX_SENDING_STALE_AFTER * 2},
+                               synchronize_session=False)
+    db.session.commit()
+
+    assert outbox.drain()['sent'] == 1
+    assert sent == ['student1@example.com']
@@ -0,0 +1,104 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import has_app_context, render_template
+
+import email_sender
+from models import db, EmailSendSlot
+
+
+def test_dispatch_keeps_blocking_work_off_the_event_loop(app, monkeypatch):
+    app.config['EMAIL_SEND_QUOTAS'] = {'second': 100, 'minute': 100, 'day': 100}
+    sent = []
+    monkeypatch.setattr(email_sender.SMTP_POOL, 'sendmail', lambda sender, recipient, message: sent.append(recipient))
+    loop_thread = threading.get_ident()
+    seen = []
+
+    def messages():
+        for i in range(5):
+            # Rendering and outbox claims query the caller's session like this
+            seen.append((threading.get_ident(), has_app_context(), EmailSendSlot.query.count()))
+            yield email_sender.prepare_email('Subject', f'student{i}@example.com', 'Body', key=i)
+
+    def on_result(result):
+        seen.append((threading.get_ident(), has_app_context(), db.session.query(EmailSendSlot).count()))
+
+    results = email_sender.send_email_batch(messages(), on_result, concurrency=2)
+
+    assert [result['key'] for result in results] == list(range(5))
+    assert all(result['ok'] for result in results)
+    assert sorted(sent) == sorted(f'student{i}@example.com' for i in range(5))
+    assert EmailSendSlot.query.count() == 5
+    assert len(seen) == 10
+    assert all(has_context for _, has_context, _ in seen)
+    assert len({thread for thread, _, _ in seen}) == 1
+    assert seen[0][0] != loop_thread
+
+
+def _slots():
+    return [slot.send_at for slot in EmailSendSlot.query.order_by(EmailSendSlot.id)]
+
+
+def test_reserved_slots_never_overfill_a_quota_window(app):
+    limiter = email_sender.SendRateLimiter({'second': 2, 'minute': 3}, max_wait=timedelta(minutes=5))
+    waits = [limiter.reserve() for _ in range(5)]
+
+    slots = _slots()
+    assert waits[0] < 1 and waits[1] < 1
+    assert 59 <= waits[3] <= 61
+    for name, limit in limiter.quotas().items():
+        window = email_sender.QUOTA_WINDOWS[name]
+        assert all(sum(start <= slot < start + window for slot in slots) <= limit for start in slots)
+
+
+def test_a_slot_too_far_away_is_deferred_without_being_reserved(app):
+    limiter = email_sender.SendRateLimiter({'minute': 1}, max_wait=timedelta(seconds=10))
+    limiter.reserve()
+    with pytest.raises(email_sender.SendDeferred) as deferred:
+        limiter.reserve()
+    assert deferred.value.until == _slots()[0] + timedelta(minutes=1)
+    assert len(_slots()) == 1
+
+
+def test_composed_email_matches_a_full_render(web_app, event, students):
+    student = students[0]
+    student.name = 'Zoë O\'Brien <b>&'
+    url = 'http://localhost/certificate?event=1&student=2'
+    with web_app.app.app_context():
+        email = email_sender.CertificateEmailComposer(event).compose(student, url)
+        html = render_template('email_certificate.html', subject=email['subject'], event=event,
+                               current_year=datetime.now().year, recipient_name=student.name,
+                               certificate_download_url=url)
+    assert email['html_body'] == html
+    assert email['body'] == email_sender.certificate_plain_body(event, student.name, url)
+
+
+def test_single_send_keeps_its_own_plain_text_body(web_app, event, students, monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_sender, 'send_email', lambda **email: sent.append(email) or True)
+    student = students[0]
+    url = 'http://localhost/certificate?event=1&student=2'
+    with web_app.app.app_context():
+        assert email_sender.send_certificate_email_flask(student, event, b'%PDF', url)
+        bulk = email_sender.CertificateEmailComposer(event).compose(student, url)
+
+    assert sent[0]['body'] == email_sender.certificate_download_plain_body(event, student.name, url)
+    assert sent[0]['body'].startswith('Dear Student Number 1,\n\nCongratulations!')
+    assert sent[0]['html_body'] == bulk['html_body']
+
+
+def test_identical_attachments_are_encoded_once(monkeypatch):
+    data = bytes(range(256)) * 64
+    first = email_sender.build_message('Subject', 'a@example.com', 'Body', attachment_data=data,
+                                       attachment_name='a.pdf')
+    encode = []
+    monkeypatch.setattr(email_sender.encoders, 'encode_base64', encode.append)
+    second = email_sender.build_message('Subject', 'b@example.com', 'Body', attachment_data=data,
+                                        attachment_name='b.pdf')
+
+    assert encode == []
+    first_part, second_part = first.get_payload()[1], second.get_payload()[1]
+    assert second_part.get_payload() == first_part.get_payload()
+    assert second_part.get_payload(decode=True) == data
+    assert second_part.get_filename() == 'b.pdf'
@@ -0,0 +1,27 @@
+import font_registry
+from font_registry import ensure_font, fit_font_size, string_width
+
+
+def test_fonts_are_looked_up_once(monkeypatch):
+    monkeypatch.setattr(font_registry, '_font_status', {})
+    monkeypatch.setitem(font_registry.FONT_FILES, 'MissingFont', 'missing.ttf')
+    looked_up = []
+    exists = font_registry.os.path.exists
+    monkeypatch.setattr(font_registry.os.path, 'exists', lambda path: looked_up.append(path) or exists(path))
+
+    for _ in range(3):
+        assert not ensure_font('MissingFont')
+    assert len(looked_up) == 1
+
+
+def test_bundled_font_is_registered_on_first_use():
+    assert ensure_font('StoryScript')
+    assert string_width('Student', 'StoryScript', 20) > 0
+
+
+def test_fitted_size_is_the_largest_half_point_that_fits():
+    text = 'A Rather Long Student Name For Fitting'
+    size = fit_font_size(text, 'Helvetica-Bold', 40, 300)
+    assert size < 40
+    assert string_width(text, 'Helvetica-Bold', size) <= 300 < string_width(text, 'Helvetica-Bold', size + 0.5)
+    assert fit_font_size('Ann', 'Helvetica-Bold', 40, 300) == 40
@@ -0,0 +1,47 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import layout_engine
+from layout_engine import LayoutError, compile_layout, get_compiled_layout
+from template_config import PREDEFINED_TEMPLATES
+
+
+def _stored(template_id, config):
+    """A template as loaded from the database, with its config stored as JSON"""
+    return SimpleNamespace(id=template_id, config=json.dumps(config), template_config=config)
+
+
+def test_default_layouts_compile():
+    for data in PREDEFINED_TEMPLATES.values():
+        if 'elements' in data:
+            compile_layout(data)
+
+
+@pytest.mark.parametrize('text', [
+    '{event.__class__}',
+    '{event.teacher.password}',
+    '{student.events}',
+    '{date:{event.__init__.__globals__}}',
+    '{unknown}',
+])
+def test_text_outside_the_allowed_fields_is_rejected(text):
+    with pytest.raises(LayoutError):
+        compile_layout({'elements': [{'type': 'text', 'text': text, 'y': 100}]})
+
+
+def test_compiled_layout_is_cached_per_template_and_stored_config(monkeypatch):
+    config = {'elements': [{'type': 'text', 'text': '{event.title}', 'y': 100}]}
+    template, same_config = _stored(1, config), _stored(2, config)
+    compiled = get_compiled_layout(template)
+
+    def no_serialising(*args, **kwargs):
+        raise AssertionError("stored config was serialised again")
+
+    monkeypatch.setattr(layout_engine.json, 'dumps', no_serialising)
+    assert get_compiled_layout(template) is compiled
+    assert get_compiled_layout(same_config) is not compiled
+
+    template.config = '{"elements": [{"type": "text", "text": "{event.location}", "y": 100}]}'
+    assert get_compiled_layout(template) is not compiled
@@ -0,0 +1,41 @@
+from models import db, add_missing_columns
+
+
+def _columns(table):
+    return {column['name']: column for column in db.inspect(db.engine).get_columns(table)}
+
+
+def _drop_column(table, column):
+    db.session.execute(db.text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+    db.session.commit()
+
+
+def test_missing_nullable_column_is_added(app):
+    _drop_column('certificate', 'fingerprint')
+
+    add_missing_columns()
+
+    assert _columns('certificate')['fingerprint']['nullable']
+
+
+def test_not_null_column_without_default_is_left_out(app, monkeypatch, capsys):
+    column = db.metadata.tables['certificate'].columns['fingerprint']
+    _drop_column('certificate', 'fingerprint')
+    monkeypatch.setattr(column, 'nullable', False)
+
+    add_missing_columns()
+
+    assert 'fingerprint' not in _columns('certificate')
+    assert 'certificate.fingerprint is NOT NULL' in capsys.readouterr().out
+
+
+def test_not_null_column_with_server_default_is_added(app, monkeypatch):
+    column = db.metadata.tables['certificate'].columns['fingerprint']
+    _drop_column('certificate', 'fingerprint')
+    monkeypatch.setattr(column, 'nullable', False)
+    monkeypatch.setattr(column, 'server_default', db.DefaultClause(''))
+
+    add_missing_columns()
+
+    added = _columns('certificate')['fingerprint']
+    assert not added['nullable'] and added['default'] == "''"
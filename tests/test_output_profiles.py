@@ -0,0 +1,43 @@
+import certificate_generator as cg
+from render_trace import trace_run
+
+
+def _render(event, student, template, profile, upload_folder):
+    return cg._render_certificate(cg.OUTPUT_BYTES, 'basic', event, student, template, upload_folder,
+                                  profile=profile)
+
+
+def test_streams_are_not_ascii85_encoded(event, students, template, upload_folder):
+    pdf = _render(event, students[0], template, cg.OutputProfile(), upload_folder)
+    assert b'ASCII85Decode' not in pdf
+
+
+def test_binary_streams_are_a_reportlab_default():
+    from reportlab import rl_config
+    # Set by reportlab_settings.py when ReportLab starts, not by any module at import
+    assert rl_config._DEFAULTS['useA85'] == 0
+
+
+def test_budget_steps_down_to_a_level_that_fits(event, students, template, upload_folder):
+    sizes = {}
+    for level in cg.OUTPUT_PROFILES['screen'][0]:
+        profile = cg.OutputProfile()
+        profile._start = profile.levels.index(level)
+        sizes[level] = len(_render(event, students[0], template, profile, upload_folder))
+    assert sizes[0] > sizes[1] > sizes[2]
+
+    profile = cg.OutputProfile('screen', max_bytes=sizes[1])
+    assert len(_render(event, students[0], template, profile, upload_folder)) <= sizes[1]
+    assert profile.level == 1
+    assert profile.over_budget == 0
+
+
+def test_missed_budget_is_reported(event, students, template, upload_folder):
+    profile = cg.OutputProfile('screen', max_bytes=1000)
+    with trace_run('budget', keep=False) as run:
+        pdf = _render(event, students[0], template, profile, upload_folder)
+
+    assert len(pdf) > 1000
+    assert profile.over_budget == 1
+    assert run.as_dict()['over_budget'] == 1
+    assert "1 over the byte budget" in run.format()
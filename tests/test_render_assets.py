@@ -0,0 +1,75 @@
+import os
+
+from PIL import Image
+
+import certificate_generator as cg
+import render_assets
+from render_assets import ImageAssetCache
+
+
+def _image(path, size=(64, 48), color=(200, 30, 30)):
+    Image.new('RGB', size, color).save(path)
+    return str(path)
+
+
+def test_image_cache_hits_until_the_file_changes(tmp_path):
+    cache = ImageAssetCache()
+    path = _image(tmp_path / 'logo.png')
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    _image(path, size=(32, 32))
+    assert cache.get(path) is not first
+    assert cache.misses == 2
+    assert cache.get(str(tmp_path / 'missing.png')) is None
+
+
+def test_image_cache_stays_within_its_byte_budget(tmp_path):
+    paths = [_image(tmp_path / f'image{i}.png') for i in range(3)]
+    size = ImageAssetCache().get(paths[0]).nbytes
+    cache = ImageAssetCache(max_bytes=2 * size)
+    for path in paths:
+        cache.get(path)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['bytes'] <= stats['max_bytes']
+    cache.get(paths[0])
+    assert cache.misses == 4
+
+
+def test_cached_images_draw_the_same_pdf(event, students, template, upload_folder):
+    render_assets.IMAGE_CACHE.clear()
+    cold = cg._render_certificate(cg.OUTPUT_BYTES, 'basic', event, students[0], template, upload_folder)
+    hits = render_assets.IMAGE_CACHE.hits
+    warm = cg._render_certificate(cg.OUTPUT_BYTES, 'basic', event, students[0], template, upload_folder)
+    assert render_assets.IMAGE_CACHE.hits > hits
+    assert warm == cold
+
+
+def test_uploads_get_page_resolution_variants(tmp_path):
+    background = _image(tmp_path / 'background.png', size=(4000, 3000))
+    logo = str(tmp_path / 'logo.png')
+    Image.new('RGBA', (1200, 600), (0, 0, 255, 128)).save(logo)
+
+    render_assets.create_render_variants(background, 'background')
+    render_assets.create_render_variants(logo, 'logo')
+
+    landscape = render_assets.variant_path(background, 'page_landscape')
+    with Image.open(landscape) as image:
+        assert image.size == (round(842 * 150 / 72), round(595 * 150 / 72))
+    assert render_assets.render_image_path(background, 'page_landscape') == landscape
+
+    box = render_assets.variant_path(logo, 'box')
+    with Image.open(box) as image:
+        assert image.mode == 'RGBA' and image.size == (500, 250)
+
+
+def test_a_variant_older_than_its_upload_is_not_drawn(tmp_path):
+    background = _image(tmp_path / 'background.png', size=(4000, 3000))
+    render_assets.create_render_variants(background, 'background')
+    stat = os.stat(background)
+    os.utime(background, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert render_assets.variant_path(background, 'page_landscape') is None
+    assert render_assets.render_image_path(background, 'page_landscape') == background
@@ -0,0 +1,31 @@
+import pytest
+
+import render_benchmark
+
+
+@pytest.mark.skipif(render_benchmark.resource is None, reason="peak RSS cannot be read on this platform")
+def test_cases_report_their_own_peak_rss(tmp_path):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    render_benchmark.make_assets(str(upload_folder))
+    students = render_benchmark.make_students(2)
+
+    # Raise this process's high-water mark well above what one small case needs
+    ballast = bytearray(256 * 1024 * 1024)
+    ballast[::4096] = b'x' * len(ballast[::4096])
+    parent_peak = render_benchmark.peak_rss_kb()
+
+    result = render_benchmark.run_isolated_case('basic', 'basic', None, True, students, str(upload_folder),
+                                                str(tmp_path))
+    assert result['failures'] == 0
+    assert 0 < result['peak_rss_kb'] < parent_peak - 200 * 1024
+    del ballast
+
+
+def test_benchmark_document_covers_every_case():
+    results = render_benchmark.run_benchmark(count=2, generators=['basic'], engines=['reportlab'])
+
+    assert [(r['case'], r['assets']) for r in results['results']] == [('basic', True), ('basic', False)]
+    assert all(r['certificates'] == 2 and r['failures'] == 0 for r in results['results'])
+    if render_benchmark.resource is not None:
+        assert results['peak_rss_kb'] == max(r['peak_rss_kb'] for r in results['results'])
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+import render_engines
+from render_engines import HtmlEngine, ImageLRU
+
+
+def test_image_cache_drops_the_least_recently_used():
+    cache = ImageLRU(max_entries=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+    assert 'b' not in cache
+    assert list(cache) == ['a', 'c']
+
+
+def test_every_thread_gets_its_own_font_configuration(monkeypatch):
+    monkeypatch.setattr(render_engines, 'FontConfiguration', object, raising=False)
+    engine = HtmlEngine()
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(engine._font_config()))
+    thread.start()
+    thread.join()
+    assert engine._font_config() is engine._font_config()
+    assert seen[0] is not engine._font_config()
+
+
+def test_template_colours_fill_the_html_page(event, students, template, upload_folder):
+    template.template_config = {'colors': {'primary': '#123456', 'accent': '#654321', 'text': '#0A0B0C'}}
+    engine = HtmlEngine()
+    html = engine._compiled().render(engine.context(event, students[0], template, upload_folder))
+    assert 'border: 4px solid #123456;' in html
+    assert 'border: 2px solid #654321;' in html
+    assert 'color: #0A0B0C;' in html
+    assert students[0].name in html
+
+
+@pytest.mark.skipif(render_engines.weasyprint is None, reason='WeasyPrint cannot be loaded here')
+def test_html_engine_renders_a_pdf(event, students, template, tmp_path, upload_folder):
+    pdf = HtmlEngine().render('basic', event, students[0], template, str(tmp_path), upload_folder,
+                              output=render_engines.OUTPUT_BYTES)
+    assert pdf.startswith(b'%PDF')
+    fitz = pytest.importorskip('fitz')
+    with fitz.open(stream=pdf, filetype='pdf') as document:
+        assert document.page_count == 1
+        assert students[0].name in document[0].get_text()
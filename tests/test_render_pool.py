@@ -0,0 +1,64 @@
+import os
+
+import render_pool
+
+from conftest import make_students
+
+
+def _jobs(event, students, template, folder, upload_folder):
+    return render_pool.make_render_jobs(event, students, template, 'basic', str(folder), upload_folder)
+
+
+def test_workers_do_not_fork_from_the_parent():
+    assert render_pool.worker_context().get_start_method() in ('forkserver', 'spawn')
+
+
+def test_pool_renders_every_job_in_order(event, students, template, tmp_path, upload_folder):
+    results = list(render_pool.iter_render_jobs(_jobs(event, students, template, tmp_path, upload_folder), workers=2))
+
+    assert [result['student_id'] for result in results] == [student.id for student in students]
+    for result in results:
+        assert result['error'] is None
+        assert os.path.getsize(result['path']) > 0
+
+
+def test_single_worker_renders_in_process(event, students, template, tmp_path, upload_folder):
+    results = render_pool.run_render_jobs(_jobs(event, students[:2], template, tmp_path, upload_folder), workers=1)
+    assert [result['error'] for result in results] == [None, None]
+
+
+class _CountingExecutor:
+    """Runs jobs inline and counts how many were handed over"""
+
+    submitted = 0
+
+    def __init__(self, max_workers, mp_context=None):
+        from concurrent.futures import ThreadPoolExecutor
+        self._executor = ThreadPoolExecutor(max_workers)
+
+    def submit(self, fn, *args):
+        type(self).submitted += 1
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self, cancel_futures=False):
+        self._executor.shutdown(cancel_futures=cancel_futures)
+
+
+def test_pool_keeps_a_bounded_window_of_jobs(monkeypatch, event, template, tmp_path, upload_folder):
+    import bulk_jobs
+
+    waits = []
+    monkeypatch.setattr(render_pool, 'ProcessPoolExecutor', _CountingExecutor)
+    monkeypatch.setattr(bulk_jobs, 'wait_for_interactive', lambda: waits.append(_CountingExecutor.submitted))
+    _CountingExecutor.submitted = 0
+
+    students = make_students(12)
+    results = render_pool.iter_render_jobs(_jobs(event, students, template, tmp_path, upload_folder), workers=2)
+    window = 2 * render_pool.JOBS_IN_FLIGHT_PER_WORKER
+
+    next(results)
+    assert _CountingExecutor.submitted == window + 1
+    assert len(list(results)) == len(students) - 1
+    assert _CountingExecutor.submitted == len(students)
+    # Every job after the first window waited for interactive renders before being handed over
+    assert waits == list(range(window, len(students)))
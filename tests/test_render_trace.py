@@ -0,0 +1,44 @@
+from time import perf_counter, sleep
+
+import pytest
+
+import certificate_generator as cg
+import render_trace
+from render_trace import render_trace as trace_render, stage, trace_run
+
+
+def test_nested_stages_are_timed_exclusively():
+    with trace_run('nested', keep=False) as run:
+        with trace_render('basic') as trace:
+            start = perf_counter()
+            with stage('outer'):
+                sleep(0.02)
+                with stage('inner'):
+                    sleep(0.02)
+            elapsed = perf_counter() - start
+    assert trace.stages['outer'] >= 0.02 and trace.stages['inner'] >= 0.02
+    assert trace.stages['outer'] + trace.stages['inner'] <= elapsed
+    assert run.renders == 1 and run.generators['basic'] == 1
+
+
+def test_failed_renders_are_counted():
+    with trace_run('failing', keep=False) as run:
+        with pytest.raises(ValueError):
+            with trace_render('basic'):
+                raise ValueError('bad image')
+    assert run.failures == 1
+    assert run.records[0]['error'] == 'bad image'
+
+
+def test_a_bulk_run_is_summarised_without_per_step_prints(monkeypatch, capsys, event, students, template,
+                                                           upload_folder):
+    monkeypatch.setattr(render_trace, 'RENDER_DEBUG', False)
+    with trace_run('bulk', keep=False) as run:
+        for student in students:
+            cg._render_certificate(cg.OUTPUT_BYTES, 'basic', event, student, template, upload_folder)
+
+    assert capsys.readouterr().out == ''
+    summary = run.as_dict()
+    assert summary['renders'] == len(students) and summary['failures'] == 0
+    assert {'text', 'save'} <= set(summary['stages'])
+    assert summary['output_bytes'] > 0
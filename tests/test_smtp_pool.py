@@ -0,0 +1,70 @@
+import smtplib
+
+import pytest
+
+from email_sender import SMTPPool
+
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; drop_after makes the server hang up once it has taken that many messages"""
+
+    instances = []
+    drop_after = None
+
+    def __init__(self, server, port, timeout=None):
+        self.logins = 0
+        self.sent = []
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        self.logins += 1
+
+    def noop(self):
+        return (250, b'OK')
+
+    def sendmail(self, sender, recipients, message):
+        if self.drop_after is not None and len(self.sent) >= self.drop_after:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.append(recipients)
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.drop_after = None
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSMTP)
+    pool = SMTPPool('smtp.example.com', 587, 'sender@example.com', 'secret', size=2)
+    yield pool
+    pool.close()
+
+
+def test_one_login_serves_many_messages(pool):
+    for i in range(3):
+        pool.sendmail('sender@example.com', f'student{i}@example.com', 'message')
+    assert pool.opened == 1
+    assert FakeSMTP.instances[0].logins == 1
+    assert len(FakeSMTP.instances[0].sent) == 3
+
+
+def test_a_dropped_connection_is_replaced_and_the_message_sent_again(pool):
+    FakeSMTP.drop_after = 1
+    pool.sendmail('sender@example.com', 'first@example.com', 'message')
+    pool.sendmail('sender@example.com', 'second@example.com', 'message')
+    assert pool.opened == 2
+    assert FakeSMTP.instances[1].sent == ['second@example.com']
+
+
+def test_connections_are_retired_after_max_messages(pool):
+    pool.max_messages = 2
+    for i in range(3):
+        pool.sendmail('sender@example.com', f'student{i}@example.com', 'message')
+    assert pool.opened == 2
+    assert FakeSMTP.instances[0].closed
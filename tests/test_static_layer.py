@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+import certificate_generator as cg
+import layout_engine
+
+
+TYPES = ['custom_font', 'enhanced', 'premium', 'basic']
+
+
+def _page(pdf_bytes):
+    """The text and a low resolution rendering of a one-page PDF"""
+    fitz = pytest.importorskip('fitz')
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as doc:
+        page = doc[0]
+        return page.get_text(), page.get_pixmap(dpi=36).samples
+
+
+def _form_streams(pdf_bytes):
+    """The decoded content of every form XObject in a PDF"""
+    fitz = pytest.importorskip('fitz')
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as doc:
+        return [
+            doc.xref_stream(xref) for xref in range(1, doc.xref_length())
+            if doc.xref_get_key(xref, 'Subtype') == ('name', '/Form')
+        ]
+
+
+@pytest.mark.parametrize('certificate_type', TYPES)
+def test_stamped_layer_matches_direct_draw(certificate_type, event, template, students, upload_folder):
+    layer = cg.build_static_layer(event, certificate_type, template, upload_folder)
+
+    for student in students[:2]:
+        direct = cg._render_certificate(cg.OUTPUT_BYTES, certificate_type, event, student, template, upload_folder)
+        stamped = cg._render_certificate(cg.OUTPUT_BYTES, certificate_type, event, student, template, upload_folder,
+                                         static_layer=layer)
+        assert _page(stamped) == _page(direct)
+
+
+@pytest.mark.parametrize('certificate_type', TYPES)
+def test_issue_date_is_not_drawn_in_the_layer(certificate_type, event, template, students, upload_folder):
+    layer = cg.build_static_layer(event, certificate_type, template, upload_folder)
+    pdf = cg._render_certificate(cg.OUTPUT_BYTES, certificate_type, event, students[0], template, upload_folder,
+                                 static_layer=layer)
+    forms = _form_streams(pdf)
+    assert len(forms) == 1
+    assert datetime.now().strftime('%B %d, %Y').encode() not in forms[0]
+
+
+def test_booklet_draws_the_layer_once(event, template, students, upload_folder, tmp_path):
+    booklet, pages = cg.generate_certificate_booklet(event, students, str(tmp_path), 'basic', template, upload_folder)
+    assert pages == [1, 2, 3, 4, 5]
+    with open(booklet, 'rb') as f:
+        assert len(_form_streams(f.read())) == 1
+
+
+def test_dated_template_text_is_drawn_per_student():
+    compiled = layout_engine.compile_layout({'elements': [
+        {'type': 'text', 'text': '{event.title}', 'y': 400},
+        {'type': 'text', 'text': 'Issued {date}', 'y': 100, 'align': 'right', 'x': '100%-40'},
+        {'type': 'text', 'text': '{student.name}', 'y': 300},
+    ]})
+    assert [op[6] for op in compiled.static_ops if op[0] == 'text'] == ['{event.title}']
+    assert [op[6] for op in compiled.student_ops if op[0] == 'text'] == ['Issued {date}']
+    assert [op[0] for op in compiled.student_ops].count('student_text') == 1
+
+
+def test_stamped_template_layout_matches_direct_draw(event, template, students, upload_folder):
+    template.template_config = dict(template.template_config, elements=[
+        {'type': 'image', 'slot': 'background', 'x': 0, 'y': 0, 'width': '100%', 'height': '100%'},
+        {'type': 'rect', 'x': 24, 'y': 24, 'width': '100%-48', 'height': '100%-48', 'stroke': 'accent'},
+        {'type': 'image', 'slot': 'logo', 'x': 60, 'y': '100%-150', 'width': 90, 'height': 90, 'mask': 'auto'},
+        {'type': 'text', 'text': '{event.title}', 'y': '100%-200', 'font': {'family': 'StoryScript', 'size': 30}},
+        {'type': 'text', 'text': '{student.name}', 'y': '100%-260', 'color': 'primary'},
+        {'type': 'text', 'text': '{date}', 'x': '100%-60', 'y': 80, 'align': 'right'},
+    ])
+    layer = cg.build_static_layer(event, 'template', template, upload_folder)
+
+    student = students[0]
+    direct = cg._render_certificate(cg.OUTPUT_BYTES, 'template', event, student, template, upload_folder)
+    stamped = cg._render_certificate(cg.OUTPUT_BYTES, 'template', event, student, template, upload_folder,
+                                     static_layer=layer)
+    assert _page(stamped) == _page(direct)
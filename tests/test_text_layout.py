@@ -0,0 +1,27 @@
+from font_registry import string_width
+from text_layout import TextStyle, build_layout_table, layout_text
+
+
+NAME = TextStyle('Helvetica-Bold', 36, 300, 20, 2)
+
+
+def test_a_name_that_fits_stays_on_one_line():
+    layout = layout_text('Student Number 1', NAME)
+    assert layout.lines == ('Student Number 1',)
+    assert layout.width <= NAME.max_width
+
+
+def test_a_long_name_wraps_below_its_minimum_size():
+    name = 'Maximiliana Alexandrina Konstantinopoulou-Vanderbilt Smith'
+    layout = layout_text(name, NAME)
+    assert len(layout.lines) == 2
+    assert ' '.join(layout.lines) == name
+    assert all(string_width(line, NAME.font_name, layout.font_size) <= NAME.max_width for line in layout.lines)
+
+
+def test_layout_table_lays_out_each_distinct_text_once():
+    rows = [{'name': 'Ann Lee'}, None, {'name': 'Ann Lee'}, {'name': 'Bo Chen'}]
+    table = build_layout_table(rows, {'name': NAME})
+    assert table[1] is None
+    assert table[0]['name'] is table[2]['name']
+    assert table[3]['name'].lines == ('Bo Chen',)
@@ -0,0 +1,85 @@
+from collections import namedtuple
+from math import floor
+
+from font_registry import ensure_font, fit_font_size, string_width
+
+
+# How a piece of text should be fitted: shrink on one line down to min_size, then wrap into up to max_lines
+TextStyle = namedtuple('TextStyle', 'font_name max_size max_width min_size max_lines')
+
+# A finished layout: the renderer only sets the font and draws these lines, no measuring
+TextLayout = namedtuple('TextLayout', 'font_name font_size lines width leading')
+
+# Baseline-to-baseline distance as a multiple of the font size
+LINE_SPACING = 1.15
+
+
+def _split_lines(words, font_name, line_count):
+    """Break words into line_count lines so the widest line (at 1pt) is as narrow as possible"""
+    def width(i, j):
+        return string_width(" ".join(words[i:j]), font_name, 1)
+
+    n = len(words)
+    # best[(k, j)] = (widest line, break positions) for words[:j] set on k lines
+    best = {(1, j): (width(0, j), (j,)) for j in range(1, n + 1)}
+    for k in range(2, line_count + 1):
+        for j in range(k, n + 1):
+            best[(k, j)] = min(
+                ((max(best[(k - 1, i)][0], width(i, j)), best[(k - 1, i)][1] + (j,)) for i in range(k - 1, j)),
+                key=lambda candidate: candidate[0],
+            )
+
+    widest, breaks = best[(line_count, n)]
+    starts = (0,) + breaks[:-1]
+    return widest, tuple(" ".join(words[i:j]) for i, j in zip(starts, breaks))
+
+
+def layout_text(text, style):
+    """Fit text to a style: one line at the largest size that fits, wrapping only below min_size"""
+    font_name, max_size, max_width, min_size, max_lines = style
+    size = fit_font_size(text, font_name, max_size, max_width)
+    lines = (text,)
+
+    words = text.split()
+    if min_size is not None and size < min_size and max_lines > 1 and len(words) > 1:
+        # Use the fewest lines that fit at min_size, or as many as allowed and shrink further
+        for line_count in range(2, min(max_lines, len(words)) + 1):
+            widest, lines = _split_lines(words, font_name, line_count)
+            if widest * min_size <= max_width:
+                break
+        size = min(min_size, floor(max_width / widest * 2) / 2)
+
+    width = max(string_width(line, font_name, size) for line in lines)
+    return TextLayout(font_name, size, lines, width, size * LINE_SPACING)
+
+
+def build_layout_table(rows, styles):
+    """Lay out many rows of text in one pass.
+
+    rows is a list of {field: text} (or None) and styles maps each field to
+    its TextStyle. Returns one {field: TextLayout} per row, None for None
+    rows; rows that share the same text and style share one layout object.
+    """
+    layouts = {}
+    table = []
+    for row in rows:
+        if row is None:
+            table.append(None)
+            continue
+        entry = {}
+        for field, text in row.items():
+            key = (text, styles[field])
+            if key not in layouts:
+                layouts[key] = layout_text(text, styles[field])
+            entry[field] = layouts[key]
+        table.append(entry)
+    return table
+
+
+def draw_text_layout(c, x, y, layout):
+    """Draw a layout's lines centred on x, with the block vertically centred on baseline y"""
+    ensure_font(layout.font_name)
+    c.setFont(layout.font_name, layout.font_size)
+    top = y + (len(layout.lines) - 1) * layout.leading / 2
+    for i, line in enumerate(layout.lines):
+        c.drawCentredString(x, top - i * layout.leading, line)